@@ -1,13 +1,27 @@
-from flask import Flask, render_template, request, send_file, jsonify
+from flask import Flask, Request, g, render_template, request, send_file, jsonify
 import os
 import subprocess
 import tempfile
 import uuid
 import glob
 import shutil
+import threading
+import time
+import heapq
+import itertools
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from werkzeug.security import safe_join
+from datetime import datetime, timezone
 import json
+import hashlib
+import atexit
+import base64
+import re
+import math
+import zipfile
+import socket
 
 # Загружаем переменные окружения из .env файла
 try:
@@ -98,42 +112,877 @@ app.config['SUPABASE_URL'] = os.environ.get('SUPABASE_URL', '')
 app.config['SUPABASE_KEY'] = os.environ.get('SUPABASE_KEY', '')  # Service Role Key для полного доступа
 app.config['SUPABASE_BUCKET'] = os.environ.get('SUPABASE_BUCKET', 'frames')  # Имя бакета в Supabase Storage
 
+# Настройки общего HTTP-клиента для Supabase REST и Storage
+app.config['HTTP_MAX_CONNECTIONS'] = int(os.environ.get('HTTP_MAX_CONNECTIONS', '20'))  # Всего соединений в пуле
+app.config['HTTP_MAX_KEEPALIVE'] = int(os.environ.get('HTTP_MAX_KEEPALIVE', '10'))  # Сколько соединений держать открытыми
+app.config['HTTP_KEEPALIVE_EXPIRY'] = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', '30'))  # Секунд простоя до закрытия соединения
+app.config['HTTP2_ENABLED'] = os.environ.get('HTTP2_ENABLED', 'true').lower() == 'true'  # HTTP/2, если установлен пакет h2
+
+# Настройки возобновляемой загрузки (TUS) больших файлов в Supabase Storage
+app.config['SUPABASE_RESUMABLE_THRESHOLD'] = int(os.environ.get('SUPABASE_RESUMABLE_THRESHOLD', str(50 * 1024 * 1024)))  # С какого размера использовать TUS
+app.config['SUPABASE_TUS_CHUNK_SIZE'] = int(os.environ.get('SUPABASE_TUS_CHUNK_SIZE', str(6 * 1024 * 1024)))  # Supabase требует блоки ровно по 6MB
+app.config['SUPABASE_TUS_MAX_RETRIES'] = int(os.environ.get('SUPABASE_TUS_MAX_RETRIES', '5'))  # Повторов подряд для одного блока
+
+# Настройки фоновых задач (асинхронная обработка видео)
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', '2'))  # Количество потоков-обработчиков
+app.config['JOB_TTL_SECONDS'] = int(os.environ.get('JOB_TTL_SECONDS', str(6 * 3600)))  # Сколько хранить завершенные задачи
+app.config['JOB_PRUNE_INTERVAL'] = float(os.environ.get('JOB_PRUNE_INTERVAL', '300'))  # Период удаления старых задач, секунд
+app.config['JOB_STORE'] = os.environ.get('JOB_STORE', 'memory')  # 'memory', 'sqlite' (один узел) или 'supabase' (несколько узлов)
+app.config['JOB_STORE_PATH'] = os.environ.get('JOB_STORE_PATH', os.path.join(app.config['UPLOAD_FOLDER'], 'jobs.sqlite3'))  # Файл очереди для sqlite
+app.config['JOB_LEASE_SECONDS'] = int(os.environ.get('JOB_LEASE_SECONDS', '120'))  # Аренда задачи: без продления задачу забирает другой воркер
+app.config['JOB_POLL_INTERVAL'] = float(os.environ.get('JOB_POLL_INTERVAL', '2'))  # Период опроса очереди свободным воркером, секунд
+app.config['JOB_MAX_ATTEMPTS'] = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))  # Сколько раз перезапускать задачу после падения воркера
+app.config['WORKER_ID'] = os.environ.get('WORKER_ID', '')  # Имя воркера в очереди, по умолчанию hostname:pid
+
+# Настройки планировщика FFmpeg
+app.config['ENCODE_SLOTS'] = int(os.environ.get('ENCODE_SLOTS', '0'))  # 0 = рассчитать по квоте CPU
+app.config['FFMPEG_THREADS_PER_JOB'] = int(os.environ.get('FFMPEG_THREADS_PER_JOB', '4'))  # Желаемое число потоков на задачу
+
+# Настройки production-запуска (gunicorn.conf.py)
+app.config['WORKER_PROCESSES'] = int(os.environ.get('GUNICORN_WORKERS', '1'))  # Процессов-воркеров делят между собой CPU
+app.config['DRAIN_TIMEOUT'] = int(os.environ.get('DRAIN_TIMEOUT', '3600'))  # Сколько при остановке ждать текущие кодирования, секунд
+
+# Быстрый путь сжатия: потоки, уже подходящие под цель, копируются без перекодирования
+app.config['SMART_COPY_ENABLED'] = os.environ.get('SMART_COPY_ENABLED', 'true').lower() == 'true'
+
+# Параллельное кодирование длинных видео частями (по ключевым кадрам, каждая часть - свой процесс FFmpeg)
+app.config['SEGMENT_ENCODE_MIN_DURATION'] = float(os.environ.get('SEGMENT_ENCODE_MIN_DURATION', '600'))  # С какой длительности (сек) делить на части, 0 = выключено
+app.config['SEGMENT_SECONDS'] = float(os.environ.get('SEGMENT_SECONDS', '60'))  # Примерная длина части, секунд
+app.config['SEGMENT_WORKERS'] = int(os.environ.get('SEGMENT_WORKERS', '0'))  # Частей одновременно, 0 = по числу слотов FFmpeg
+
+# HLS-версия видео портфолио (master.m3u8 + fMP4-сегменты) рядом с прогрессивным MP4
+app.config['HLS_ENABLED'] = os.environ.get('HLS_ENABLED', 'true').lower() == 'true'
+app.config['HLS_RENDITIONS'] = os.environ.get('HLS_RENDITIONS', '720,480')  # Разрешения через запятую, не выше 720
+app.config['HLS_SEGMENT_SECONDS'] = int(os.environ.get('HLS_SEGMENT_SECONDS', '4'))  # Целевая длина сегмента
+
+# Настройки извлечения кадров
+app.config['FRAME_SEEK_MIN_INTERVAL'] = float(os.environ.get('FRAME_SEEK_MIN_INTERVAL', '5'))  # С какого интервала (сек) использовать поиск вместо декодирования
+app.config['FRAME_SEEK_WORKERS'] = int(os.environ.get('FRAME_SEEK_WORKERS', '4'))  # Параллельных процессов FFmpeg при поиске
+
+# Кадры-кандидаты для обложки по сменам сцен (режим 'scene')
+app.config['ADMIN_FRAMES_MODE'] = os.environ.get('ADMIN_FRAMES_MODE', 'scene')  # 'scene' или 'interval' (каждые 15 секунд)
+app.config['SCENE_THRESHOLD'] = float(os.environ.get('SCENE_THRESHOLD', '0.3'))  # Оценка смены сцены (0-1), с которой начинается новая сцена
+app.config['SCENE_MAX_FRAMES'] = int(os.environ.get('SCENE_MAX_FRAMES', '12'))  # Не больше кандидатов на видео
+app.config['SCENE_SECONDS_PER_FRAME'] = float(os.environ.get('SCENE_SECONDS_PER_FRAME', '3'))  # Не больше одного кандидата на N секунд видео
+
+# Пакетный импорт в портфолио (/admin/batch-import)
+app.config['BATCH_CONCURRENCY'] = int(os.environ.get('BATCH_CONCURRENCY', '4'))  # Видео пакета, обрабатываемых одновременно
+app.config['BATCH_MAX_FILES'] = int(os.environ.get('BATCH_MAX_FILES', '100'))  # Файлов в одном пакете
+
+# Параллельная загрузка кадров в бакет (/extract-frames)
+app.config['FRAME_UPLOAD_CONCURRENCY'] = int(os.environ.get('FRAME_UPLOAD_CONCURRENCY', '8'))  # Одновременных загрузок
+
+# Настройки multipart-загрузки в S3 / Yandex Object Storage
+app.config['STORAGE_MULTIPART_THRESHOLD'] = int(os.environ.get('STORAGE_MULTIPART_THRESHOLD', str(16 * 1024 * 1024)))  # С какого размера делить файл на части
+app.config['STORAGE_MULTIPART_CHUNKSIZE'] = int(os.environ.get('STORAGE_MULTIPART_CHUNKSIZE', str(16 * 1024 * 1024)))  # Размер одной части
+app.config['STORAGE_MAX_CONCURRENCY'] = int(os.environ.get('STORAGE_MAX_CONCURRENCY', '8'))  # Параллельных частей одного файла
+
+# Отдача кадров (/static/frames, /admin/frame)
+app.config['FRAME_CACHE_MAX_AGE'] = int(os.environ.get('FRAME_CACHE_MAX_AGE', str(365 * 24 * 3600)))  # Кадры неизменяемы - кэшируем на год
+app.config['X_ACCEL_REDIRECT'] = os.environ.get('X_ACCEL_REDIRECT', 'false').lower() == 'true'  # Отдавать байты через nginx
+app.config['X_ACCEL_FRAMES_PREFIX'] = os.environ.get('X_ACCEL_FRAMES_PREFIX', '/_internal/frames')  # internal-location для static/frames
+app.config['X_ACCEL_UPLOADS_PREFIX'] = os.environ.get('X_ACCEL_UPLOADS_PREFIX', '/_internal/temp')  # internal-location для UPLOAD_FOLDER
+
+# Настройки потокового приема (/upload/stream)
+app.config['STREAM_CHUNK_SIZE'] = int(os.environ.get('STREAM_CHUNK_SIZE', str(1024 * 1024)))  # Размер блока чтения тела запроса
+app.config['STREAM_SNIFF_LIMIT'] = int(os.environ.get('STREAM_SNIFF_LIMIT', str(8 * 1024 * 1024)))  # Сколько байт читать для поиска moov/mdat
+
+# Настройки кэша результатов (повторная загрузка того же исходника не кодируется заново)
+app.config['CACHE_ENABLED'] = os.environ.get('CACHE_ENABLED', 'true').lower() == 'true'
+app.config['CACHE_FOLDER'] = os.environ.get('CACHE_FOLDER', os.path.join(app.config['UPLOAD_FOLDER'], 'cache'))
+app.config['CACHE_MAX_BYTES'] = int(os.environ.get('CACHE_MAX_BYTES', str(20 * 1024 * 1024 * 1024)))  # 20GB по умолчанию
+
+# Настройки временных файлов (TTL, квота диска)
+app.config['TEMP_TTL_SECONDS'] = int(os.environ.get('TEMP_TTL_SECONDS', str(6 * 3600)))  # Сколько хранить исходники и результаты
+app.config['TEMP_FRAMES_TTL_SECONDS'] = int(os.environ.get('TEMP_FRAMES_TTL_SECONDS', str(24 * 3600)))  # Сколько хранить кадры /extract-frames
+app.config['TEMP_QUOTA_BYTES'] = int(os.environ.get('TEMP_QUOTA_BYTES', str(50 * 1024 * 1024 * 1024)))  # Квота временных файлов, 0 = без квоты
+app.config['TEMP_MIN_FREE_BYTES'] = int(os.environ.get('TEMP_MIN_FREE_BYTES', str(2 * 1024 * 1024 * 1024)))  # Не принимать работу, если свободно меньше
+app.config['TEMP_DOWNLOAD_GRACE_SECONDS'] = int(os.environ.get('TEMP_DOWNLOAD_GRACE_SECONDS', '60'))  # Сколько хранить результат после отдачи
+app.config['TEMP_SWEEP_INTERVAL'] = int(os.environ.get('TEMP_SWEEP_INTERVAL', '60'))  # Период фоновой очистки, секунд
+
 ALLOWED_EXTENSIONS = {'mp4', 'mov', 'avi', 'mkv', 'webm', 'flv', 'wmv'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def extract_frames(input_path, output_dir, interval_seconds=15):
+# ============================================
+# МЕТРИКИ: Prometheus (/metrics)
+# ============================================
+# prometheus_client опционален: без него замеры пропускаются, а /metrics отвечает 501.
+# Под gunicorn с несколькими воркерами значения всех процессов собираются через
+# каталог PROMETHEUS_MULTIPROC_DIR (задается в gunicorn.conf.py)
+
+# Границы гистограмм длительности, секунд: от запроса к PostgREST до часового кодирования
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+# Скорость FFmpeg в долях реального времени: меньше 1 - кодирование медленнее воспроизведения
+SPEED_BUCKETS = (0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 8, 12, 20, 50)
+
+class Metrics:
+    """Метрики конвейера: длительность этапов, скорость FFmpeg, объемы данных, очереди, ошибки"""
+
+    def __init__(self):
+        self.enabled = False
+        try:
+            from prometheus_client import Counter, Gauge, Histogram
+        except ImportError:
+            print("[WARNING] prometheus_client не установлен, /metrics недоступен. Установите: pip install prometheus-client")
+            return
+
+        self.enabled = True
+        self.stage_seconds = Histogram(
+            'editor_stage_duration_seconds', 'Длительность этапов обработки (без ожидания слота FFmpeg)',
+            ['stage', 'result'], buckets=DURATION_BUCKETS)
+        self.ffmpeg_speed = Histogram(
+            'editor_ffmpeg_speed_ratio', 'Скорость FFmpeg относительно реального времени',
+            ['stage'], buckets=SPEED_BUCKETS)
+        self.ffmpeg_input_bytes = Counter(
+            'editor_ffmpeg_input_bytes', 'Байт исходников, обработанных FFmpeg', ['stage'])
+        self.ffmpeg_output_bytes = Counter(
+            'editor_ffmpeg_output_bytes', 'Байт результатов FFmpeg (видео и кадры)', ['stage'])
+        self.received_bytes = Counter(
+            'editor_received_bytes', 'Байт принято в загрузках', ['endpoint'])
+        self.storage_upload_seconds = Histogram(
+            'editor_storage_upload_duration_seconds', 'Длительность загрузки файла в хранилище',
+            ['backend', 'result'], buckets=DURATION_BUCKETS)
+        self.storage_uploaded_bytes = Counter(
+            'editor_storage_uploaded_bytes', 'Байт загружено в хранилище', ['backend'])
+        self.postgrest_seconds = Histogram(
+            'editor_postgrest_request_duration_seconds', 'Длительность запроса к PostgREST',
+            ['method', 'table', 'status'], buckets=DURATION_BUCKETS)
+        self.request_seconds = Histogram(
+            'editor_http_request_duration_seconds', 'Длительность обработки HTTP-запроса',
+            ['endpoint', 'method'], buckets=DURATION_BUCKETS)
+        self.http_errors = Counter(
+            'editor_http_errors', 'Ответы с кодом 4xx/5xx по эндпоинтам', ['endpoint', 'status'])
+        # Значения берутся из хранилища задач при запросе /metrics. Общая очередь (sqlite/supabase)
+        # одинакова для всех воркеров - берем последнее значение; очередь в памяти - своя у процесса
+        self.jobs = Gauge(
+            'editor_jobs', 'Фоновые задачи в очереди и в работе', ['state'],
+            multiprocess_mode='livesum' if app.config['JOB_STORE'] == 'memory' else 'livemostrecent')
+        self.jobs_finished = Counter(
+            'editor_jobs_finished', 'Завершенные фоновые задачи', ['kind', 'status'])
+        self.encode_slots = Gauge(
+            'editor_encode_slots', 'Слоты FFmpeg: всего, занято, ожидают', ['state'], multiprocess_mode='livesum')
+        self.slot_wait_seconds = Histogram(
+            'editor_encode_slot_wait_seconds', 'Ожидание слота FFmpeg', ['priority'], buckets=DURATION_BUCKETS)
+        self.ffmpeg_processes = Gauge(
+            'editor_ffmpeg_processes', 'Запущенные процессы FFmpeg', multiprocess_mode='livesum')
+        # Папки общие для воркеров - берем последнее измеренное значение, а не сумму
+        self.temp_used_bytes = Gauge(
+            'editor_temp_used_bytes', 'Объем временных файлов', multiprocess_mode='livemostrecent')
+        self.temp_free_bytes = Gauge(
+            'editor_temp_disk_free_bytes', 'Свободное место на диске временных файлов',
+            multiprocess_mode='livemostrecent')
+
+        for state in ('queued', 'running'):
+            self.jobs.labels(state=state)
+
+    def observe_stage(self, stage, seconds, ok=True, speed=None):
+        """Длительность этапа и, для FFmpeg, итоговая скорость (x реального времени)"""
+        if not self.enabled:
+            return
+        self.stage_seconds.labels(stage=stage, result='ok' if ok else 'error').observe(seconds)
+        if ok and speed:
+            self.ffmpeg_speed.labels(stage=stage).observe(speed)
+
+    def observe_ffmpeg_bytes(self, stage, input_bytes, output_bytes):
+        if not self.enabled:
+            return
+        self.ffmpeg_input_bytes.labels(stage=stage).inc(input_bytes)
+        self.ffmpeg_output_bytes.labels(stage=stage).inc(output_bytes)
+
+    def observe_received(self, endpoint, size):
+        if self.enabled:
+            self.received_bytes.labels(endpoint=endpoint or 'unknown').inc(size)
+
+    def observe_storage_upload(self, backend, seconds, size, ok):
+        if not self.enabled:
+            return
+        self.storage_upload_seconds.labels(backend=backend, result='ok' if ok else 'error').observe(seconds)
+        if ok:
+            self.storage_uploaded_bytes.labels(backend=backend).inc(size)
+
+    def observe_postgrest(self, method, table, status, seconds):
+        if self.enabled:
+            self.postgrest_seconds.labels(method=method, table=table, status=status).observe(seconds)
+
+    def observe_request(self, endpoint, method, status, seconds):
+        if not self.enabled:
+            return
+        endpoint = endpoint or 'not_found'
+        self.request_seconds.labels(endpoint=endpoint, method=method).observe(seconds)
+        if status >= 400:
+            self.http_errors.labels(endpoint=endpoint, status=str(status)).inc()
+
+    def set_jobs(self, counts):
+        """Задачи по состояниям из хранилища: задачу ставит один процесс, а выполняет другой"""
+        if not self.enabled:
+            return
+        for state in ('queued', 'running'):
+            self.jobs.labels(state=state).set(counts[state])
+
+    def job_finished(self, kind, status):
+        if self.enabled:
+            self.jobs_finished.labels(kind=kind, status=status).inc()
+
+    def set_encode_slots(self, slots, running, waiting):
+        if not self.enabled:
+            return
+        self.encode_slots.labels(state='total').set(slots)
+        self.encode_slots.labels(state='running').set(running)
+        self.encode_slots.labels(state='waiting').set(waiting)
+
+    def observe_slot_wait(self, priority, seconds):
+        if self.enabled:
+            self.slot_wait_seconds.labels(priority=priority).observe(seconds)
+
+    def set_ffmpeg_processes(self, count):
+        if self.enabled:
+            self.ffmpeg_processes.set(count)
+
+    def set_temp_usage(self, used_bytes, free_bytes):
+        if self.enabled:
+            self.temp_used_bytes.set(used_bytes)
+            self.temp_free_bytes.set(free_bytes)
+
+    def render(self):
+        """Текст метрик и Content-Type; при PROMETHEUS_MULTIPROC_DIR - сумма по всем воркерам"""
+        from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+
+        registry = REGISTRY
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            from prometheus_client import multiprocess
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+METRICS = Metrics()
+
+@contextmanager
+def stage_timer(stage):
+    """Замеряет длительность блока как этапа обработки (результат error при исключении)"""
+    started = time.monotonic()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        METRICS.observe_stage(stage, time.monotonic() - started, ok)
+
+def files_size(paths):
+    """Суммарный размер существующих файлов"""
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.monotonic()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        METRICS.observe_request(request.endpoint, request.method, response.status_code, time.monotonic() - started)
+    return response
+
+# ============================================
+# ПЛАНИРОВЩИК FFMPEG: слоты кодирования и приоритеты
+# ============================================
+
+# Классы приоритета: меньше значение - раньше получает слот
+PRIORITY_ADMIN = 0   # Видео для портфолио (/admin/process-video)
+PRIORITY_PUBLIC = 1  # Публичные /upload и /extract-frames
+PRIORITY_NAMES = {PRIORITY_ADMIN: 'admin', PRIORITY_PUBLIC: 'public'}
+
+def detect_cpu_limit():
+    """Определяет число доступных CPU с учетом квоты cgroup (docker --cpus)"""
+    cpus = os.cpu_count() or 1
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0)) or cpus
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" или "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota_str, period_str = f.read().split()
+            if quota_str != 'max':
+                quota = int(quota_str) / int(period_str)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                quota_us = int(f.read().strip())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period_us = int(f.read().strip())
+            if quota_us > 0 and period_us > 0:
+                quota = quota_us / period_us
+        except (OSError, ValueError):
+            pass
+
+    if quota:
+        cpus = min(cpus, max(1, int(quota)))
+    return cpus
+
+class EncodeScheduler:
+    """Ограничивает число одновременных процессов FFmpeg и выдает слоты по приоритету"""
+
+    def __init__(self, slots, threads_per_job):
+        self.slots = slots
+        self.threads_per_job = threads_per_job
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = []  # Куча (priority, seq) ожидающих задач
+        self._seq = itertools.count()
+        self._stats = {
+            priority: {'started': 0, 'wait_total': 0.0, 'wait_max': 0.0, 'wait_last': 0.0}
+            for priority in PRIORITY_NAMES
+        }
+        METRICS.set_encode_slots(slots, 0, 0)
+
+    def acquire(self, priority=PRIORITY_PUBLIC, blocking=True):
+        """Занимает слот; возвращает число потоков для -threads или None, если слот не свободен"""
+        ticket = (priority, next(self._seq))
+        wait_started = time.monotonic()
+
+        with self._cond:
+            if not blocking and (self._running >= self.slots or self._waiting):
+                return None
+
+            heapq.heappush(self._waiting, ticket)
+            METRICS.set_encode_slots(self.slots, self._running, len(self._waiting))
+            while self._running >= self.slots or self._waiting[0] != ticket:
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._running += 1
+
+            waited = time.monotonic() - wait_started
+            stats = self._stats.setdefault(priority, {'started': 0, 'wait_total': 0.0, 'wait_max': 0.0, 'wait_last': 0.0})
+            stats['started'] += 1
+            stats['wait_total'] += waited
+            stats['wait_max'] = max(stats['wait_max'], waited)
+            stats['wait_last'] = waited
+            METRICS.set_encode_slots(self.slots, self._running, len(self._waiting))
+            # Следующий в очереди может тоже получить свободный слот
+            self._cond.notify_all()
+
+        METRICS.observe_slot_wait(PRIORITY_NAMES.get(priority, str(priority)), waited)
+
+        if waited > 1:
+            print(f"[DEBUG] Слот FFmpeg ({PRIORITY_NAMES.get(priority, priority)}) получен после ожидания {waited:.1f} с")
+        return self.threads_per_job
+
+    def release(self):
+        """Освобождает слот"""
+        with self._cond:
+            self._running -= 1
+            METRICS.set_encode_slots(self.slots, self._running, len(self._waiting))
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority=PRIORITY_PUBLIC):
+        """Ждет свободный слот; возвращает число потоков для -threads"""
+        threads = self.acquire(priority)
+        try:
+            yield threads
+        finally:
+            self.release()
+
+    def stats(self):
+        """Текущая загрузка: слоты, глубина очереди и время ожидания по классам"""
+        with self._cond:
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiting:
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                queued[name] = queued.get(name, 0) + 1
+
+            classes = {}
+            for priority, stats in self._stats.items():
+                started = stats['started']
+                classes[PRIORITY_NAMES.get(priority, str(priority))] = {
+                    'queued': queued.get(PRIORITY_NAMES.get(priority, str(priority)), 0),
+                    'started': started,
+                    'wait_avg_seconds': round(stats['wait_total'] / started, 3) if started else 0.0,
+                    'wait_max_seconds': round(stats['wait_max'], 3),
+                    'wait_last_seconds': round(stats['wait_last'], 3)
+                }
+
+            return {
+                'slots': self.slots,
+                'threads_per_job': self.threads_per_job,
+                'running': self._running,
+                'queue_depth': len(self._waiting),
+                'classes': classes
+            }
+
+def create_encode_scheduler():
+    """Создает планировщик: число слотов по квоте CPU или из ENCODE_SLOTS (на процесс)"""
+    # У каждого воркера gunicorn свой планировщик - делим CPU между ними
+    cpus = max(1, detect_cpu_limit() // max(1, app.config['WORKER_PROCESSES']))
+    threads_target = max(1, app.config['FFMPEG_THREADS_PER_JOB'])
+    slots = app.config['ENCODE_SLOTS'] or max(1, cpus // threads_target)
+    threads_per_job = max(1, cpus // slots)
+    print(f"[OK] Планировщик FFmpeg: CPU={cpus}, слотов={slots}, потоков на задачу={threads_per_job}")
+    return EncodeScheduler(slots, threads_per_job)
+
+ENCODE_SCHEDULER = create_encode_scheduler()
+
+# Запущенные процессы FFmpeg: при остановке сервиса их дожидаются, а не бросают
+FFMPEG_PROCESSES = set()
+FFMPEG_PROCESSES_LOCK = threading.Lock()
+
+def start_ffmpeg(cmd, **popen_kwargs):
+    """Запускает FFmpeg и регистрирует процесс.
+
+    Процесс получает свою сессию: Ctrl+C или сигнал группе процессов не обрывает
+    кодирование - его завершением управляет остановка сервиса (wait_for_drain).
+    """
+    process = subprocess.Popen(cmd, start_new_session=True, **popen_kwargs)
+    with FFMPEG_PROCESSES_LOCK:
+        FFMPEG_PROCESSES.add(process)
+        METRICS.set_ffmpeg_processes(len(FFMPEG_PROCESSES))
+    return process
+
+def finish_ffmpeg(process):
+    """Снимает процесс FFmpeg с учета"""
+    with FFMPEG_PROCESSES_LOCK:
+        FFMPEG_PROCESSES.discard(process)
+        METRICS.set_ffmpeg_processes(len(FFMPEG_PROCESSES))
+
+def run_ffmpeg(cmd, timeout, progress=None, duration=None, stage=None):
+    """Аналог subprocess.run(check=True) для FFmpeg с регистрацией процесса.
+
+    progress(snapshot) вызывается по мере кодирования (см. read_ffmpeg_progress),
+    duration - длительность источника в секундах для расчета процента и ETA,
+    stage - имя этапа для метрик: длительность запуска и итоговая скорость FFmpeg.
+    """
+    if stage is not None:
+        return run_ffmpeg_measured(cmd, timeout, progress, duration, stage)
+    if progress is not None:
+        return run_ffmpeg_with_progress(cmd, timeout, progress, duration)
+
+    process = start_ffmpeg(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        raise
+    finally:
+        finish_ffmpeg(process)
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+def run_ffmpeg_measured(cmd, timeout, progress, duration, stage):
+    """run_ffmpeg с записью метрик этапа; скорость берется из последнего блока -progress"""
+    last = {}
+
+    def report(snapshot):
+        last.update(snapshot)
+        if progress is not None:
+            progress(snapshot)
+
+    started = time.monotonic()
+    ok = False
+    try:
+        result = run_ffmpeg_with_progress(cmd, timeout, report, duration)
+        ok = True
+        return result
+    finally:
+        METRICS.observe_stage(stage, time.monotonic() - started, ok, last.get('speed'))
+
+def run_ffmpeg_with_progress(cmd, timeout, progress, duration):
+    """run_ffmpeg с чтением -progress из stdout в реальном времени"""
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+
+    # stderr пишем в файл: пока читаем stdout, заполненный pipe stderr заблокировал бы FFmpeg
+    with tempfile.TemporaryFile() as stderr_file:
+        process = start_ffmpeg(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        timed_out = threading.Event()
+
+        def kill_on_timeout():
+            timed_out.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, kill_on_timeout)
+        timer.daemon = True
+        timer.start()
+        try:
+            read_ffmpeg_progress(process.stdout, duration, progress)
+            process.wait()
+        finally:
+            timer.cancel()
+            process.stdout.close()
+            finish_ffmpeg(process)
+
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(cmd, timeout)
+
+        stderr_file.seek(0)
+        stderr = stderr_file.read()
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, None, stderr)
+    return subprocess.CompletedProcess(cmd, process.returncode, None, stderr)
+
+def _progress_number(value):
+    """Число из поля -progress ('N/A' и пустые значения -> None)"""
+    try:
+        return float(value.rstrip('x'))
+    except (AttributeError, ValueError):
+        return None
+
+def parse_ffmpeg_speed(stderr):
+    """Итоговая скорость из строки статистики FFmpeg в stderr ('speed=2.5x')"""
+    matches = re.findall(rb'speed=\s*([\d.]+)x', stderr or b'')
+    return _progress_number(matches[-1].decode()) if matches else None
+
+def build_progress_snapshot(fields, duration, elapsed):
+    """Сводка прогресса по блоку -progress: процент, скорость (x реального времени), fps, ETA"""
+    out_time_us = _progress_number(fields.get('out_time_us')) or _progress_number(fields.get('out_time_ms'))
+    out_time = max(0.0, (out_time_us or 0) / 1_000_000)
+    speed = _progress_number(fields.get('speed'))
+    finished = fields.get('progress') == 'end'
+
+    percent = None
+    eta = None
+    if duration:
+        percent = 100.0 if finished else min(99.9, out_time / duration * 100)
+        if finished:
+            eta = 0
+        elif speed:
+            eta = max(0.0, (duration - out_time) / speed)
+
+    return {
+        'percent': round(percent, 1) if percent is not None else None,
+        'out_time_seconds': round(out_time, 1),
+        'duration_seconds': round(duration, 1) if duration else None,
+        'speed': round(speed, 3) if speed is not None else None,
+        'fps': _progress_number(fields.get('fps')),
+        'eta_seconds': round(eta) if eta is not None else None,
+        'elapsed_seconds': round(elapsed, 1),
+        'below_realtime': speed is not None and speed < 1.0
+    }
+
+def read_ffmpeg_progress(stream, duration, progress):
+    """Разбирает вывод -progress (блоки key=value, завершаемые progress=continue/end)"""
+    started = time.time()
+    fields = {}
+    for raw_line in stream:
+        line = raw_line.decode('utf-8', errors='ignore').strip()
+        key, sep, value = line.partition('=')
+        if not sep:
+            continue
+        fields[key] = value
+        if key == 'progress':
+            try:
+                progress(build_progress_snapshot(fields, duration, time.time() - started))
+            except Exception as e:
+                # Ошибка получателя прогресса не должна прерывать кодирование
+                print(f"[WARNING] Ошибка обработки прогресса FFmpeg: {e}")
+            fields = {}
+
+def ffmpeg_process_count():
+    with FFMPEG_PROCESSES_LOCK:
+        return len(FFMPEG_PROCESSES)
+
+def terminate_ffmpeg_processes():
+    """Останавливает оставшиеся процессы FFmpeg (SIGTERM, затем SIGKILL)"""
+    with FFMPEG_PROCESSES_LOCK:
+        processes = list(FFMPEG_PROCESSES)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return len(processes)
+
+def probe_duration(input_path):
+    """Возвращает длительность видео в секундах через ffprobe (None, если определить не удалось)"""
+    try:
+        result = subprocess.run(
+            [
+                'ffprobe',
+                '-v', 'error',
+                '-show_entries', 'format=duration',
+                '-of', 'default=noprint_wrappers=1:nokey=1',
+                input_path
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+            timeout=30
+        )
+        duration = float(result.stdout.decode('utf-8', errors='ignore').strip())
+        return duration if duration > 0 else None
+    except (subprocess.SubprocessError, FileNotFoundError, ValueError):
+        return None
+
+FRAME_INTERVAL_ERROR = 'Интервал между кадрами должен быть целым числом секунд от 1'
+
+def choose_frames_mode(interval_seconds, duration):
+    """Выбирает режим извлечения кадров: 'seek' для редких кадров, иначе 'decode'"""
+    if duration is None:
+        # Без длительности не можем построить отметки времени
+        return 'decode'
+    if interval_seconds >= app.config['FRAME_SEEK_MIN_INTERVAL']:
+        return 'seek'
+    return 'decode'
+
+def extract_frame_at(input_path, timestamp, output_path, accurate=False):
+    """Извлекает один кадр на отметке времени быстрым поиском (-ss перед -i).
+
+    accurate=True декодирует GOP до точной отметки (для кадров, выбранных анализом сцен).
+    """
+    cmd = [
+        'ffmpeg',
+        '-ss', f'{timestamp:.3f}',  # Поиск по индексу контейнера до открытия декодера
+        # Без точного поиска берем ближайший ключевой кадр, не декодируя GOP до отметки
+        *([] if accurate else ['-noaccurate_seek']),
+        '-threads', '1',
+        '-i', input_path,
+        '-frames:v', '1',
+        '-q:v', '2',  # Качество JPEG (1-31, 2 = высокое качество)
+        '-y',
+        output_path
+    ]
+
+    try:
+        run_ffmpeg(cmd, timeout=120)
+        if not os.path.exists(output_path):
+            return False, f"Кадр на {timestamp:.1f} с не получен"
+        return True, None
+    except subprocess.TimeoutExpired:
+        return False, f"Превышено время ожидания кадра на {timestamp:.1f} с"
+    except subprocess.CalledProcessError as e:
+        return False, f"Ошибка FFmpeg: {e.stderr.decode('utf-8', errors='ignore')}"
+
+def extract_frames_seek(input_path, output_dir, interval_seconds, duration, workers, progress=None):
+    """Извлекает кадры каждые N секунд параллельными поисками по отметкам времени"""
+    if interval_seconds <= 0:
+        # Иначе цикл ниже никогда не закончится
+        return False, [], FRAME_INTERVAL_ERROR
+    timestamps = []
+    timestamp = 0.0
+    while timestamp < duration:
+        timestamps.append(timestamp)
+        timestamp += interval_seconds
+
+    tasks = [
+        (timestamp, os.path.join(output_dir, f'frame_{idx + 1:04d}.jpg'))
+        for idx, timestamp in enumerate(timestamps)
+    ]
+    return extract_frames_at(input_path, output_dir, tasks, workers, duration, progress)
+
+def extract_frames_at(input_path, output_dir, tasks, workers, duration=None, progress=None, accurate=False):
+    """Извлекает кадры [(отметка времени, путь)] параллельными поисками"""
+    errors = []
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='frame-seek') as executor:
+        results = executor.map(lambda task: extract_frame_at(input_path, task[0], task[1], accurate), tasks)
+        for done, (success, error) in enumerate(results, start=1):
+            if not success:
+                errors.append(error)
+            if progress is not None and duration:
+                # Прогресс по числу готовых кадров: позиция в видео и скорость условны
+                elapsed = time.time() - started
+                position = duration * done / len(tasks)
+                progress(build_progress_snapshot(
+                    {'out_time_us': str(int(position * 1_000_000)),
+                     'speed': str(position / elapsed) if elapsed > 0 else 'N/A',
+                     'progress': 'end' if done == len(tasks) else 'continue'},
+                    duration, elapsed
+                ))
+
+    frames = sorted(glob.glob(os.path.join(output_dir, 'frame_*.jpg')))
+    if not frames and errors:
+        return False, [], errors[0]
+    if errors:
+        print(f"[WARNING] Не удалось извлечь {len(errors)} из {len(tasks)} кадров: {errors[0]}")
+    return True, frames, None
+
+# ============================================
+# КАДРЫ ПО СМЕНАМ СЦЕН: кандидаты для обложки
+# ============================================
+# Вместо кадра каждые N секунд анализируется уменьшенная копия видео: оценка смены
+# сцены и средняя яркость каждого сэмпла. Из каждой сцены берется самый стабильный
+# кадр её середины, затемнения пропускаются, число кадров ограничено по длительности.
+
+# 4 сэмпла в секунду по 160px: metadata=print пишет оценки в лог FFmpeg (stderr)
+SCENE_ANALYSIS_FILTER = (
+    "fps=4,scale=160:-2,signalstats,select='gte(scene,0)',"
+    "metadata=print:key=lavfi.scene_score,metadata=print:key=lavfi.signalstats.YAVG"
+)
+SCENE_DARK_YAVG = 32  # Средняя яркость (0-255) ниже - затемнение, не кандидат
+SCENE_EDGE_SHARE = 0.2  # Доля сцены у каждого края, где идут переходы
+
+# frame_0003.jpg (по интервалу) или frame_0003_12480ms.jpg (по сценам, отметка в имени)
+FRAME_NAME_RE = re.compile(r'frame_(\d+)(?:_(\d+)ms)?\.jpg$')
+
+def frame_timestamp(frame_path, interval_seconds):
+    """Отметка времени кадра в секундах: из имени файла или по номеру и интервалу"""
+    match = FRAME_NAME_RE.search(os.path.basename(frame_path))
+    if not match:
+        return None
+    if match.group(2):
+        return int(match.group(2)) / 1000
+    return (int(match.group(1)) - 1) * interval_seconds
+
+def scene_cache_params():
+    """Параметры выбора по сценам для ключа кэша кадров"""
+    return {
+        'mode': 'scene',
+        'threshold': app.config['SCENE_THRESHOLD'],
+        'max_frames': app.config['SCENE_MAX_FRAMES'],
+        'seconds_per_frame': app.config['SCENE_SECONDS_PER_FRAME']
+    }
+
+def parse_scene_samples(stderr):
+    """Сэмплы анализа из лога FFmpeg: [(время, оценка смены сцены, яркость)] по времени"""
+    samples = {}
+    current = None
+    for line in stderr.decode('utf-8', errors='ignore').splitlines():
+        match = re.search(r'pts_time:\s*([-\d.]+)', line)
+        if match:
+            current = samples.setdefault(float(match.group(1)), {})
+            continue
+        match = re.search(r'(lavfi\.scene_score|lavfi\.signalstats\.YAVG)=([-\d.eE]+)', line)
+        if match and current is not None:
+            current[match.group(1)] = float(match.group(2))
+    return [
+        (timestamp, values.get('lavfi.scene_score', 0.0), values.get('lavfi.signalstats.YAVG', 255.0))
+        for timestamp, values in sorted(samples.items())
+    ]
+
+def choose_scene_timestamps(samples, duration):
+    """Отметки кадров-кандидатов: по одному на сцену, не больше лимита по длительности"""
+    if not samples:
+        return [duration / 2 if duration else 0.0]
+    end = duration or samples[-1][0]
+    seconds_per_frame = app.config['SCENE_SECONDS_PER_FRAME']
+    limit = max(1, min(app.config['SCENE_MAX_FRAMES'], math.ceil(end / seconds_per_frame)))
+
+    # Новая сцена начинается с сэмпла, оценка которого выше порога
+    cuts = [timestamp for timestamp, score, _ in samples[1:] if score >= app.config['SCENE_THRESHOLD']]
+    bounds = [0.0, *cuts, end]
+    scenes = [(start, stop) for start, stop in zip(bounds, bounds[1:]) if stop > start]
+
+    # Сцен больше лимита - оставляем самые длинные; меньше - делим самые длинные пополам
+    scenes = sorted(scenes, key=lambda scene: scene[1] - scene[0], reverse=True)[:limit]
+    while len(scenes) < limit:
+        start, stop = scenes[0]
+        if stop - start < 2 * seconds_per_frame:
+            break
+        middle = (start + stop) / 2
+        scenes = sorted([*scenes[1:], (start, middle), (middle, stop)],
+                        key=lambda scene: scene[1] - scene[0], reverse=True)
+
+    timestamps = []
+    for start, stop in sorted(scenes):
+        margin = (stop - start) * SCENE_EDGE_SHARE
+        middle = (start + stop) / 2
+        inner = [sample for sample in samples
+                 if start + margin <= sample[0] <= stop - margin and sample[2] >= SCENE_DARK_YAVG]
+        if inner:
+            # Самый стабильный сэмпл (наименьшая оценка смены), при равенстве - ближе к середине
+            timestamps.append(min(inner, key=lambda sample: (round(sample[1], 3), abs(sample[0] - middle)))[0])
+    return timestamps or [samples[len(samples) // 2][0]]
+
+def extract_scene_frames(input_path, output_dir, samples, duration, workers):
+    """Извлекает выбранные по сценам кадры точным поиском; отметка времени - в имени файла"""
+    timestamps = choose_scene_timestamps(samples, duration)
+    print(f"[DEBUG] Кадры по сценам: {len(timestamps)} из {len(samples)} сэмплов")
+    tasks = [
+        (timestamp, os.path.join(output_dir, f'frame_{idx + 1:04d}_{round(timestamp * 1000)}ms.jpg'))
+        for idx, timestamp in enumerate(timestamps)
+    ]
+    return extract_frames_at(input_path, output_dir, tasks, workers, accurate=True)
+
+def extract_frames(input_path, output_dir, interval_seconds=15, priority=PRIORITY_PUBLIC, mode='auto',
+                   progress=None):
     """Извлекает кадры из видео каждые N секунд"""
+    if mode != 'scene' and interval_seconds <= 0:
+        # fps=1/0 и бесконечный список отметок для поиска
+        return False, [], FRAME_INTERVAL_ERROR
     try:
         # Создаем папку для кадров
         os.makedirs(output_dir, exist_ok=True)
-        
+
+        # Режим: 'decode' - полное декодирование с фильтром fps,
+        # 'seek' - отдельный быстрый поиск на каждую отметку времени,
+        # 'scene' - кадры по сменам сцен (interval_seconds не используется),
+        # 'auto' - выбор по порогу FRAME_SEEK_MIN_INTERVAL
+        duration = None
+        if mode in ('auto', 'seek', 'scene') or progress is not None:
+            duration = probe_duration(input_path)
+        if mode == 'auto':
+            mode = choose_frames_mode(interval_seconds, duration)
+        elif mode == 'seek' and duration is None:
+            print("[WARNING] Не удалось определить длительность, используем полное декодирование")
+            mode = 'decode'
+
         # Команда FFmpeg для извлечения кадров
         # -ss пропускает первые N секунд, -i входной файл
         # -vf fps=1/15 означает 1 кадр каждые 15 секунд
         # %04d - нумерация кадров с 4 цифрами
         output_pattern = os.path.join(output_dir, 'frame_%04d.jpg')
-        
-        cmd = [
-            'ffmpeg',
-            '-i', input_path,
-            '-vf', f'fps=1/{interval_seconds}',  # 1 кадр каждые N секунд
-            '-q:v', '2',  # Качество JPEG (1-31, 2 = высокое качество)
-            '-y',  # Перезаписать существующие файлы
-            output_pattern
-        ]
-        
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True,
-            timeout=3600  # 60 минут максимум для больших файлов
-        )
+
+        # Ждем свободный слот планировщика; threads - потоки декодера
+        with ENCODE_SCHEDULER.slot(priority) as threads:
+            if mode == 'seek':
+                # Поиски однопоточные, поэтому параллелим их в пределах потоков слота
+                workers = max(1, min(app.config['FRAME_SEEK_WORKERS'], threads))
+                started = time.monotonic()
+                success, frames, error = extract_frames_seek(input_path, output_dir, interval_seconds, duration,
+                                                             workers, progress)
+                elapsed = time.monotonic() - started
+                METRICS.observe_stage('extract_frames', elapsed, success, duration / elapsed if elapsed else None)
+                if success:
+                    METRICS.observe_ffmpeg_bytes('extract_frames', os.path.getsize(input_path), files_size(frames))
+                return success, frames, error
+
+            if mode == 'scene':
+                # Анализ декодирует видео без записи кадров, затем точные поиски выбранных отметок
+                result = run_ffmpeg([
+                    'ffmpeg',
+                    '-threads', str(threads),
+                    '-i', input_path,
+                    '-map', '0:v:0',
+                    '-vf', SCENE_ANALYSIS_FILTER,
+                    '-f', 'null', '-'
+                ], timeout=3600, progress=progress, duration=duration, stage='extract_frames')
+                workers = max(1, min(app.config['FRAME_SEEK_WORKERS'], threads))
+                success, frames, error = extract_scene_frames(
+                    input_path, output_dir, parse_scene_samples(result.stderr), duration, workers
+                )
+                if success:
+                    METRICS.observe_ffmpeg_bytes('extract_frames', os.path.getsize(input_path), files_size(frames))
+                return success, frames, error
+
+            cmd = [
+                'ffmpeg',
+                '-threads', str(threads),
+                '-i', input_path,
+                '-vf', f'fps=1/{interval_seconds}',  # 1 кадр каждые N секунд
+                '-q:v', '2',  # Качество JPEG (1-31, 2 = высокое качество)
+                '-y',  # Перезаписать существующие файлы
+                output_pattern
+            ]
+
+            # 60 минут максимум для больших файлов
+            run_ffmpeg(cmd, timeout=3600, progress=progress, duration=duration, stage='extract_frames')
         
         # Получаем список извлеченных кадров
         frames = sorted(glob.glob(os.path.join(output_dir, 'frame_*.jpg')))
+        METRICS.observe_ffmpeg_bytes('extract_frames', os.path.getsize(input_path), files_size(frames))
         return True, frames, None
         
     except subprocess.TimeoutExpired:
@@ -144,188 +993,2697 @@ def extract_frames(input_path, output_dir, interval_seconds=15):
     except Exception as e:
         return False, [], f"Ошибка извлечения кадров: {str(e)}"
 
-def upload_to_bucket(file_path, bucket_path, bucket_type='local'):
-    """Загружает файл в бакет (bucket storage)"""
-    if bucket_type == 'local':
-        # Для локального хранения просто возвращаем путь
-        return file_path, None
+# ============================================
+# ХРАНИЛИЩА ФАЙЛОВ (БАКЕТЫ)
+# ============================================
+
+class StorageBackend:
+    """Базовый бэкенд хранилища: загрузка файла, потока и пакета файлов.
+
+    Методы загрузки возвращают (url, error) по соглашению остального кода.
+    """
+
+    name = 'base'
+
+    def public_url(self, key):
+        raise NotImplementedError
+
+    def upload_fileobj(self, fileobj, key, content_type=None):
+        """Загружает поток (открытый файл) без чтения целиком в память"""
+        raise NotImplementedError
+
+    def upload_file(self, file_path, key, content_type=None):
+        with open(file_path, 'rb') as f:
+            return self.upload_fileobj(f, key, content_type or guess_content_type(file_path))
+
+    def upload_file_measured(self, file_path, key, content_type=None):
+        """upload_file с записью длительности и объема загрузки в метрики"""
+        started = time.monotonic()
+        url, error = self.upload_file(file_path, key, content_type)
+        METRICS.observe_storage_upload(self.name, time.monotonic() - started, files_size([file_path]), error is None)
+        return url, error
+
+    def upload_many(self, items, concurrency=8):
+        """Загружает пары (file_path, key) параллельно; результаты (url, error) в порядке items"""
+        items = list(items)
+        if not items:
+            return []
+        workers = max(1, min(concurrency, len(items)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'{self.name}-upload') as executor:
+            return list(executor.map(lambda item: self.upload_file_measured(*item), items))
+
+
+class LocalStorage(StorageBackend):
+    """Локальное хранение: файл остается на месте, URL - его путь"""
+
+    name = 'local'
+
+    def public_url(self, key):
+        return key
+
+    def upload_file(self, file_path, key, content_type=None):
+        # Для локального хранения просто возвращаем путь
+        return file_path, None
+
+    def upload_fileobj(self, fileobj, key, content_type=None):
+        return None, "Локальное хранилище не принимает потоки"
+
+
+class S3Storage(StorageBackend):
+    """S3 и совместимые хранилища (Yandex Object Storage) через один клиент boto3.
+
+    Крупные файлы отправляются multipart-загрузкой: части по
+    STORAGE_MULTIPART_CHUNKSIZE в STORAGE_MAX_CONCURRENCY потоков.
+    """
+
+    def __init__(self, name, bucket_name, url_prefix, endpoint_url=None, region_name=None):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+
+        self.name = name
+        self.bucket_name = bucket_name
+        self.url_prefix = url_prefix.rstrip('/')
+        # Пул соединений должен вмещать параллельные загрузки и части multipart
+        pool_size = max(10, app.config['FRAME_UPLOAD_CONCURRENCY'], app.config['STORAGE_MAX_CONCURRENCY'])
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region_name,
+            aws_access_key_id=app.config['AWS_ACCESS_KEY_ID'],
+            aws_secret_access_key=app.config['AWS_SECRET_ACCESS_KEY'],
+            config=Config(max_pool_connections=pool_size, retries={'mode': 'standard'})
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=app.config['STORAGE_MULTIPART_THRESHOLD'],
+            multipart_chunksize=app.config['STORAGE_MULTIPART_CHUNKSIZE'],
+            max_concurrency=app.config['STORAGE_MAX_CONCURRENCY'],
+            use_threads=True
+        )
+
+    def public_url(self, key):
+        return f"{self.url_prefix}/{key}"
+
+    def _extra_args(self, content_type):
+        return {'ContentType': content_type} if content_type else None
+
+    def upload_file(self, file_path, key, content_type=None):
+        try:
+            self.client.upload_file(
+                file_path, self.bucket_name, key,
+                ExtraArgs=self._extra_args(content_type or guess_content_type(file_path)),
+                Config=self.transfer_config
+            )
+            return self.public_url(key), None
+        except Exception as e:
+            return None, f"Ошибка загрузки в {self.name}: {str(e)}"
+
+    def upload_fileobj(self, fileobj, key, content_type=None):
+        try:
+            self.client.upload_fileobj(
+                fileobj, self.bucket_name, key,
+                ExtraArgs=self._extra_args(content_type),
+                Config=self.transfer_config
+            )
+            return self.public_url(key), None
+        except Exception as e:
+            return None, f"Ошибка загрузки в {self.name}: {str(e)}"
+
+
+class SupabaseStorage(StorageBackend):
+    """Supabase Storage через прямой HTTP API и общий HTTP-клиент.
+
+    Файлы от SUPABASE_RESUMABLE_THRESHOLD загружаются по протоколу TUS.
+    """
+
+    name = 'supabase'
+
+    def __init__(self, bucket_name):
+        self.bucket_name = bucket_name
+        self.supabase_url = app.config.get('SUPABASE_URL', '').rstrip('/')
+        self.supabase_key = app.config.get('SUPABASE_KEY', '')
+
+    def object_path(self, key):
+        """Путь объекта относительно SUPABASE_URL (формат, который хранится в БД)"""
+        return f"/storage/v1/object/public/{self.bucket_name}/{key}"
+
+    def public_url(self, key):
+        return f"{self.supabase_url}{self.object_path(key)}"
+
+    def upload_file(self, file_path, key, content_type=None):
+        # Большие файлы загружаем по протоколу TUS: блоками с диска и с докачкой после сбоев
+        if os.path.getsize(file_path) >= app.config['SUPABASE_RESUMABLE_THRESHOLD']:
+            _, error = upload_to_supabase_resumable(
+                file_path, key, self.bucket_name,
+                content_type or guess_content_type(file_path)
+            )
+            return (None, error) if error else (self.public_url(key), None)
+        return super().upload_file(file_path, key, content_type)
+
+    def upload_fileobj(self, fileobj, key, content_type=None):
+        if not self.supabase_url or not self.supabase_key:
+            return None, 'Supabase URL или KEY не установлены'
+
+        headers = {
+            'Authorization': f'Bearer {self.supabase_key}',
+            'Content-Type': content_type or 'application/octet-stream',
+            'x-upsert': 'true'  # Перезаписываем если существует
+        }
+        try:
+            # Общий клиент: соединение с Storage переиспользуется между вызовами.
+            # Файл передается потоком, а не читается целиком в память
+            response = get_http_client().post(
+                f"{self.supabase_url}/storage/v1/object/{self.bucket_name}/{key}",
+                content=fileobj, headers=headers, timeout=300.0
+            )
+        except Exception as e:
+            return None, f"Ошибка загрузки в Supabase Storage: {str(e)}"
+
+        if response.status_code in [200, 201]:
+            return self.public_url(key), None
+        return None, f'Ошибка загрузки: {response.status_code} - {response.text[:500]}'
+
+    def delete_many(self, keys):
+        """Удаляет объекты бакета одним запросом; None или ошибка"""
+        keys = list(keys)
+        if not keys:
+            return None
+        if not self.supabase_url or not self.supabase_key:
+            return 'Supabase URL или KEY не установлены'
+        try:
+            response = get_http_client().request(
+                'DELETE', f"{self.supabase_url}/storage/v1/object/{self.bucket_name}",
+                json={'prefixes': keys}, headers={'Authorization': f'Bearer {self.supabase_key}'}, timeout=60.0
+            )
+        except Exception as e:
+            return f"Ошибка удаления из Supabase Storage: {str(e)}"
+        if response.status_code != 200:
+            return f'Ошибка удаления: {response.status_code} - {response.text[:500]}'
+        return None
+
+
+# Типы HLS, которых нет (или нет во всех версиях) в таблице mimetypes
+HLS_CONTENT_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.m4s': 'video/iso.segment'
+}
+
+def guess_content_type(file_path):
+    """MIME-тип файла по расширению"""
+    import mimetypes
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in HLS_CONTENT_TYPES:
+        return HLS_CONTENT_TYPES[extension]
+    return mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+
+# Бэкенды создаются один раз на процесс (после fork - заново) и используются всеми потоками
+_STORAGES = {}
+_STORAGES_PID = None
+_STORAGES_LOCK = threading.Lock()
+
+def create_storage(bucket_type, bucket_name=None):
+    """Создает бэкенд хранилища по типу бакета"""
+    if bucket_type == 'local':
+        return LocalStorage()
+
+    if bucket_type == 's3':
+        bucket_name = bucket_name or app.config['BUCKET_NAME']
+        return S3Storage(
+            's3', bucket_name,
+            url_prefix=f"https://{bucket_name}.s3.{app.config['AWS_REGION']}.amazonaws.com",
+            region_name=app.config['AWS_REGION']
+        )
+
+    if bucket_type == 'yandex':
+        bucket_name = bucket_name or app.config['BUCKET_NAME']
+        return S3Storage(
+            'yandex', bucket_name,
+            url_prefix=f"{app.config['YANDEX_ENDPOINT']}/{bucket_name}",
+            endpoint_url=app.config['YANDEX_ENDPOINT']
+        )
+
+    if bucket_type == 'supabase':
+        return SupabaseStorage(bucket_name or app.config['SUPABASE_BUCKET'])
+
+    raise ValueError(f"Неподдерживаемый тип бакета: {bucket_type}")
+
+def get_storage(bucket_type, bucket_name=None):
+    """Возвращает общий бэкенд хранилища для типа бакета и имени бакета"""
+    global _STORAGES_PID
+
+    with _STORAGES_LOCK:
+        if _STORAGES_PID != os.getpid():
+            _STORAGES.clear()
+            _STORAGES_PID = os.getpid()
+
+        key = (bucket_type, bucket_name)
+        storage = _STORAGES.get(key)
+        if storage is None:
+            storage = create_storage(bucket_type, bucket_name)
+            _STORAGES[key] = storage
+        return storage
+
+def upload_frames_to_bucket(frames, file_id, bucket_type):
+    """Загружает кадры в бакет параллельно; результаты в порядке кадров"""
+    try:
+        storage = get_storage(bucket_type)
+    except ImportError:
+        return [], ["boto3 не установлен. Установите: pip install boto3"]
+    except Exception as e:
+        return [], [f"Ошибка подключения к хранилищу: {str(e)}"]
+
+    # Формируем пути в бакете (одна метка времени на всю пачку)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    items = [(frame_path, f"frames/{file_id}/{timestamp}_{os.path.basename(frame_path)}") for frame_path in frames]
+    results = storage.upload_many(items, concurrency=app.config['FRAME_UPLOAD_CONCURRENCY'])
+
+    uploaded_files = []
+    errors = []
+    for idx, (frame_path, (url, upload_error)) in enumerate(zip(frames, results)):
+        frame_filename = os.path.basename(frame_path)
+        if url:
+            uploaded_files.append({
+                'filename': frame_filename,
+                'url': url,
+                'local_path': frame_path,
+                'index': idx + 1
+            })
+        else:
+            errors.append(f"Ошибка загрузки {frame_filename}: {upload_error}")
+
+    return uploaded_files, errors
+
+def upload_to_bucket(file_path, bucket_path, bucket_type='local'):
+    """Загружает файл в бакет (bucket storage)"""
+    try:
+        storage = get_storage(bucket_type)
+    except ImportError:
+        return None, "boto3 не установлен. Установите: pip install boto3"
+    except ValueError as e:
+        return None, str(e)
+    except Exception as e:
+        return None, f"Ошибка подключения к хранилищу: {str(e)}"
+
+    return storage.upload_file_measured(file_path, bucket_path)
+
+# max_copy_bitrate - до какого битрейта видео H.264 копируется без перекодирования
+VIDEO_RESOLUTIONS = {
+    '1080': {'width': 1920, 'height': 1080, 'max_copy_bitrate': 8_000_000},
+    '720': {'width': 1280, 'height': 720, 'max_copy_bitrate': 5_000_000},
+    '480': {'width': 854, 'height': 480, 'max_copy_bitrate': 2_500_000},
+    '360': {'width': 640, 'height': 360, 'max_copy_bitrate': 1_500_000}
+}
+
+def build_scale_filter(resolution):
+    """Фильтр масштабирования до ширины разрешения с сохранением пропорций"""
+    if resolution not in VIDEO_RESOLUTIONS:
+        raise ValueError(f"Неподдерживаемое разрешение: {resolution}")
+
+    # Используем scale с сохранением пропорций и округлением до четных чисел
+    target_res = VIDEO_RESOLUTIONS[resolution]
+    # Используем -2 для автоматического округления до ближайшего четного числа
+    # force_original_aspect_ratio=decrease - сохраняет пропорции, не добавляет черные полосы
+    # decrease пересчитывает ширину и может сделать её нечетной (854 для вертикального видео
+    # дает 853), поэтому force_divisible_by=2 - libx264 требует четные размеры
+    return f"scale={target_res['width']}:-2:force_original_aspect_ratio=decrease:force_divisible_by=2"
+
+def build_video_encode_args(threads):
+    """Параметры кодирования видео H.264"""
+    return ['-c:v', 'libx264', '-preset', 'medium', '-crf', '23', '-threads', str(threads)]
+
+def build_audio_encode_args():
+    """Параметры кодирования звука AAC"""
+    return ['-c:a', 'aac', '-b:a', '128k']
+
+def build_h264_output_args(threads):
+    """Параметры кодирования H.264/AAC, общие для всех режимов сжатия"""
+    return [*build_video_encode_args(threads), *build_audio_encode_args(), '-movflags', '+faststart']
+
+# ============================================
+# АНАЛИЗ ИСХОДНИКА: ffprobe и план кодирования
+# ============================================
+# Перед сжатием исходник проверяется ffprobe: битые файлы и файлы без длительности
+# отклоняются сразу, а потоки, которые уже подходят под цель, копируются без перекодирования.
+
+AUDIO_COPY_CODECS = {'aac'}
+AUDIO_COPY_MAX_BITRATE = 192_000  # Выше - перекодируем в AAC 128k
+AUDIO_COPY_MAX_CHANNELS = 2
+VIDEO_COPY_PIX_FMTS = {'yuv420p'}  # 8 бит 4:2:0 - воспроизводится всеми браузерами
+
+def _stream_rotation(stream):
+    """Поворот видео в градусах (тег rotate или display matrix)"""
+    rotation = _progress_number((stream.get('tags') or {}).get('rotate'))
+    for side_data in stream.get('side_data_list') or []:
+        if 'rotation' in side_data:
+            rotation = _progress_number(str(side_data['rotation']))
+    return int(rotation or 0) % 360
+
+def probe_media(input_path):
+    """Читает контейнер и потоки через ffprobe; (info, None) или (None, ошибка).
+
+    Ошибка возвращается для битых файлов, файлов без видео и с нулевой длительностью.
+    """
+    try:
+        result = subprocess.run(
+            [
+                'ffprobe',
+                '-v', 'error',
+                '-print_format', 'json',
+                '-show_format',
+                '-show_streams',
+                input_path
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=60
+        )
+    except FileNotFoundError:
+        return None, "FFprobe не найден. Убедитесь, что FFmpeg установлен и доступен в PATH"
+    except subprocess.TimeoutExpired:
+        return None, "Не удалось прочитать файл: превышено время анализа"
+
+    try:
+        data = json.loads(result.stdout.decode('utf-8', errors='ignore') or '{}')
+    except ValueError:
+        data = {}
+    if result.returncode != 0 or 'format' not in data:
+        # Подробности ffprobe только в лог: в них пути временных файлов сервера
+        details = result.stderr.decode('utf-8', errors='ignore').strip()[:500]
+        print(f"[WARNING] ffprobe не смог прочитать {os.path.basename(input_path)}: {details}")
+        return None, "Файл поврежден или не является видео"
+
+    streams = data.get('streams', [])
+    # Обложки (attached_pic) в MP4/MKV тоже видеопотоки - пропускаем их
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'
+                  and not (stream.get('disposition') or {}).get('attached_pic')), None)
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+    if video is None:
+        return None, "В файле нет видеопотока"
+    if not video.get('width') or not video.get('height'):
+        return None, "Не удалось определить размер кадра: файл поврежден"
+
+    container = data['format']
+    duration = _progress_number(container.get('duration')) or _progress_number(video.get('duration'))
+    if not duration or duration <= 0:
+        return None, "Видео нулевой длительности или длительность не определяется"
+
+    size = int(_progress_number(container.get('size')) or 0)
+    total_bitrate = _progress_number(container.get('bit_rate')) or (size * 8 / duration if size else None)
+    audio_bitrate = _progress_number(audio.get('bit_rate')) if audio else None
+    video_bitrate = _progress_number(video.get('bit_rate'))
+    if video_bitrate is None and total_bitrate:
+        # MKV/WebM не хранят битрейт потока - оцениваем по контейнеру
+        video_bitrate = total_bitrate - (audio_bitrate or 0)
+
+    # Размер кадра с учетом поворота - таким его покажет плеер и увидит фильтр scale
+    width, height = video['width'], video['height']
+    if _stream_rotation(video) in (90, 270):
+        width, height = height, width
+
+    return {
+        'duration': duration,
+        'start_time': _progress_number(container.get('start_time')) or 0.0,
+        'size': size,
+        'format_name': container.get('format_name'),
+        'video': {
+            'index': video['index'],
+            'codec': video.get('codec_name'),
+            'pix_fmt': video.get('pix_fmt'),
+            'width': width,
+            'height': height,
+            'bit_rate': video_bitrate
+        },
+        'audio': {
+            'index': audio['index'],
+            'codec': audio.get('codec_name'),
+            'channels': audio.get('channels'),
+            'bit_rate': audio_bitrate
+        } if audio else None
+    }, None
+
+def plan_encode(media, resolution):
+    """Решает для каждого потока: 'copy' (уже подходит под цель) или 'encode'.
+
+    Видео копируется, если это H.264 yuv420p не шире целевого разрешения и с битрейтом
+    не выше max_copy_bitrate; звук - если это AAC до 2 каналов и 192 kbit/s.
+    """
+    target = VIDEO_RESOLUTIONS[resolution]
+    video = media['video']
+    audio = media['audio']
+    smart_copy = app.config['SMART_COPY_ENABLED']
+
+    video_reasons = []
+    if not smart_copy:
+        video_reasons.append('копирование отключено')
+    if video['codec'] != 'h264':
+        video_reasons.append(f"кодек {video['codec']}")
+    if video['pix_fmt'] not in VIDEO_COPY_PIX_FMTS:
+        video_reasons.append(f"формат пикселей {video['pix_fmt']}")
+    if video['width'] > target['width']:
+        video_reasons.append(f"ширина {video['width']} > {target['width']}")
+    if not video['bit_rate'] or video['bit_rate'] > target['max_copy_bitrate']:
+        video_reasons.append(f"битрейт {round((video['bit_rate'] or 0) / 1000)}k")
+
+    if audio is None:
+        audio_mode = 'none'
+    elif (smart_copy and audio['codec'] in AUDIO_COPY_CODECS
+          and (audio['channels'] or 0) <= AUDIO_COPY_MAX_CHANNELS
+          and audio['bit_rate'] and audio['bit_rate'] <= AUDIO_COPY_MAX_BITRATE):
+        audio_mode = 'copy'
+    else:
+        audio_mode = 'encode'
+
+    return {
+        'video': 'encode' if video_reasons else 'copy',
+        'audio': audio_mode,
+        'video_index': video['index'],
+        'audio_index': audio['index'] if audio else None,
+        'reasons': video_reasons
+    }
+
+def build_audio_output_args(plan):
+    """Выбор и параметры звуковой дорожки по плану"""
+    if plan['audio'] == 'none':
+        return []
+    codec_args = ['-c:a', 'copy'] if plan['audio'] == 'copy' else build_audio_encode_args()
+    return ['-map', f"0:{plan['audio_index']}", *codec_args]
+
+def describe_plan(plan):
+    reasons = f" ({', '.join(plan['reasons'])})" if plan['reasons'] else ''
+    return f"видео {plan['video']}{reasons}, звук {plan['audio']}"
+
+def compress_video(input_path, output_path, resolution, priority=PRIORITY_PUBLIC, progress=None):
+    """Сжимает видео до указанного разрешения используя FFmpeg.
+
+    Потоки, которые уже подходят под цель (см. plan_encode), копируются без перекодирования.
+    """
+    # Команда FFmpeg для сжатия видео
+    scale_filter = build_scale_filter(resolution)
+
+    # Битый файл отклоняем до того, как FFmpeg потратит на него минуты
+    media, error = probe_media(input_path)
+    if error:
+        return False, error
+    plan = plan_encode(media, resolution)
+    print(f"[DEBUG] План сжатия до {resolution}p: {describe_plan(plan)}")
+
+    if plan['video'] == 'encode':
+        # Длинное видео кодируем частями в нескольких процессах
+        segments = plan_video_segments(input_path, media)
+        if len(segments) > 1:
+            return compress_video_segmented(input_path, output_path, resolution, media, plan, segments,
+                                            priority=priority, progress=progress)
+
+    if plan['video'] == 'copy':
+        # Перепаковка почти не нагружает CPU - не ждем слот за долгими кодированиями
+        stage = 'remux_video'
+        slot = nullcontext(1)
+    else:
+        stage = 'compress_video'
+        # threads ограничивает декодер и libx264
+        slot = ENCODE_SCHEDULER.slot(priority)
+
+    try:
+        with slot as threads:
+            if plan['video'] == 'copy':
+                video_args = ['-c:v', 'copy']
+            else:
+                video_args = ['-vf', scale_filter, *build_video_encode_args(threads)]
+
+            cmd = [
+                'ffmpeg',
+                '-threads', str(threads),
+                '-i', input_path,
+                '-map', f"0:{plan['video_index']}",
+                *video_args,
+                *build_audio_output_args(plan),
+                '-movflags', '+faststart',
+                '-y',  # Перезаписать выходной файл
+                output_path
+            ]
+
+            # 60 минут максимум для больших файлов
+            run_ffmpeg(cmd, timeout=3600, progress=progress, duration=media['duration'], stage=stage)
+        METRICS.observe_ffmpeg_bytes(stage, os.path.getsize(input_path), os.path.getsize(output_path))
+        return True, None
+    except subprocess.TimeoutExpired:
+        return False, "Превышено время ожидания обработки"
+    except subprocess.CalledProcessError as e:
+        return False, f"Ошибка FFmpeg: {e.stderr.decode('utf-8', errors='ignore')}"
+    except FileNotFoundError:
+        return False, "FFmpeg не найден. Убедитесь, что FFmpeg установлен и доступен в PATH"
+
+# ============================================
+# КОДИРОВАНИЕ ЧАСТЯМИ: длинное видео делится по ключевым кадрам
+# ============================================
+# Один libx264 плохо масштабируется больше чем на несколько потоков. Длинный исходник
+# режется по ключевым кадрам на части, каждая кодируется своим процессом FFmpeg в своем
+# слоте планировщика с одинаковыми параметрами, звук кодируется отдельно целиком,
+# затем части склеиваются без перекодирования (concat) в один MP4 с +faststart.
+
+def probe_keyframe_times(input_path, media):
+    """Отметки ключевых кадров видео в секундах от начала файла (по пакетам, без декодирования)"""
+    try:
+        result = subprocess.run(
+            [
+                'ffprobe',
+                '-v', 'error',
+                '-select_streams', str(media['video']['index']),
+                '-show_entries', 'packet=pts_time,flags',
+                '-of', 'csv=p=0',
+                input_path
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=300
+        )
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return []
+    if result.returncode != 0:
+        return []
+
+    keyframes = []
+    for line in result.stdout.decode('utf-8', errors='ignore').splitlines():
+        pts_time, _, flags = line.strip().partition(',')
+        timestamp = _progress_number(pts_time)
+        if timestamp is not None and flags.startswith('K'):
+            keyframes.append(timestamp - media['start_time'])
+    return sorted(keyframes)
+
+def plan_video_segments(input_path, media):
+    """Границы частей [(start, end)] для кодирования частями; одна часть - кодировать целиком.
+
+    Части начинаются на ключевых кадрах не реже SEGMENT_SECONDS; у последней end=None.
+    """
+    min_duration = app.config['SEGMENT_ENCODE_MIN_DURATION']
+    segment_seconds = app.config['SEGMENT_SECONDS']
+    whole = [(0.0, None)]
+    if not min_duration or media['duration'] < min_duration or segment_seconds <= 0:
+        return whole
+    # На одном слоте части кодировались бы по очереди - выигрыша нет
+    if segment_workers() < 2:
+        return whole
+
+    boundaries = [0.0]
+    for timestamp in probe_keyframe_times(input_path, media):
+        # Короткий хвост не выделяем в отдельную часть
+        if timestamp >= boundaries[-1] + segment_seconds and media['duration'] - timestamp >= segment_seconds / 2:
+            boundaries.append(timestamp)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:] + [None])]
+
+def segment_workers():
+    return app.config['SEGMENT_WORKERS'] or ENCODE_SCHEDULER.slots
+
+def compress_video_segmented(input_path, output_path, resolution, media, plan, segments,
+                             priority=PRIORITY_PUBLIC, progress=None):
+    """Сжимает видео частями параллельно (см. plan_video_segments) и склеивает их без перекодирования"""
+    work_dir = f'{os.path.splitext(output_path)[0]}_segments'
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    scale_filter = build_scale_filter(resolution)
+    workers = min(segment_workers(), len(segments))
+    print(f"[DEBUG] Кодирование частями: {len(segments)} частей, одновременно {workers}")
+
+    # Общий прогресс: сумма закодированных секунд всех частей
+    encoded_seconds = [0.0] * len(segments)
+    progress_lock = threading.Lock()
+    started = time.time()
+
+    def report(idx, snapshot):
+        with progress_lock:
+            encoded_seconds[idx] = snapshot['out_time_seconds']
+            done = sum(encoded_seconds)
+        elapsed = time.time() - started
+        speed = done / elapsed if elapsed > 0 else None
+        progress({
+            'percent': round(min(99.9, done / media['duration'] * 100), 1),
+            'out_time_seconds': round(done, 1),
+            'duration_seconds': round(media['duration'], 1),
+            'speed': round(speed, 3) if speed is not None else None,
+            'fps': None,
+            'eta_seconds': round((media['duration'] - done) / speed) if speed else None,
+            'elapsed_seconds': round(elapsed, 1),
+            'below_realtime': speed is not None and speed < 1.0
+        })
+
+    def encode_segment(idx):
+        start, end = segments[idx]
+        segment_path = os.path.join(work_dir, f'segment_{idx:04d}.mp4')
+        with ENCODE_SCHEDULER.slot(priority) as threads:
+            # -ss перед -i с точным поиском: часть начинается ровно с ключевого кадра границы,
+            # -t обрезает ее перед следующей границей - кадры не теряются и не повторяются
+            cmd = ['ffmpeg', '-y', '-threads', str(threads)]
+            if start:
+                cmd += ['-ss', f'{start:.6f}']
+            cmd += ['-i', input_path]
+            if end is not None:
+                cmd += ['-t', f'{end - start:.6f}']
+            cmd += [
+                '-map', f"0:{plan['video_index']}",
+                '-vf', scale_filter,
+                *build_video_encode_args(threads),
+                '-an',
+                segment_path
+            ]
+            segment_progress = (lambda snapshot: report(idx, snapshot)) if progress is not None else None
+            run_ffmpeg(cmd, timeout=3600, progress=segment_progress, duration=(end or media['duration']) - start,
+                       stage='compress_segment')
+        return segment_path
+
+    def encode_audio():
+        audio_path = os.path.join(work_dir, 'audio.m4a')
+        # Звук кодируется целиком: AAC на границах частей дал бы щелчки и рассинхрон.
+        # Кодирование занимает слот наравне с частями, копирование потока - нет
+        cmd = ['ffmpeg', '-y', '-i', input_path, *build_audio_output_args(plan), '-vn', audio_path]
+        with ENCODE_SCHEDULER.slot(priority) if plan['audio'] == 'encode' else nullcontext(1):
+            run_ffmpeg(cmd, timeout=3600, stage='compress_audio')
+        return audio_path
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers + 1, thread_name_prefix='segment') as executor:
+            audio_future = executor.submit(encode_audio) if plan['audio'] != 'none' else None
+            segment_futures = [executor.submit(encode_segment, idx) for idx in range(len(segments))]
+            try:
+                segment_paths = [future.result() for future in segment_futures]
+                audio_path = audio_future.result() if audio_future else None
+            except BaseException:
+                # Очередные части не запускаем - задача все равно провалена
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+        list_path = os.path.join(work_dir, 'segments.txt')
+        with open(list_path, 'w') as f:
+            for segment_path in segment_paths:
+                f.write(f"file '{segment_path}'\n")
+
+        cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio_path:
+            cmd += ['-i', audio_path]
+        cmd += ['-map', '0:v']
+        if audio_path:
+            cmd += ['-map', '1:a']
+        cmd += ['-c', 'copy', '-movflags', '+faststart', output_path]
+        run_ffmpeg(cmd, timeout=3600, stage='concat_segments')
+
+        METRICS.observe_ffmpeg_bytes('compress_segment', os.path.getsize(input_path), os.path.getsize(output_path))
+        return True, None
+    except subprocess.TimeoutExpired:
+        return False, "Превышено время ожидания обработки"
+    except subprocess.CalledProcessError as e:
+        return False, f"Ошибка FFmpeg: {e.stderr.decode('utf-8', errors='ignore')}"
+    except FileNotFoundError:
+        return False, "FFmpeg не найден. Убедитесь, что FFmpeg установлен и доступен в PATH"
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def build_renditions_filter(media, resolutions):
+    """filter_complex для нескольких разрешений: [0:N] -> split -> scale -> [v0], [v1], ... (None - кодировать нечего)"""
+    video_input = f"[0:{media['video']['index']}]"
+    if len(resolutions) == 1:
+        return f"{video_input}{build_scale_filter(resolutions[0])}[v0]"
+    if not resolutions:
+        return None
+    split_labels = ''.join(f'[s{idx}]' for idx in range(len(resolutions)))
+    return ';'.join([
+        f"{video_input}split={len(resolutions)}{split_labels}",
+        *(f"[s{idx}]{build_scale_filter(resolution)}[v{idx}]" for idx, resolution in enumerate(resolutions))
+    ])
+
+def compress_video_ladder(input_path, outputs, priority=PRIORITY_PUBLIC, progress=None):
+    """Сжимает видео сразу в несколько разрешений за одно декодирование источника.
+
+    outputs - {resolution: output_path}. Кадры источника split-фильтр раздает
+    кодировщикам всех разрешений; разрешения, под которые исходник уже подходит,
+    копируются (см. plan_encode).
+    """
+    media, error = probe_media(input_path)
+    if error:
+        return False, error
+    plans = {resolution: plan_encode(media, resolution) for resolution in outputs}
+    encoded = [resolution for resolution in outputs if plans[resolution]['video'] == 'encode']
+    for resolution in outputs:
+        print(f"[DEBUG] План лесенки {resolution}p: {describe_plan(plans[resolution])}")
+
+    filter_graph = build_renditions_filter(media, encoded)
+    stage = 'compress_ladder' if encoded else 'remux_video'
+    slot = ENCODE_SCHEDULER.slot(priority) if encoded else nullcontext(1)
+
+    try:
+        with slot as threads:
+            cmd = ['ffmpeg', '-y', '-threads', str(threads), '-i', input_path]
+            if filter_graph:
+                cmd += ['-filter_complex', filter_graph]
+
+            for resolution, output_path in outputs.items():
+                plan = plans[resolution]
+                if plan['video'] == 'copy':
+                    video_args = ['-map', f"0:{plan['video_index']}", '-c:v', 'copy']
+                else:
+                    # Кодировщики работают по очереди над каждым кадром, поэтому каждому - все потоки слота
+                    video_args = ['-map', f"[v{encoded.index(resolution)}]", *build_video_encode_args(threads)]
+                cmd += [*video_args, *build_audio_output_args(plan), '-movflags', '+faststart', output_path]
+
+            # 60 минут максимум для больших файлов
+            run_ffmpeg(cmd, timeout=3600, progress=progress, duration=media['duration'], stage=stage)
+        METRICS.observe_ffmpeg_bytes(stage, os.path.getsize(input_path), files_size(outputs.values()))
+        return True, None
+    except subprocess.TimeoutExpired:
+        return False, "Превышено время ожидания обработки"
+    except subprocess.CalledProcessError as e:
+        return False, f"Ошибка FFmpeg: {e.stderr.decode('utf-8', errors='ignore')}"
+    except FileNotFoundError:
+        return False, "FFmpeg не найден. Убедитесь, что FFmpeg установлен и доступен в PATH"
+
+def package_hls(input_path, output_dir, resolutions, priority=PRIORITY_ADMIN, progress=None):
+    """Упаковывает видео в HLS: output_dir/master.m3u8 и {resolution}p/ с init.mp4, сегментами и index.m3u8.
+
+    Разрешения, под которые исходник уже подходит, копируются. Остальные кодируются с
+    ключевыми кадрами там же, где они у исходника: границы сегментов во всех разрешениях
+    совпадают, и плеер переключается между ними без рывков.
+    """
+    media, error = probe_media(input_path)
+    if error:
+        return False, error
+    plans = {resolution: plan_encode(media, resolution) for resolution in resolutions}
+    encoded = [resolution for resolution in resolutions if plans[resolution]['video'] == 'encode']
+    for resolution in resolutions:
+        print(f"[DEBUG] План HLS {resolution}p: {describe_plan(plans[resolution])}")
+
+    filter_graph = build_renditions_filter(media, encoded)
+    # Звук от разрешения не зависит - план общий
+    audio_plan = plans[resolutions[0]]
+    slot = ENCODE_SCHEDULER.slot(priority) if encoded else nullcontext(1)
+
+    try:
+        with slot as threads:
+            cmd = ['ffmpeg', '-y', '-threads', str(threads), '-i', input_path]
+            if filter_graph:
+                cmd += ['-filter_complex', filter_graph]
+
+            stream_map = []
+            copy_args = []
+            for idx, resolution in enumerate(resolutions):
+                plan = plans[resolution]
+                if plan['video'] == 'copy':
+                    cmd += ['-map', f"0:{plan['video_index']}"]
+                    copy_args += [f'-c:v:{idx}', 'copy']
+                else:
+                    cmd += ['-map', f"[v{encoded.index(resolution)}]"]
+                if audio_plan['audio'] != 'none':
+                    cmd += ['-map', f"0:{audio_plan['audio_index']}"]
+                    stream_map.append(f'v:{idx},a:{idx},name:{resolution}p')
+                else:
+                    stream_map.append(f'v:{idx},name:{resolution}p')
+
+            # Кодек для всех видеопотоков, затем копирование для подходящих (последнее указание побеждает)
+            cmd += [*build_video_encode_args(threads), '-force_key_frames', 'source', '-sc_threshold', '0', *copy_args]
+            if audio_plan['audio'] == 'copy':
+                cmd += ['-c:a', 'copy']
+            elif audio_plan['audio'] == 'encode':
+                cmd += build_audio_encode_args()
+
+            cmd += [
+                '-f', 'hls',
+                '-hls_time', str(app.config['HLS_SEGMENT_SECONDS']),
+                '-hls_playlist_type', 'vod',
+                '-hls_segment_type', 'fmp4',
+                '-hls_fmp4_init_filename', 'init.mp4',
+                '-hls_flags', 'independent_segments',
+                '-hls_segment_filename', os.path.join(output_dir, '%v', 'seg_%03d.m4s'),
+                '-master_pl_name', 'master.m3u8',
+                '-var_stream_map', ' '.join(stream_map),
+                os.path.join(output_dir, '%v', 'index.m3u8')
+            ]
+
+            # 60 минут максимум для больших файлов
+            run_ffmpeg(cmd, timeout=3600, progress=progress, duration=media['duration'], stage='package_hls')
+        METRICS.observe_ffmpeg_bytes(
+            'package_hls', os.path.getsize(input_path),
+            files_size(path for path in glob.glob(os.path.join(output_dir, '**', '*'), recursive=True) if os.path.isfile(path))
+        )
+        return True, None
+    except subprocess.TimeoutExpired:
+        return False, "Превышено время ожидания обработки"
+    except subprocess.CalledProcessError as e:
+        return False, f"Ошибка FFmpeg: {e.stderr.decode('utf-8', errors='ignore')}"
+    except FileNotFoundError:
+        return False, "FFmpeg не найден. Убедитесь, что FFmpeg установлен и доступен в PATH"
+
+def update_hls_bandwidth(output_dir):
+    """Пересчитывает BANDWIDTH в master.m3u8 по реальным сегментам.
+
+    При кодировании по CRF FFmpeg не знает битрейт заранее и пишет заниженное значение,
+    а по BANDWIDTH плеер выбирает разрешение под скорость сети.
+    """
+    master_path = os.path.join(output_dir, 'master.m3u8')
+    with open(master_path, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+
+    for idx, line in enumerate(lines):
+        if not line.startswith('#EXT-X-STREAM-INF:'):
+            continue
+        playlist_path = os.path.join(output_dir, lines[idx + 1].strip())
+        playlist_dir = os.path.dirname(playlist_path)
+
+        # Пары (длительность, размер) по #EXTINF и следующей за ним строке сегмента
+        segments = []
+        duration = None
+        with open(playlist_path, encoding='utf-8') as f:
+            for playlist_line in f.read().splitlines():
+                if playlist_line.startswith('#EXTINF:'):
+                    duration = float(playlist_line[len('#EXTINF:'):].split(',', 1)[0])
+                elif playlist_line and not playlist_line.startswith('#') and duration:
+                    segments.append((duration, os.path.getsize(os.path.join(playlist_dir, playlist_line))))
+                    duration = None
+        if not segments:
+            continue
+
+        peak = max(int(size * 8 / duration) for duration, size in segments)
+        average = int(sum(size for _, size in segments) * 8 / sum(duration for duration, _ in segments))
+        line = re.sub(r',AVERAGE-BANDWIDTH=\d+', '', line)
+        line = re.sub(r'(?<=[:,])BANDWIDTH=\d+', f'BANDWIDTH={peak},AVERAGE-BANDWIDTH={average}', line)
+        lines[idx] = line
+
+    with open(master_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def parse_resolution_list(values):
+    """Разбирает resolutions=720,480 (или несколько полей формы); (список от большего к меньшему, ошибка)"""
+    requested = {item.strip().rstrip('p') for value in values for item in value.split(',') if item.strip()}
+    unknown = sorted(requested - set(VIDEO_RESOLUTIONS))
+    if unknown:
+        return None, f"Неподдерживаемое разрешение: {', '.join(unknown)}"
+    return [resolution for resolution in VIDEO_RESOLUTIONS if resolution in requested], None
+
+def compress_and_extract_frames(input_path, output_path, frames_dir, resolution='720',
+                                interval_seconds=15, priority=PRIORITY_PUBLIC, progress=None, frames_mode='interval'):
+    """Сжимает видео и извлекает кадры за один проход FFmpeg (источник декодируется один раз).
+
+    frames_mode='scene' - вместо кадров каждые N секунд проход анализирует смены сцен,
+    а выбранные кадры затем берутся точным поиском из сжатого видео.
+    """
+    scale_filter = build_scale_filter(resolution)
+
+    media, error = probe_media(input_path)
+    if error:
+        return False, [], error
+    plan = plan_encode(media, resolution)
+    print(f"[DEBUG] План обработки до {resolution}p: {describe_plan(plan)}")
+    video_input = f"[0:{plan['video_index']}]"
+
+    try:
+        os.makedirs(frames_dir, exist_ok=True)
+        output_pattern = os.path.join(frames_dir, 'frame_%04d.jpg')
+
+        frames_filter = SCENE_ANALYSIS_FILTER if frames_mode == 'scene' else f'fps=1/{interval_seconds}'
+        if plan['video'] == 'copy':
+            # Видео уже подходит: копируем поток, декодируем только ради кадров
+            filter_graph = f"{video_input}{frames_filter}[fout]"
+        else:
+            # Масштабированный поток делится на два: кодирование в H.264 и кадры JPEG каждые N секунд
+            filter_graph = (
+                f"{video_input}{scale_filter},split=2[vmain][vframes];"
+                f"[vmain]format=yuv420p[vout];"  # Без этого MJPEG навязывает yuvj420p и видео-выходу
+                f"[vframes]{frames_filter}[fout]"
+            )
+
+        # Выход 2: кадры (те же настройки, что в extract_frames) или анализ сцен без записи
+        if frames_mode == 'scene':
+            frames_args = ['-map', '[fout]', '-f', 'null', '-']
+        else:
+            frames_args = ['-map', '[fout]', '-q:v', '2', output_pattern]
+
+        with ENCODE_SCHEDULER.slot(priority) as threads:
+            if plan['video'] == 'copy':
+                video_args = ['-map', f"0:{plan['video_index']}", '-c:v', 'copy']
+            else:
+                video_args = ['-map', '[vout]', *build_video_encode_args(threads)]
+
+            cmd = [
+                'ffmpeg',
+                '-y',  # Перезаписать выходные файлы
+                '-threads', str(threads),
+                '-i', input_path,
+                '-filter_complex', filter_graph,
+                # Выход 1: сжатое видео (те же настройки, что в compress_video)
+                *video_args,
+                *build_audio_output_args(plan),
+                '-movflags', '+faststart',
+                output_path,
+                *frames_args
+            ]
+
+            # 60 минут максимум для больших файлов
+            result = run_ffmpeg(cmd, timeout=3600, progress=progress, duration=media['duration'],
+                                stage='compress_and_extract_frames')
+
+            if frames_mode == 'scene':
+                # Сжатое видео уже на диске: кадры из него быстрее, чем повторно из источника
+                workers = max(1, min(app.config['FRAME_SEEK_WORKERS'], threads))
+                success, _, error = extract_scene_frames(
+                    output_path, frames_dir, parse_scene_samples(result.stderr), media['duration'], workers
+                )
+                if not success:
+                    return False, [], error
+
+        frames = sorted(glob.glob(os.path.join(frames_dir, 'frame_*.jpg')))
+        METRICS.observe_ffmpeg_bytes('compress_and_extract_frames', os.path.getsize(input_path),
+                                     files_size([output_path, *frames]))
+        return True, frames, None
+
+    except subprocess.TimeoutExpired:
+        return False, [], "Превышено время ожидания обработки"
+    except subprocess.CalledProcessError as e:
+        return False, [], f"Ошибка FFmpeg: {e.stderr.decode('utf-8', errors='ignore')}"
+    except FileNotFoundError:
+        return False, [], "FFmpeg не найден. Убедитесь, что FFmpeg установлен и доступен в PATH"
+    except Exception as e:
+        return False, [], f"Ошибка обработки видео: {str(e)}"
+
+# ============================================
+# ПОТОКОВЫЙ ПРИЕМ: сжатие во время загрузки
+# ============================================
+# Тело запроса передается в stdin FFmpeg по мере получения, поэтому
+# кодирование идет параллельно с загрузкой. Контейнеры, которым нужен
+# произвольный доступ (MP4/MOV с атомом moov в конце), сохраняются на диск как раньше.
+
+STREAMABLE_CONTAINERS = {'mkv', 'webm', 'flv'}  # Читаются FFmpeg из pipe без перемотки
+MP4_CONTAINERS = {'mp4', 'mov'}  # Читаются из pipe только если moov стоит до mdat
+
+def sniff_mp4_layout(data):
+    """Определяет порядок атомов MP4/MOV: 'moov_first', 'mdat_first' или None (мало данных)"""
+    offset = 0
+    while offset + 8 <= len(data):
+        size = int.from_bytes(data[offset:offset + 4], 'big')
+        box_type = data[offset + 4:offset + 8]
+        header_size = 8
+
+        if size == 1:
+            # 64-битный размер атома
+            if offset + 16 > len(data):
+                return None
+            size = int.from_bytes(data[offset + 8:offset + 16], 'big')
+            header_size = 16
+
+        if box_type == b'moov':
+            return 'moov_first'
+        if box_type == b'mdat':
+            return 'mdat_first'
+        if size == 0 or size < header_size:
+            # Атом до конца файла или битый заголовок - считаем, что moov в конце
+            return 'mdat_first'
+        offset += size
+    return None
+
+def choose_ingest_mode(input_ext, prefix):
+    """Выбирает режим приема: 'stream' (pipe в FFmpeg), 'spool' (сохранить файл) или None (нужно больше данных)"""
+    if input_ext in STREAMABLE_CONTAINERS:
+        return 'stream'
+    if input_ext in MP4_CONTAINERS:
+        layout = sniff_mp4_layout(prefix)
+        if layout is None:
+            return 'spool' if len(prefix) >= app.config['STREAM_SNIFF_LIMIT'] else None
+        return 'stream' if layout == 'moov_first' else 'spool'
+    return 'spool'
+
+def compress_video_from_stream(chunks, output_path, resolution, threads):
+    """Сжимает видео, передавая данные в stdin FFmpeg по мере получения"""
+    scale_filter = build_scale_filter(resolution)
+
+    cmd = [
+        'ffmpeg',
+        '-threads', str(threads),
+        '-i', 'pipe:0',
+        '-vf', scale_filter,
+        *build_h264_output_args(threads),
+        '-y',  # Перезаписать выходной файл
+        output_path
+    ]
+
+    # stderr пишем в файл: пока мы пишем в stdin, заполненный pipe stderr заблокировал бы FFmpeg
+    with tempfile.TemporaryFile() as stderr_file:
+        try:
+            process = start_ffmpeg(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr_file)
+        except FileNotFoundError:
+            return False, "FFmpeg не найден. Убедитесь, что FFmpeg установлен и доступен в PATH"
+
+        started = time.monotonic()
+        success = False
+        try:
+            success, error = finish_stream_encode(process, chunks, stderr_file)
+            return success, error
+        finally:
+            finish_ffmpeg(process)
+            # Время включает прием: кодирование ждет данные от клиента
+            speed = None
+            if success:
+                stderr_file.seek(0)
+                speed = parse_ffmpeg_speed(stderr_file.read())
+            METRICS.observe_stage('compress_video_stream', time.monotonic() - started, success, speed)
+
+def finish_stream_encode(process, chunks, stderr_file):
+    """Передает данные в stdin FFmpeg и ждет завершения кодирования"""
+    try:
+        for chunk in chunks:
+            process.stdin.write(chunk)
+        process.stdin.close()
+    except BrokenPipeError:
+        # FFmpeg завершился раньше времени - причину покажет код возврата
+        pass
+    except Exception:
+        # Клиент оборвал загрузку
+        process.kill()
+        process.wait()
+        raise
+
+    try:
+        returncode = process.wait(timeout=3600)  # 60 минут максимум после окончания загрузки
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        return False, "Превышено время ожидания обработки"
+
+    if returncode != 0:
+        stderr_file.seek(0)
+        return False, f"Ошибка FFmpeg: {stderr_file.read().decode('utf-8', errors='ignore')}"
+
+    return True, None
+
+# ============================================
+# КЭШ РЕЗУЛЬТАТОВ: адресация по содержимому исходника
+# ============================================
+# Ключ = SHA-256 исходного файла + тип результата + параметры (разрешение,
+# интервал) + настройки кодировщика. Размер кэша ограничен CACHE_MAX_BYTES,
+# при переполнении удаляются давно не использованные записи (LRU по mtime).
+
+class HashingFile:
+    """Обертка над временным файлом загрузки: считает SHA-256 по мере записи данных"""
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+class HashingRequest(Request):
+    """Запрос, который хэширует загружаемые файлы во время разбора multipart"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return HashingFile(stream)
+
+app.request_class = HashingRequest
+
+def uploaded_file_hash(file):
+    """Возвращает SHA-256 загруженного файла (посчитан при приеме, иначе дочитывает поток)"""
+    if isinstance(file.stream, HashingFile):
+        return file.stream.digest.hexdigest()
+
+    digest = hashlib.sha256()
+    file.stream.seek(0)
+    for chunk in iter(lambda: file.stream.read(1024 * 1024), b''):
+        digest.update(chunk)
+    file.stream.seek(0)
+    return digest.hexdigest()
+
+def encoder_settings_fingerprint():
+    """Строка настроек кодировщика для ключа кэша (смена настроек инвалидирует кэш)"""
+    return ' '.join(build_h264_output_args(0))
+
+class ResultCache:
+    """Дисковый кэш сжатых видео и наборов кадров с ограничением размера (LRU)"""
+
+    def __init__(self, folder, max_bytes, enabled=True):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.enabled:
+            os.makedirs(self.folder, exist_ok=True)
+
+    def make_key(self, source_hash, kind, **params):
+        """Ключ кэша: хэш исходника + тип результата + параметры"""
+        payload = json.dumps({'source': source_hash, 'kind': kind, 'params': params}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _file_path(self, key):
+        return os.path.join(self.folder, f'{key}.mp4')
+
+    def _frames_path(self, key):
+        return os.path.join(self.folder, f'{key}_frames')
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_file(self, key, dest_path):
+        """Копирует закэшированный файл в dest_path; True при попадании"""
+        if not self.enabled or not key:
+            return False
+
+        cached_path = self._file_path(key)
+        try:
+            link_or_copy(cached_path, dest_path)
+            os.utime(cached_path)  # Отмечаем использование для LRU
+        except OSError:
+            self._count(False)
+            return False
+
+        self._count(True)
+        return True
+
+    def put_file(self, key, src_path):
+        """Сохраняет файл в кэш"""
+        if not self.enabled or not key:
+            return
+        try:
+            tmp_path = os.path.join(self.folder, f'{key}.{uuid.uuid4().hex}.tmp')
+            link_or_copy(src_path, tmp_path)
+            os.replace(tmp_path, self._file_path(key))
+        except OSError as e:
+            print(f"[WARNING] Не удалось сохранить результат в кэш: {e}")
+            return
+        self.enforce_limit()
+
+    # Кадры копируются, а не связываются жесткими ссылками: повторное извлечение в ту же
+    # папку (FFmpeg -y) перезаписывает файл на месте и испортило бы запись кэша
+    def get_frames(self, key, dest_dir):
+        """Копирует закэшированные кадры в dest_dir; список кадров или None"""
+        if not self.enabled or not key:
+            return None
+
+        cached_dir = self._frames_path(key)
+        try:
+            cached_frames = sorted(glob.glob(os.path.join(cached_dir, 'frame_*.jpg')))
+            if not cached_frames:
+                raise FileNotFoundError(cached_dir)
+            os.makedirs(dest_dir, exist_ok=True)
+            frames = []
+            for cached_frame in cached_frames:
+                frame_path = os.path.join(dest_dir, os.path.basename(cached_frame))
+                shutil.copyfile(cached_frame, frame_path)
+                frames.append(frame_path)
+            os.utime(cached_dir)
+        except OSError:
+            self._count(False)
+            return None
+
+        self._count(True)
+        return frames
+
+    def put_frames(self, key, frames):
+        """Сохраняет набор кадров в кэш"""
+        if not self.enabled or not key or not frames:
+            return
+        tmp_dir = os.path.join(self.folder, f'{key}.{uuid.uuid4().hex}.tmp')
+        try:
+            os.makedirs(tmp_dir)
+            for frame_path in frames:
+                shutil.copyfile(frame_path, os.path.join(tmp_dir, os.path.basename(frame_path)))
+            cached_dir = self._frames_path(key)
+            if os.path.exists(cached_dir):
+                shutil.rmtree(cached_dir, ignore_errors=True)
+            os.rename(tmp_dir, cached_dir)
+        except OSError as e:
+            print(f"[WARNING] Не удалось сохранить кадры в кэш: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        self.enforce_limit()
+
+    def _entries(self):
+        """Записи кэша: (mtime, size, path)"""
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                if entry.is_dir():
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                else:
+                    size = entry.stat().st_size
+                entries.append((entry.stat().st_mtime, size, entry.path))
+            except OSError:
+                continue
+        return entries
+
+    def enforce_limit(self):
+        """Удаляет давно не использованные записи, пока кэш больше CACHE_MAX_BYTES"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                total -= size
+
+    def stats(self):
+        """Статистика кэша: попадания, промахи, объем"""
+        entries = self._entries() if self.enabled else []
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes
+            }
+
+def link_or_copy(src_path, dest_path):
+    """Жесткая ссылка (мгновенно, без копирования данных) или копия, если ссылка невозможна"""
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+    try:
+        os.link(src_path, dest_path)
+    except OSError:
+        shutil.copy2(src_path, dest_path)
+
+RESULT_CACHE = ResultCache(
+    app.config['CACHE_FOLDER'],
+    app.config['CACHE_MAX_BYTES'],
+    enabled=app.config['CACHE_ENABLED']
+)
+
+def compress_cache_key(source_hash, resolution):
+    """Ключ кэша для сжатого видео"""
+    if not source_hash:
+        return None
+    # Результат зависит и от быстрого пути: при SMART_COPY_ENABLED видео может быть скопировано без перекодирования
+    return RESULT_CACHE.make_key(source_hash, 'compress', resolution=resolution, encoder=encoder_settings_fingerprint(),
+                                 smart_copy=app.config['SMART_COPY_ENABLED'])
+
+def frames_cache_key(source_hash, kind, interval_seconds, **params):
+    """Ключ кэша для набора кадров"""
+    if not source_hash:
+        return None
+    return RESULT_CACHE.make_key(source_hash, kind, interval=interval_seconds, quality='q2', **params)
+
+def compress_video_cached(input_path, output_path, resolution, source_hash=None, priority=PRIORITY_PUBLIC,
+                          progress=None):
+    """compress_video с проверкой кэша результатов"""
+    key = compress_cache_key(source_hash, resolution)
+    if RESULT_CACHE.get_file(key, output_path):
+        print(f"[DEBUG] Сжатое видео {resolution}p взято из кэша")
+        return True, None
+
+    success, error = compress_video(input_path, output_path, resolution, priority=priority, progress=progress)
+    if success:
+        RESULT_CACHE.put_file(key, output_path)
+    return success, error
+
+def compress_video_ladder_cached(input_path, outputs, source_hash=None, priority=PRIORITY_PUBLIC, progress=None):
+    """compress_video_ladder с кэшем по каждому разрешению: кодируются только недостающие"""
+    missing = {}
+    for resolution, output_path in outputs.items():
+        if RESULT_CACHE.get_file(compress_cache_key(source_hash, resolution), output_path):
+            print(f"[DEBUG] Сжатое видео {resolution}p взято из кэша")
+        else:
+            missing[resolution] = output_path
+    if not missing:
+        return True, None
+
+    success, error = compress_video_ladder(input_path, missing, priority=priority, progress=progress)
+    if success:
+        for resolution, output_path in missing.items():
+            RESULT_CACHE.put_file(compress_cache_key(source_hash, resolution), output_path)
+    return success, error
+
+def extract_frames_cached(input_path, output_dir, interval_seconds=15, source_hash=None,
+                          priority=PRIORITY_PUBLIC, mode='auto', progress=None):
+    """extract_frames с проверкой кэша результатов"""
+    if mode == 'scene':
+        params = scene_cache_params()
+    else:
+        if mode == 'auto' and source_hash and RESULT_CACHE.enabled:
+            # Поиск (ближайший ключевой кадр) и декодирование дают разные кадры: режим - часть ключа
+            mode = choose_frames_mode(interval_seconds, probe_duration(input_path))
+        params = {'mode': mode, 'seek_min_interval': app.config['FRAME_SEEK_MIN_INTERVAL']}
+    key = frames_cache_key(source_hash, 'frames', interval_seconds, **params)
+    frames = RESULT_CACHE.get_frames(key, output_dir)
+    if frames:
+        print(f"[DEBUG] Кадры взяты из кэша: {len(frames)}")
+        return True, frames, None
+
+    success, frames, error = extract_frames(
+        input_path, output_dir, interval_seconds, priority=priority, mode=mode, progress=progress
+    )
+    if success:
+        RESULT_CACHE.put_frames(key, frames)
+    return success, frames, error
+
+# ============================================
+# ВРЕМЕННЫЕ ФАЙЛЫ: TTL, владелец, квота диска
+# ============================================
+# Каждый временный артефакт (входной файл, результат, папка кадров) регистрируется
+# с TTL и задачей-владельцем. Фоновый поток удаляет просроченные, а также сирот:
+# файлы, которые не удалил другой процесс или прошлый запуск.
+
+# Имена артефактов начинаются с uuid файла/задачи: только их можно удалять как сирот
+TEMP_ARTIFACT_RE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(_.*)?$')
+
+class TempStorage:
+    """Учет временных файлов с TTL, квотой и очисткой сирот"""
+
+    def __init__(self, roots, default_ttl, quota_bytes, min_free_bytes, sweep_interval):
+        # roots: {папка: TTL сирот в секундах}
+        self.roots = roots
+        self.default_ttl = default_ttl
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.sweep_interval = sweep_interval
+        self._artifacts = {}  # path -> {'owner', 'created_at', 'expires_at'}
+        self._lock = threading.Lock()
+        self._sweeper_pid = None
+        # active_owners() - владельцы, чьи артефакты удалять нельзя (задачи в очереди
+        # и в работе, в том числе у других процессов); None - хранилище задач недоступно
+        self.active_owners = None
+        self.removed = 0
+        self.rejected = 0
+
+    def register(self, path, owner=None, ttl=None):
+        """Регистрирует артефакт; удаляется не позже чем через ttl секунд"""
+        self._ensure_sweeper()
+        now = time.time()
+        with self._lock:
+            self._artifacts[path] = {
+                'owner': owner,
+                'created_at': now,
+                'expires_at': now + (self.default_ttl if ttl is None else ttl)
+            }
+        return path
+
+    def remove(self, path):
+        """Удаляет файл или папку сразу (в том числе незарегистрированные)"""
+        with self._lock:
+            self._artifacts.pop(path, None)
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+            else:
+                return
+        except OSError as e:
+            print(f"[WARNING] Не удалось удалить {path}: {e}")
+            return
+        with self._lock:
+            self.removed += 1
+
+    def expire(self, path, ttl):
+        """Сокращает срок хранения артефакта (например, после отдачи клиенту)"""
+        with self._lock:
+            info = self._artifacts.get(path)
+            if info is None:
+                self._artifacts[path] = info = {'owner': None, 'created_at': time.time()}
+            info['expires_at'] = time.time() + ttl
+
+    def expire_owner(self, owner, ttl):
+        """Сокращает срок хранения всех артефактов задачи"""
+        with self._lock:
+            for info in self._artifacts.values():
+                if info['owner'] == owner:
+                    info['expires_at'] = min(info['expires_at'], time.time() + ttl)
+
+    def release_owner(self, owner):
+        """Удаляет все артефакты задачи"""
+        with self._lock:
+            paths = [path for path, info in self._artifacts.items() if info['owner'] == owner]
+        for path in paths:
+            self.remove(path)
+
+    def _protected_owners(self):
+        """Владельцы незавершенных задач; None - неизвестно, удалять ничего нельзя"""
+        if self.active_owners is None:
+            return set()
+        return self.active_owners()
+
+    def sweep(self):
+        """Удаляет артефакты с истекшим TTL (кроме артефактов незавершенных задач)"""
+        now = time.time()
+        with self._lock:
+            expired = [(path, info['owner']) for path, info in self._artifacts.items() if info['expires_at'] <= now]
+        if not expired:
+            return 0
+        protected = self._protected_owners()
+        if protected is None:
+            return 0
+        removed = 0
+        for path, owner in expired:
+            # Задача дольше TTL ждет в очереди - ее файлы проверим при следующей очистке
+            if owner in protected:
+                continue
+            self.remove(path)
+            removed += 1
+        return removed
+
+    def sweep_orphans(self):
+        """Удаляет сирот: незарегистрированные в этом процессе артефакты старше TTL своей папки.
+
+        Возраст проверяется, чтобы не тронуть файлы, которые обрабатывает другой воркер;
+        файлы незавершенных задач общей очереди (uuid владельца в начале имени) не удаляются.
+        """
+        now = time.time()
+        removed = 0
+        protected = None
+        for root, max_age in self.roots.items():
+            if not os.path.isdir(root):
+                continue
+            for entry in os.scandir(root):
+                if not TEMP_ARTIFACT_RE.match(entry.name):
+                    continue
+                with self._lock:
+                    if entry.path in self._artifacts:
+                        continue
+                try:
+                    if now - entry.stat().st_mtime < max_age:
+                        continue
+                except OSError:
+                    continue
+                if protected is None:
+                    protected = self._protected_owners()
+                    if protected is None:
+                        return removed
+                if entry.name[:36] in protected:
+                    continue
+                self.remove(entry.path)
+                removed += 1
+        if removed:
+            print(f"[OK] Удалено временных файлов-сирот: {removed}")
+        return removed
+
+    def start_sweeper(self):
+        """Запускает фоновую очистку сразу, не дожидаясь первой регистрации"""
+        self._ensure_sweeper()
+
+    def _ensure_sweeper(self):
+        """Запускает фоновую очистку (заново после fork - потоки не наследуются)"""
+        if self._sweeper_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+
+        def sweeper():
+            while True:
+                time.sleep(self.sweep_interval)
+                try:
+                    self.sweep()
+                    # Артефакты других воркеров и контейнеров (общий том, общая очередь задач)
+                    # этот процесс не регистрировал - их удаляет только проверка сирот
+                    self.sweep_orphans()
+                except Exception as e:
+                    print(f"[WARNING] Ошибка очистки временных файлов: {e}")
+
+        threading.Thread(target=sweeper, daemon=True, name='temp-sweeper').start()
+
+    def used_bytes(self):
+        """Объем артефактов во всех папках (только файлы с uuid-именами)"""
+        total = 0
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+            for entry in os.scandir(root):
+                if not TEMP_ARTIFACT_RE.match(entry.name):
+                    continue
+                try:
+                    if entry.is_dir():
+                        for dirpath, _, filenames in os.walk(entry.path):
+                            total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+                    else:
+                        total += entry.stat().st_size
+                except OSError:
+                    continue
+        return total
+
+    def check_space(self, incoming_bytes=0):
+        """Проверяет, хватит ли места под новую загрузку; (True, None) или (False, ошибка).
+
+        Под задачу резервируется двойной размер загрузки: исходник и результат.
+        """
+        needed = 2 * (incoming_bytes or 0)
+        upload_folder = next(iter(self.roots))
+        free = shutil.disk_usage(upload_folder).free
+        if free - needed < self.min_free_bytes:
+            with self._lock:
+                self.rejected += 1
+            return False, f'Недостаточно места на диске: свободно {free / 1024 / 1024:.0f} MB'
+
+        if self.quota_bytes:
+            used = self.used_bytes()
+            if used + needed > self.quota_bytes:
+                with self._lock:
+                    self.rejected += 1
+                return False, f'Превышена квота временных файлов: занято {used / 1024 / 1024:.0f} MB'
+
+        return True, None
+
+    def usage(self):
+        """Статистика: зарегистрированные артефакты, объем, квота, свободное место"""
+        upload_folder = next(iter(self.roots))
+        disk = shutil.disk_usage(upload_folder)
+        with self._lock:
+            tracked = len(self._artifacts)
+            owners = len({info['owner'] for info in self._artifacts.values() if info['owner']})
+            removed = self.removed
+            rejected = self.rejected
+        return {
+            'tracked': tracked,
+            'owners': owners,
+            'bytes': self.used_bytes(),
+            'quota_bytes': self.quota_bytes,
+            'min_free_bytes': self.min_free_bytes,
+            'disk_total': disk.total,
+            'disk_free': disk.free,
+            'removed': removed,
+            'rejected': rejected
+        }
+
+STATIC_FRAMES_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'frames')
+
+TEMP_STORAGE = TempStorage(
+    {
+        app.config['UPLOAD_FOLDER']: app.config['TEMP_TTL_SECONDS'],
+        STATIC_FRAMES_FOLDER: app.config['TEMP_FRAMES_TTL_SECONDS']
+    },
+    default_ttl=app.config['TEMP_TTL_SECONDS'],
+    quota_bytes=app.config['TEMP_QUOTA_BYTES'],
+    min_free_bytes=app.config['TEMP_MIN_FREE_BYTES'],
+    sweep_interval=app.config['TEMP_SWEEP_INTERVAL']
+)
+
+# ============================================
+# ФОНОВЫЕ ЗАДАЧИ: асинхронная обработка видео
+# ============================================
+# POST-запрос только сохраняет файл и ставит задачу в очередь,
+# а FFmpeg выполняется в пуле потоков. Клиент опрашивает /jobs/<job_id>.
+#
+# Хранилище задач (JOB_STORE):
+#   memory   - задачи в памяти процесса: выполняет тот же процесс, что принял запрос;
+#   sqlite   - файл SQLite на общем томе: процессы и контейнеры одного узла;
+#   supabase - таблица editor_jobs в Postgres: контейнеры на разных узлах.
+# В sqlite и supabase задачи переживают перезапуск: воркеры всех контейнеров забирают
+# их из очереди в аренду (lease) и продлевают аренду, пока задача выполняется.
+# Задачу упавшего воркера после истечения аренды забирает другой. Файлы задач лежат
+# в UPLOAD_FOLDER, поэтому папка должна быть общей для всех контейнеров.
+
+JOB_JSON_FIELDS = ('params', 'result', 'progress')
+JOB_PROGRESS_INTERVAL = 1.0  # Не чаще раза в секунду пишем прогресс в sqlite/supabase
+JOB_EVENTS_POLL_INTERVAL = 1.0  # Опрос изменений задачи для /jobs/<job_id>/events
+
+class JobStore:
+    """Базовый класс хранилища задач"""
+
+    name = 'base'
+    durable = False  # Задачи видны всем процессам и переживают перезапуск
+
+    def create(self, job):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        """Копия задачи или None"""
+        raise NotImplementedError
+
+    def claim(self, worker_id, kinds, lease_seconds):
+        """Выдает воркеру следующую задачу из очереди (или с истекшей арендой); None - очередь пуста"""
+        raise NotImplementedError
+
+    def heartbeat(self, job_id, worker_id, lease_seconds, progress=None):
+        """Продлевает аренду и сохраняет прогресс; False - задача больше не принадлежит воркеру"""
+        raise NotImplementedError
+
+    def finish(self, job_id, worker_id, status, result=None, error=None):
+        """Записывает итог задачи; False - аренду уже забрал другой воркер"""
+        raise NotImplementedError
+
+    def counts(self):
+        """Количество задач по статусам"""
+        raise NotImplementedError
+
+    def prune(self, ttl_seconds):
+        """Удаляет завершенные задачи старше ttl_seconds"""
+        raise NotImplementedError
+
+    def active(self):
+        """Задачи в очереди и в работе: [{'job_id', 'kind', 'params'}]"""
+        raise NotImplementedError
+
+    def wait_for_change(self, job_id, version, timeout):
+        """Ждет, пока версия задачи станет отличной от version; задача или None"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['version'] != version or remaining <= 0:
+                return job
+            time.sleep(min(JOB_EVENTS_POLL_INTERVAL, remaining))
+
+def empty_job_counts():
+    return {'queued': 0, 'running': 0, 'done': 0, 'error': 0}
+
+class MemoryJobStore(JobStore):
+    """Задачи в памяти процесса (выполняются пулом JOB_EXECUTOR)"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._jobs = {}
+        self._changed = threading.Condition()  # Уведомляет подписчиков /jobs/<job_id>/events
+
+    def create(self, job):
+        with self._changed:
+            self._jobs[job['job_id']] = dict(job)
+
+    def get(self, job_id):
+        with self._changed:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id, **fields):
+        """Обновляет поля задачи и будит подписчиков событий"""
+        with self._changed:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+                self._jobs[job_id]['version'] += 1
+                self._changed.notify_all()
+
+    def claim(self, worker_id, kinds, lease_seconds):
+        # Задачи в памяти не раздаются из очереди - их сразу получает пул потоков
+        return None
+
+    def heartbeat(self, job_id, worker_id, lease_seconds, progress=None):
+        if progress is not None:
+            self.update(job_id, progress=progress)
+        return True
+
+    def finish(self, job_id, worker_id, status, result=None, error=None):
+        self.update(job_id, status=status, result=result, error=error, finished_at=datetime.now().isoformat())
+        return True
+
+    def counts(self):
+        counts = empty_job_counts()
+        with self._changed:
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+        return counts
+
+    def prune(self, ttl_seconds):
+        now = datetime.now()
+        with self._changed:
+            for job_id in list(self._jobs.keys()):
+                job = self._jobs[job_id]
+                if job['status'] in ('done', 'error') and job['finished_at']:
+                    age = (now - datetime.fromisoformat(job['finished_at'])).total_seconds()
+                    if age > ttl_seconds:
+                        del self._jobs[job_id]
+
+    def active(self):
+        with self._changed:
+            return [
+                {'job_id': job['job_id'], 'kind': job['kind'], 'params': job['params']}
+                for job in self._jobs.values() if job['status'] in ('queued', 'running')
+            ]
+
+    def wait_for_change(self, job_id, version, timeout):
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is not None and job['version'] == version:
+                self._changed.wait(timeout=timeout)
+                job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+class SQLiteJobStore(JobStore):
+    """Задачи в файле SQLite (WAL): общая очередь процессов и контейнеров одного узла.
+
+    Файл должен лежать на локальном диске узла: блокировки SQLite ненадежны на NFS.
+    """
+
+    name = 'sqlite'
+    durable = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS editor_jobs (
+            job_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            params TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            progress TEXT,
+            version INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker_id TEXT,
+            lease_expires_at REAL,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS editor_jobs_status_idx ON editor_jobs (status, created_at);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self):
+        """Соединение потока (после fork - новое: соединения SQLite не переносятся между процессами)"""
+        import sqlite3
+
+        if getattr(self._local, 'pid', None) != os.getpid():
+            # isolation_level=None: транзакции открываются явно, остальное - автофиксация
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    @staticmethod
+    def _row_to_job(row):
+        job = dict(row)
+        for field in JOB_JSON_FIELDS:
+            job[field] = json.loads(job[field]) if job[field] is not None else None
+        return job
+
+    def create(self, job):
+        self._connection().execute(
+            'INSERT INTO editor_jobs (job_id, kind, status, params, version, attempts, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (job['job_id'], job['kind'], job['status'], json.dumps(job['params']), job['version'],
+             job['attempts'], job['created_at'])
+        )
+
+    def get(self, job_id):
+        row = self._connection().execute('SELECT * FROM editor_jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self, worker_id, kinds, lease_seconds):
+        connection = self._connection()
+        now = time.time()
+        placeholders = ', '.join('?' for _ in kinds)
+        # BEGIN IMMEDIATE сразу берет блокировку записи: два воркера не получат одну задачу
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                f"SELECT job_id FROM editor_jobs WHERE kind IN ({placeholders}) "
+                f"AND (status = 'queued' OR (status = 'running' AND lease_expires_at < ?)) "
+                f"ORDER BY created_at LIMIT 1",
+                (*kinds, now)
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE editor_jobs SET status = 'running', worker_id = ?, lease_expires_at = ?, "
+                    "attempts = attempts + 1, started_at = COALESCE(started_at, ?), version = version + 1 "
+                    "WHERE job_id = ?",
+                    (worker_id, now + lease_seconds, datetime.now().isoformat(), row['job_id'])
+                )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return self.get(row['job_id']) if row is not None else None
+
+    def heartbeat(self, job_id, worker_id, lease_seconds, progress=None):
+        cursor = self._connection().execute(
+            "UPDATE editor_jobs SET lease_expires_at = ?, progress = COALESCE(?, progress), "
+            "version = version + ? WHERE job_id = ? AND worker_id = ? AND status = 'running'",
+            (time.time() + lease_seconds, json.dumps(progress) if progress is not None else None,
+             1 if progress is not None else 0, job_id, worker_id)
+        )
+        return cursor.rowcount > 0
+
+    def finish(self, job_id, worker_id, status, result=None, error=None):
+        cursor = self._connection().execute(
+            "UPDATE editor_jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires_at = NULL, "
+            "version = version + 1 WHERE job_id = ? AND worker_id = ? AND status = 'running'",
+            (status, json.dumps(result) if result is not None else None, error, datetime.now().isoformat(),
+             job_id, worker_id)
+        )
+        return cursor.rowcount > 0
+
+    def counts(self):
+        counts = empty_job_counts()
+        for row in self._connection().execute('SELECT status, COUNT(*) AS count FROM editor_jobs GROUP BY status'):
+            counts[row['status']] = row['count']
+        return counts
+
+    def prune(self, ttl_seconds):
+        cutoff = datetime.fromtimestamp(time.time() - ttl_seconds).isoformat()
+        self._connection().execute(
+            "DELETE FROM editor_jobs WHERE status IN ('done', 'error') AND finished_at < ?", (cutoff,)
+        )
+
+    def active(self):
+        rows = self._connection().execute(
+            "SELECT job_id, kind, params FROM editor_jobs WHERE status IN ('queued', 'running')"
+        )
+        return [{'job_id': row['job_id'], 'kind': row['kind'], 'params': json.loads(row['params'])} for row in rows]
+
+class SupabaseJobStore(JobStore):
+    """Задачи в таблице editor_jobs (Postgres через PostgREST): общая очередь нескольких узлов.
+
+    Выдача задачи, продление аренды и завершение - функции claim_editor_job,
+    heartbeat_editor_job и finish_editor_job (SELECT ... FOR UPDATE SKIP LOCKED),
+    см. миграцию 20261018000002_create_editor_jobs.sql.
+    """
+
+    name = 'supabase'
+    durable = True
+
+    def _request(self, method, path, **kwargs):
+        supabase_url = app.config.get('SUPABASE_URL', '').rstrip('/')
+        supabase_key = app.config.get('SUPABASE_KEY', '')
+        if not supabase_url or not supabase_key:
+            raise Exception('Supabase не настроен')
+
+        headers = {
+            'apikey': supabase_key,
+            'Authorization': f'Bearer {supabase_key}',
+            'Content-Type': 'application/json',
+            **kwargs.pop('headers', {})
+        }
+        response = postgrest_request(method, path, f"{supabase_url}/rest/v1/{path}",
+                                     headers=headers, timeout=30.0, **kwargs)
+        if response.status_code >= 400:
+            raise Exception(f'Ошибка PostgREST {path}: {response.status_code} - {response.text[:500]}')
+        return response
+
+    def _rpc(self, function_name, **params):
+        return self._request('POST', f'rpc/{function_name}', json=params).json()
+
+    def create(self, job):
+        self._request('POST', 'editor_jobs', json={
+            'job_id': job['job_id'],
+            'kind': job['kind'],
+            'status': job['status'],
+            'params': job['params']
+        }, headers={'Prefer': 'return=minimal'})
+
+    def get(self, job_id):
+        rows = self._request('GET', 'editor_jobs', params={'job_id': f'eq.{job_id}', 'select': '*'}).json()
+        return rows[0] if rows else None
+
+    def claim(self, worker_id, kinds, lease_seconds):
+        rows = self._rpc('claim_editor_job', p_worker_id=worker_id, p_kinds=list(kinds), p_lease_seconds=lease_seconds)
+        return rows[0] if rows else None
+
+    def heartbeat(self, job_id, worker_id, lease_seconds, progress=None):
+        return bool(self._rpc('heartbeat_editor_job', p_job_id=job_id, p_worker_id=worker_id,
+                              p_lease_seconds=lease_seconds, p_progress=progress))
+
+    def finish(self, job_id, worker_id, status, result=None, error=None):
+        return bool(self._rpc('finish_editor_job', p_job_id=job_id, p_worker_id=worker_id,
+                              p_status=status, p_result=result, p_error=error))
+
+    def counts(self):
+        counts = empty_job_counts()
+        for row in self._rpc('editor_job_counts'):
+            counts[row['status']] = row['count']
+        return counts
+
+    def prune(self, ttl_seconds):
+        cutoff = datetime.fromtimestamp(time.time() - ttl_seconds, tz=timezone.utc).isoformat()
+        self._request('DELETE', 'editor_jobs', params={
+            'status': 'in.(done,error)',
+            'finished_at': f'lt.{cutoff}'
+        })
+
+    def active(self):
+        return self._request('GET', 'editor_jobs', params={
+            'status': 'in.(queued,running)',
+            'select': 'job_id,kind,params'
+        }).json()
+
+def create_job_store():
+    """Создает хранилище задач по JOB_STORE"""
+    store_type = app.config['JOB_STORE']
+    if store_type == 'sqlite':
+        store = SQLiteJobStore(app.config['JOB_STORE_PATH'])
+        print(f"[OK] Задачи хранятся в SQLite: {store.path}")
+        return store
+    if store_type == 'supabase':
+        print("[OK] Задачи хранятся в Supabase (таблица editor_jobs)")
+        return SupabaseJobStore()
+    if store_type != 'memory':
+        print(f"[WARNING] Неизвестный JOB_STORE={store_type}, задачи хранятся в памяти")
+    return MemoryJobStore()
+
+def active_job_owners():
+    """Владельцы временных файлов незавершенных задач; None - хранилище задач недоступно.
+
+    Файлы задачи начинаются с ее job_id, файлы видео пакетного импорта - с video_id элемента.
+    """
+    try:
+        jobs = JOB_STORE.active()
+    except Exception as e:
+        print(f"[WARNING] Не удалось получить незавершенные задачи, очистка временных файлов пропущена: {e}")
+        return None
+    owners = set()
+    for job in jobs:
+        owners.add(job['job_id'])
+        for item in (job['params'] or {}).get('items') or []:
+            owners.add(item.get('video_id'))
+    return owners
+
+JOB_STORE = create_job_store()
+# Очистка временных файлов не трогает файлы задач, которые ждут в общей очереди
+TEMP_STORAGE.active_owners = active_job_owners
+TEMP_STORAGE.sweep_orphans()
+TEMP_STORAGE.start_sweeper()
+JOB_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, app.config['JOB_WORKERS']), thread_name_prefix='job')
+
+# Задачи, которые выполняет этот процесс (sqlite/supabase): их ждет плавная остановка
+ACTIVE_JOBS = set()
+ACTIVE_JOBS_LOCK = threading.Lock()
+
+# Обработчики задач по типу: handler(params, progress) -> (success, result, error),
+# progress(snapshot) - обновление прогресса FFmpeg (см. build_progress_snapshot)
+JOB_HANDLERS = {}
+
+def job_worker_id():
+    """Идентификатор воркера в аренде задачи: узел и процесс"""
+    return app.config['WORKER_ID'] or f"{socket.gethostname()}:{os.getpid()}"
+
+def create_job(kind, params, job_id=None):
+    """Создает задачу и ставит её в очередь"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Неизвестный тип задачи: {kind}")
+
+    job = {
+        'job_id': job_id or str(uuid.uuid4()),
+        'kind': kind,
+        'status': 'queued',  # queued -> running -> done / error
+        'params': params,
+        'result': None,
+        'error': None,
+        'progress': None,
+        'version': 0,  # Растет при каждом изменении (для событий)
+        'attempts': 0,  # Сколько раз задачу брал воркер (больше одного - после падения воркера)
+        'worker_id': None,
+        'created_at': datetime.now().isoformat(),
+        'started_at': None,
+        'finished_at': None
+    }
+
+    JOB_STORE.create(job)
+
+    if not JOB_STORE.durable:
+        JOB_EXECUTOR.submit(run_job, job['job_id'])
+    # Иначе задачу заберет из очереди воркер любого контейнера (job_worker_loop)
+    return dict(job)
+
+def get_job(job_id):
+    """Возвращает копию задачи или None"""
+    return JOB_STORE.get(job_id)
+
+def make_job_progress(job_id):
+    """Возвращает получатель прогресса FFmpeg для задачи"""
+    worker_id = job_worker_id()
+    warned = False
+    last_saved = 0.0
+
+    def report(snapshot):
+        nonlocal warned, last_saved
+        # В общем хранилище каждая запись - запрос к базе, поэтому не чаще JOB_PROGRESS_INTERVAL
+        # (итоговый блок с 100% пишем всегда)
+        now = time.monotonic()
+        if not JOB_STORE.durable or now - last_saved >= JOB_PROGRESS_INTERVAL or snapshot['percent'] == 100.0:
+            last_saved = now
+            JOB_STORE.heartbeat(job_id, worker_id, app.config['JOB_LEASE_SECONDS'], progress=snapshot)
+        # Первые секунды скорость FFmpeg неустойчива - предупреждаем после разгона
+        if snapshot['below_realtime'] and snapshot['elapsed_seconds'] >= 10 and not warned:
+            warned = True
+            print(f"[WARNING] Задача {job_id} кодируется медленнее реального времени: {snapshot['speed']}x")
+
+    return report
+
+def keep_job_lease(job_id, worker_id, stop):
+    """Продлевает аренду задачи, пока она выполняется (поток на время задачи)"""
+    lease_seconds = app.config['JOB_LEASE_SECONDS']
+    while not stop.wait(max(1.0, lease_seconds / 3)):
+        try:
+            if not JOB_STORE.heartbeat(job_id, worker_id, lease_seconds):
+                print(f"[WARNING] Аренда задачи {job_id} потеряна: задачу забрал другой воркер")
+                return
+        except Exception as e:
+            # Временный сбой базы: аренда рассчитана на несколько пропущенных продлений
+            print(f"[WARNING] Не удалось продлить аренду задачи {job_id}: {e}")
+
+def run_job(job_id):
+    """Выполняет задачу из памяти процесса в потоке пула"""
+    job = get_job(job_id)
+    if not job:
+        return
+
+    JOB_STORE.update(job_id, status='running', started_at=datetime.now().isoformat(),
+                     worker_id=job_worker_id(), attempts=1)
+    execute_job(job)
+
+def execute_job(job):
+    """Выполняет обработчик задачи и записывает итог"""
+    job_id = job['job_id']
+    worker_id = job_worker_id()
+    print(f"[DEBUG] Задача {job_id} ({job['kind']}) запущена")
+
+    stop_lease = threading.Event()
+    if JOB_STORE.durable:
+        threading.Thread(target=keep_job_lease, args=(job_id, worker_id, stop_lease),
+                         daemon=True, name=f'lease-{job_id[:8]}').start()
+    try:
+        success, result, error = JOB_HANDLERS[job['kind']](job['params'], make_job_progress(job_id))
+    except Exception as e:
+        success, result, error = False, None, f'Ошибка обработки: {str(e)}'
+    finally:
+        stop_lease.set()
+
+    if success:
+        saved = JOB_STORE.finish(job_id, worker_id, 'done', result=result)
+        print(f"[DEBUG] Задача {job_id} завершена")
+    else:
+        saved = JOB_STORE.finish(job_id, worker_id, 'error', error=error)
+        print(f"[ERROR] Задача {job_id} завершилась с ошибкой: {error}")
+    if not saved:
+        print(f"[WARNING] Итог задачи {job_id} не записан: аренда истекла и задачу забрал другой воркер")
+    METRICS.job_finished(job['kind'], 'done' if success else 'error')
+
+def job_worker_loop():
+    """Воркер общей очереди (sqlite/supabase): забирает задачи, пока процесс не останавливается"""
+    worker_id = job_worker_id()
+    while not DRAINING.is_set():
+        try:
+            job = JOB_STORE.claim(worker_id, list(JOB_HANDLERS), app.config['JOB_LEASE_SECONDS'])
+        except Exception as e:
+            print(f"[WARNING] Не удалось получить задачу из очереди: {e}")
+            job = None
+        if job is None:
+            DRAINING.wait(app.config['JOB_POLL_INTERVAL'])
+            continue
+
+        if job['attempts'] > app.config['JOB_MAX_ATTEMPTS']:
+            # Задача раз за разом роняет воркер (например, нехватка памяти) - не берем ее снова
+            JOB_STORE.finish(job['job_id'], worker_id, 'error',
+                             error=f"Обработка прерывалась {job['attempts'] - 1} раз, задача остановлена")
+            print(f"[ERROR] Задача {job['job_id']} остановлена после {job['attempts'] - 1} прерываний")
+            continue
+        if job['attempts'] > 1:
+            print(f"[WARNING] Задача {job['job_id']} продолжена после сбоя воркера (попытка {job['attempts']})")
+
+        with ACTIVE_JOBS_LOCK:
+            ACTIVE_JOBS.add(job['job_id'])
+        try:
+            execute_job(job)
+        finally:
+            with ACTIVE_JOBS_LOCK:
+                ACTIVE_JOBS.discard(job['job_id'])
+
+def job_pruner_loop():
+    """Раз в JOB_PRUNE_INTERVAL удаляет завершенные задачи старше JOB_TTL_SECONDS"""
+    while not DRAINING.wait(app.config['JOB_PRUNE_INTERVAL']):
+        try:
+            JOB_STORE.prune(app.config['JOB_TTL_SECONDS'])
+        except Exception as e:
+            # Старые задачи удалим в следующий раз - очередь от этого не страдает
+            print(f"[WARNING] Не удалось удалить старые задачи: {e}")
+
+_JOB_WORKERS_PID = None
+
+def start_job_workers():
+    """Запускает очистку и воркеры общей очереди (заново после fork - потоки не наследуются)"""
+    global _JOB_WORKERS_PID
+    if _JOB_WORKERS_PID == os.getpid():
+        return
+    _JOB_WORKERS_PID = os.getpid()
+    # Очистка не на пути запроса: create_job не ждет DELETE в sqlite/supabase
+    threading.Thread(target=job_pruner_loop, daemon=True, name='job-pruner').start()
+    if not JOB_STORE.durable:
+        return
+    # JOB_WORKERS=0 - контейнер только принимает запросы, кодируют другие
+    for idx in range(app.config['JOB_WORKERS']):
+        threading.Thread(target=job_worker_loop, daemon=True, name=f'job-worker-{idx}').start()
+    print(f"[OK] Воркеров очереди задач: {app.config['JOB_WORKERS']} ({job_worker_id()})")
+
+def job_counts():
+    """Количество задач по статусам"""
+    return JOB_STORE.counts()
+
+def local_active_jobs():
+    """Задачи, которые ждет или выполняет этот процесс (для плавной остановки)"""
+    if JOB_STORE.durable:
+        # Очередь общая: задачи в очереди доделают другие контейнеры
+        with ACTIVE_JOBS_LOCK:
+            return len(ACTIVE_JOBS)
+    counts = job_counts()
+    return counts['queued'] + counts['running']
+
+def job_public_view(job):
+    """Формирует описание задачи для ответа клиенту (без внутренних путей)"""
+    return {
+        'job_id': job['job_id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'error': job['error'],
+        'progress': job.get('progress'),
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'status_url': f"/jobs/{job['job_id']}",
+        'events_url': f"/jobs/{job['job_id']}/events",
+        'result_url': f"/jobs/{job['job_id']}/result",
+        # Лесенка разрешений: каждое разрешение можно скачать отдельно, result_url отдает zip
+        **({'rendition_urls': {
+            resolution: f"/jobs/{job['job_id']}/result/{resolution}" for resolution in job['params']['outputs']
+        }} if job['kind'] == 'compress_ladder' else {})
+    }
+
+def is_async_request(default=False):
+    """Асинхронная обработка: поле формы или query-параметр async, иначе default"""
+    value = request.form.get('async') or request.args.get('async') or ('true' if default else 'false')
+    return value.lower() == 'true'
+
+def run_compress_job(params, progress=None):
+    """Задача /upload: сжатие видео"""
+    success, error = compress_video_cached(
+        params['input_path'], params['output_path'], params['resolution'],
+        source_hash=params.get('source_hash'), progress=progress
+    )
+
+    # Входной файл больше не нужен
+    TEMP_STORAGE.remove(params['input_path'])
+
+    if not success:
+        TEMP_STORAGE.remove(params['output_path'])
+        return False, None, error
+
+    return True, {
+        'output_path': params['output_path'],
+        'download_name': params['download_name'],
+        'size': os.path.getsize(params['output_path'])
+    }, None
+
+def run_compress_ladder_job(params, progress=None):
+    """Задача /upload с resolutions: сжатие в несколько разрешений за одно декодирование"""
+    outputs = params['outputs']
+    success, error = compress_video_ladder_cached(
+        params['input_path'], outputs, source_hash=params.get('source_hash'), progress=progress
+    )
+
+    # Входной файл больше не нужен
+    TEMP_STORAGE.remove(params['input_path'])
+
+    if not success:
+        for output_path in outputs.values():
+            TEMP_STORAGE.remove(output_path)
+        return False, None, error
+
+    return True, {
+        'renditions': {
+            resolution: {
+                'output_path': output_path,
+                'download_name': f"compressed_{resolution}p_{params['input_filename']}",
+                'size': os.path.getsize(output_path)
+            }
+            for resolution, output_path in outputs.items()
+        },
+        'download_name': f"compressed_{'_'.join(outputs)}p_{params['input_filename'].rsplit('.', 1)[0]}.zip"
+    }, None
+
+def send_renditions_zip(result, owner):
+    """Отдает все разрешения лесенки одним zip-архивом (MP4 уже сжат, поэтому без компрессии)"""
+    zip_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{owner}_renditions.zip')
+    if not os.path.exists(zip_path):
+        TEMP_STORAGE.register(zip_path, owner=owner)
+        partial_path = f'{zip_path}.part'
+        with zipfile.ZipFile(partial_path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for rendition in result['renditions'].values():
+                archive.write(rendition['output_path'], arcname=rendition['download_name'])
+        os.replace(partial_path, zip_path)
+
+    response = send_file(
+        zip_path,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=result['download_name']
+    )
+
+    # Удаляем временные файлы после скачивания (send_file отдает файл потоком, поэтому не сразу)
+    TEMP_STORAGE.expire_owner(owner, app.config['TEMP_DOWNLOAD_GRACE_SECONDS'])
+    return response
+
+def process_admin_video(input_path, output_path, frames_dir, source_hash=None, progress=None):
+    """Сжимает видео до 720p и извлекает кадры (общая часть синхронного и фонового режима)"""
+    # Повторная загрузка того же исходника отдается из кэша без запуска FFmpeg
+    video_key = compress_cache_key(source_hash, '720')
+    frames_mode = app.config['ADMIN_FRAMES_MODE']
+    frames_key = frames_cache_key(source_hash, 'admin_frames', 15, resolution='720',
+                                  **(scene_cache_params() if frames_mode == 'scene' else {}))
+    if RESULT_CACHE.get_file(video_key, output_path):
+        frames = RESULT_CACHE.get_frames(frames_key, frames_dir)
+        if frames:
+            print(f"[DEBUG] Видео и кадры взяты из кэша. Кадров: {len(frames)}")
+            return True, frames, None
+        # Кадров в кэше нет: убираем ссылку на кэшированное видео, чтобы FFmpeg не перезаписал запись кэша
+        os.remove(output_path)
+
+    # Один проход FFmpeg: сжатие и кадры из одного декодирования источника
+    print(f"[DEBUG] Начало сжатия видео и извлечения кадров...")
+    success, frames, error = compress_and_extract_frames(
+        input_path, output_path, frames_dir,
+        resolution='720', interval_seconds=15, priority=PRIORITY_ADMIN, progress=progress, frames_mode=frames_mode
+    )
+    if not success:
+        print(f"[ERROR] Ошибка обработки видео: {error}")
+        TEMP_STORAGE.remove(input_path)
+        return False, [], error
+    print(f"[DEBUG] Видео сжато. Размер: {os.path.getsize(output_path)} байт")
+    print(f"[DEBUG] Извлечено кадров: {len(frames)}")
+
+    RESULT_CACHE.put_file(video_key, output_path)
+    RESULT_CACHE.put_frames(frames_key, frames)
+    return True, frames, None
+
+def build_admin_frames_list(video_id, frames, base_url):
+    """Формирует список кадров с URL для админ-панели"""
+    frames_list = []
+    for idx, frame_path in enumerate(frames):
+        frame_filename = os.path.basename(frame_path)
+        # Формируем полный URL для кадра
+        frame_url = f'{base_url}/admin/frame/{video_id}/{frame_filename}'
+        frames_list.append({
+            'filename': frame_filename,
+            'url': frame_url,
+            'local_path': frame_path,
+            'index': idx + 1,
+            'timestamp': frame_timestamp(frame_path, 15)
+        })
+    return frames_list
+
+# Спрайт миниатюр для выбора обложки: одна картинка вместо запроса на каждый кадр
+SPRITE_THUMB_WIDTH = 160
+SPRITE_COLUMNS = 6
+
+def build_frames_sprite(frames, frames_dir):
+    """Склеивает миниатюры кадров в один JPEG фильтром tile; (путь, колонки, строки, ширина и высота миниатюры) или ошибка"""
+    columns = min(SPRITE_COLUMNS, len(frames))
+    rows = math.ceil(len(frames) / columns)
+    # Имя зависит от набора кадров: спрайт отдается с immutable-кэшем, как и кадры
+    names_hash = hashlib.sha1('\n'.join(os.path.basename(frame) for frame in frames).encode('utf-8')).hexdigest()[:12]
+    sprite_path = os.path.join(frames_dir, f'sprite_{names_hash}.jpg')
+
+    # Список входов для concat: кадры в порядке frames, по одному изображению каждый
+    list_path = f'{sprite_path}.txt'
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for frame in frames:
+            escaped = frame.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    cmd = [
+        'ffmpeg', '-y',
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-vf', f'scale={SPRITE_THUMB_WIDTH}:-2,tile={columns}x{rows}',
+        '-frames:v', '1',
+        '-q:v', '5',  # Миниатюры: качество ниже, чем у полноразмерных кадров
+        sprite_path
+    ]
+    try:
+        run_ffmpeg(cmd, timeout=300, stage='frames_sprite')
+    except subprocess.TimeoutExpired:
+        return None, "Превышено время ожидания обработки"
+    except subprocess.CalledProcessError as e:
+        return None, f"Ошибка FFmpeg: {e.stderr.decode('utf-8', errors='ignore')}"
+    finally:
+        os.remove(list_path)
+
+    sprite_width, sprite_height = probe_image_size(sprite_path)
+    if not sprite_width:
+        return None, "Не удалось прочитать размер спрайта"
+    return {
+        'path': sprite_path,
+        'columns': columns,
+        'rows': rows,
+        'tile_width': sprite_width // columns,
+        'tile_height': sprite_height // rows
+    }, None
+
+def sprite_index(sprite, url, frames, interval_seconds=15):
+    """Индекс спрайта для клиента: URL, сетка и положение каждого кадра"""
+    return {
+        'url': url,
+        'columns': sprite['columns'],
+        'rows': sprite['rows'],
+        'tile_width': sprite['tile_width'],
+        'tile_height': sprite['tile_height'],
+        'frames': [
+            {
+                'index': idx + 1,
+                'filename': os.path.basename(frame_path),
+                'x': (idx % sprite['columns']) * sprite['tile_width'],
+                'y': (idx // sprite['columns']) * sprite['tile_height'],
+                'timestamp': frame_timestamp(frame_path, interval_seconds)
+            }
+            for idx, frame_path in enumerate(frames)
+        ]
+    }
+
+def build_admin_sprite(video_id, frames, frames_dir, base_url):
+    """Индекс спрайта для админ-панели (None, если спрайт не создан)"""
+    if not frames:
+        return None
+    sprite, error = build_frames_sprite(frames, frames_dir)
+    if error:
+        # Админ-панель без спрайта загружает кадры по одному, как раньше
+        print(f"[WARNING] Спрайт кадров не создан: {error}")
+        return None
+    return sprite_index(sprite, f"{base_url}/admin/frame/{video_id}/{os.path.basename(sprite['path'])}", frames)
+
+def run_admin_process_job(params, progress=None):
+    """Задача /admin/process-video: сжатие до 720p и извлечение кадров"""
+    success, frames, error = process_admin_video(
+        params['input_path'], params['output_path'], params['frames_dir'],
+        source_hash=params.get('source_hash'), progress=progress
+    )
+    if not success:
+        return False, None, error
+
+    frames_list = build_admin_frames_list(params['video_id'], frames, params['base_url'])
+    return True, {
+        'success': True,
+        'video_id': params['video_id'],
+        'compressed_video_path': params['output_path'],
+        'frames': frames_list,
+        'frames_count': len(frames_list),
+        'sprite': build_admin_sprite(params['video_id'], frames, params['frames_dir'], params['base_url'])
+    }, None
+
+def run_extract_frames_job(params, progress=None):
+    """Задача /extract-frames: извлечение кадров и загрузка в бакет или статическую папку"""
+    file_id = params['file_id']
+    input_path = params['input_path']
+    frames_dir = params['frames_dir']
+    bucket_enabled = params['bucket_enabled']
+
+    # Извлекаем кадры (повторная загрузка отдается из кэша)
+    success, frames, error = extract_frames_cached(
+        input_path, frames_dir, params['interval'], source_hash=params.get('source_hash'),
+        mode=params['mode'], progress=progress
+    )
     
-    elif bucket_type == 's3':
-        try:
-            import boto3
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=app.config['AWS_ACCESS_KEY_ID'],
-                aws_secret_access_key=app.config['AWS_SECRET_ACCESS_KEY'],
-                region_name=app.config['AWS_REGION']
-            )
-            
-            bucket_name = app.config['BUCKET_NAME']
-            s3_client.upload_file(file_path, bucket_name, bucket_path)
-            
-            # Формируем URL
-            url = f"https://{bucket_name}.s3.{app.config['AWS_REGION']}.amazonaws.com/{bucket_path}"
-            return url, None
-            
-        except ImportError:
-            return None, "boto3 не установлен. Установите: pip install boto3"
-        except Exception as e:
-            return None, f"Ошибка загрузки в S3: {str(e)}"
+    # Входной файл больше не нужен
+    TEMP_STORAGE.remove(input_path)
     
-    elif bucket_type == 'yandex':
-        try:
-            import boto3
-            s3_client = boto3.client(
-                's3',
-                endpoint_url=app.config['YANDEX_ENDPOINT'],
-                aws_access_key_id=app.config['AWS_ACCESS_KEY_ID'],
-                aws_secret_access_key=app.config['AWS_SECRET_ACCESS_KEY']
-            )
-            
-            bucket_name = app.config['BUCKET_NAME']
-            s3_client.upload_file(file_path, bucket_name, bucket_path)
-            
-            url = f"{app.config['YANDEX_ENDPOINT']}/{bucket_name}/{bucket_path}"
-            return url, None
-            
-        except ImportError:
-            return None, "boto3 не установлен. Установите: pip install boto3"
-        except Exception as e:
-            return None, f"Ошибка загрузки в Yandex Object Storage: {str(e)}"
+    if not success:
+        TEMP_STORAGE.release_owner(file_id)
+        return False, None, error
+
+    # Спрайт миниатюр: превью всех кадров одной картинкой (без него клиент грузит кадры по одному)
+    sprite, sprite_error = build_frames_sprite(frames, frames_dir) if frames else (None, None)
+    if sprite_error:
+        print(f"[WARNING] Спрайт кадров не создан: {sprite_error}")
     
-    elif bucket_type == 'supabase':
-        try:
-            from supabase import create_client, Client
-            
-            supabase_url = app.config['SUPABASE_URL']
-            supabase_key = app.config['SUPABASE_KEY']
-            bucket_name = app.config['SUPABASE_BUCKET']
-            
-            if not supabase_url or not supabase_key:
-                return None, "SUPABASE_URL и SUPABASE_KEY не настроены"
-            
-            # Создаем клиент Supabase
-            supabase: Client = create_client(supabase_url, supabase_key)
-            
-            # Читаем файл
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
-            
-            # Загружаем файл в Supabase Storage
-            storage_client = supabase.storage.from_(bucket_name)
-            
-            # Пытаемся загрузить файл (с автоматической перезаписью если существует)
+    uploaded_files = []
+    errors = []
+    sprite_url = None
+    bucket_type = app.config['BUCKET_TYPE'] if bucket_enabled and app.config['BUCKET_ENABLED'] else 'local'
+    
+    # Создаем статическую папку для кадров, если нужно
+    static_frames_dir = os.path.join(STATIC_FRAMES_FOLDER, file_id)
+    if bucket_type == 'local':
+        os.makedirs(static_frames_dir, exist_ok=True)
+        TEMP_STORAGE.register(static_frames_dir, owner=file_id, ttl=app.config['TEMP_FRAMES_TTL_SECONDS'])
+    
+    if bucket_enabled and app.config['BUCKET_ENABLED']:
+        # Загружаем кадры в бакет параллельно (ограниченным пулом потоков)
+        uploaded_files, errors = upload_frames_to_bucket(frames, file_id, bucket_type)
+        if sprite:
+            sprite_url, sprite_error = upload_to_bucket(
+                sprite['path'], f"frames/{file_id}/{os.path.basename(sprite['path'])}", bucket_type
+            )
+            if sprite_error:
+                print(f"[WARNING] Спрайт кадров не загружен: {sprite_error}")
+        if bucket_type == 'local':
+            # URL кадров указывают на рабочую папку - храним её как статические кадры
+            TEMP_STORAGE.register(frames_dir, owner=file_id, ttl=app.config['TEMP_FRAMES_TTL_SECONDS'])
+        else:
+            TEMP_STORAGE.remove(frames_dir)
+    else:
+        # Локальное хранение - копируем каждый кадр в статическую папку
+        for idx, frame_path in enumerate(frames):
+            frame_filename = os.path.basename(frame_path)
             try:
-                # Используем upload с опцией upsert для перезаписи существующих файлов
-                response = storage_client.upload(
-                    path=bucket_path,
-                    file=file_data,
-                    file_options={
-                        "content-type": "image/jpeg",
-                        "upsert": "true"
-                    }
-                )
-            except Exception as upload_error:
-                # Если upload не сработал, пробуем обновить существующий файл
-                error_str = str(upload_error)
-                if "already exists" in error_str.lower() or "duplicate" in error_str.lower():
-                    try:
-                        response = storage_client.update(
-                            path=bucket_path,
-                            file=file_data,
-                            file_options={"content-type": "image/jpeg"}
-                        )
-                    except Exception as update_error:
-                        return None, f"Ошибка обновления файла: {str(update_error)}"
-                else:
-                    return None, f"Ошибка загрузки файла: {error_str}"
-            
-            # Получаем публичный URL
-            # get_public_url возвращает строку с URL
+                static_frame_path = os.path.join(static_frames_dir, frame_filename)
+                shutil.copy2(frame_path, static_frame_path)
+                
+                uploaded_files.append({
+                    'filename': frame_filename,
+                    'url': f'/static/frames/{file_id}/{frame_filename}',
+                    'local_path': static_frame_path,
+                    'index': idx + 1
+                })
+            except Exception as e:
+                errors.append(f"Ошибка копирования {frame_filename}: {str(e)}")
+        if sprite:
+            sprite_filename = os.path.basename(sprite['path'])
             try:
-                url = storage_client.get_public_url(bucket_path)
-                # Если это словарь, извлекаем URL
-                if isinstance(url, dict):
-                    url = url.get('publicUrl', '')
-            except Exception:
-                # Если метод не работает, формируем URL вручную
-                url = f"{supabase_url}/storage/v1/object/public/{bucket_name}/{bucket_path}"
-            
-            # Убеждаемся, что у нас есть валидный URL
-            if not url:
-                url = f"{supabase_url}/storage/v1/object/public/{bucket_name}/{bucket_path}"
-            
-            return url, None
-            
-        except ImportError:
-            return None, "supabase не установлен. Установите: pip install supabase"
-        except Exception as e:
-            error_msg = str(e)
-            return None, f"Ошибка загрузки в Supabase Storage: {error_msg}"
+                shutil.copy2(sprite['path'], os.path.join(static_frames_dir, sprite_filename))
+                sprite_url = f'/static/frames/{file_id}/{sprite_filename}'
+            except OSError as e:
+                print(f"[WARNING] Спрайт кадров не скопирован: {e}")
+        TEMP_STORAGE.remove(frames_dir)
+
+    # Отметка времени каждого кадра (в режиме scene кадры идут не через равные промежутки)
+    for frame_info in uploaded_files:
+        frame_info['timestamp'] = frame_timestamp(frame_info['filename'], params['interval'])
     
-    return None, f"Неподдерживаемый тип бакета: {bucket_type}"
-
-def compress_video(input_path, output_path, resolution):
-    """Сжимает видео до указанного разрешения используя FFmpeg"""
-    resolutions = {
-        '1080': {'width': 1920, 'height': 1080},
-        '720': {'width': 1280, 'height': 720},
-        '480': {'width': 854, 'height': 480},
-        '360': {'width': 640, 'height': 360}
+    # Формируем ответ
+    result = {
+        'success': True,
+        'frames_count': len(uploaded_files),
+        'frames': uploaded_files,
+        'bucket_type': bucket_type,
+        'bucket_enabled': bucket_enabled and app.config['BUCKET_ENABLED'],
+        'sprite': sprite_index(sprite, sprite_url, frames, params['interval']) if sprite_url else None
     }
     
-    if resolution not in resolutions:
-        raise ValueError(f"Неподдерживаемое разрешение: {resolution}")
-    
-    # Команда FFmpeg для сжатия видео
-    # Используем scale с сохранением пропорций и округлением до четных чисел
-    target_res = resolutions[resolution]
-    # Используем -2 для автоматического округления до ближайшего четного числа
-    # force_original_aspect_ratio=decrease - сохраняет пропорции, не добавляет черные полосы
-    # Это гарантирует, что размеры будут четными (требование libx264)
-    scale_filter = f"scale={target_res['width']}:-2:force_original_aspect_ratio=decrease"
-    
-    cmd = [
-        'ffmpeg',
-        '-i', input_path,
-        '-vf', scale_filter,
-        '-c:v', 'libx264',
-        '-preset', 'medium',
-        '-crf', '23',
-        '-c:a', 'aac',
-        '-b:a', '128k',
-        '-movflags', '+faststart',
-        '-y',  # Перезаписать выходной файл
-        output_path
-    ]
-    
-    try:
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True,
-            timeout=3600  # 60 минут максимум для больших файлов
+    if errors:
+        result['errors'] = errors
+
+    return True, result, None
+
+JOB_HANDLERS['compress'] = run_compress_job
+JOB_HANDLERS['compress_ladder'] = run_compress_ladder_job
+JOB_HANDLERS['admin_process'] = run_admin_process_job
+JOB_HANDLERS['extract_frames'] = run_extract_frames_job
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Возвращает статус фоновой задачи"""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Задача не найдена'}), 404
+    return jsonify({'success': True, 'job': job_public_view(job)})
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events: прогресс задачи (progress) и завершение (done / error)"""
+    if not get_job(job_id):
+        return jsonify({'success': False, 'error': 'Задача не найдена'}), 404
+
+    def format_event(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def stream():
+        version = None
+        while True:
+            # Ждем изменения задачи; по таймауту шлем комментарий, чтобы прокси не закрыл соединение
+            job = JOB_STORE.wait_for_change(job_id, version, timeout=15)
+            if job is None:
+                yield format_event('error', {'error': 'Задача не найдена'})
+                return
+            if job['version'] == version:
+                yield ": keep-alive\n\n"
+                continue
+
+            version = job['version']
+            view = job_public_view(job)
+            if job['status'] in ('done', 'error'):
+                yield format_event(job['status'], view)
+                return
+            yield format_event('progress', view)
+
+    response = app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx не должен буферизовать события
+    return response
+
+def get_finished_job(job_id):
+    """Возвращает (задача, None) для завершенной задачи или (None, ответ с ошибкой)"""
+    job = get_job(job_id)
+    if not job:
+        return None, (jsonify({'success': False, 'error': 'Задача не найдена'}), 404)
+
+    if job['status'] == 'error':
+        return None, (jsonify({'success': False, 'error': job['error'], 'job': job_public_view(job)}), 500)
+    if job['status'] != 'done':
+        return None, (jsonify({'success': False, 'error': 'Задача еще выполняется', 'job': job_public_view(job)}), 409)
+    return job, None
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Возвращает результат задачи: сжатый файл, zip лесенки разрешений или JSON со списком кадров"""
+    job, error_response = get_finished_job(job_id)
+    if error_response:
+        return error_response
+
+    result = job['result']
+    if job['kind'] == 'compress_ladder':
+        if not all(os.path.exists(rendition['output_path']) for rendition in result['renditions'].values()):
+            return jsonify({'success': False, 'error': 'Результат уже удален'}), 410
+        return send_renditions_zip(result, job_id)
+
+    if job['kind'] == 'compress':
+        if not os.path.exists(result['output_path']):
+            return jsonify({'success': False, 'error': 'Результат уже удален'}), 410
+
+        response = send_file(
+            result['output_path'],
+            mimetype='video/mp4',
+            as_attachment=True,
+            download_name=result['download_name']
         )
-        return True, None
-    except subprocess.TimeoutExpired:
-        return False, "Превышено время ожидания обработки"
-    except subprocess.CalledProcessError as e:
-        return False, f"Ошибка FFmpeg: {e.stderr.decode('utf-8', errors='ignore')}"
-    except FileNotFoundError:
-        return False, "FFmpeg не найден. Убедитесь, что FFmpeg установлен и доступен в PATH"
+
+        # Удаляем результат после скачивания (send_file отдает файл потоком, поэтому не сразу)
+        TEMP_STORAGE.expire(result['output_path'], app.config['TEMP_DOWNLOAD_GRACE_SECONDS'])
+        return response
+
+    return jsonify(result)
+
+@app.route('/jobs/<job_id>/result/<resolution>', methods=['GET'])
+def job_rendition_result(job_id, resolution):
+    """Возвращает одно разрешение из лесенки"""
+    job, error_response = get_finished_job(job_id)
+    if error_response:
+        return error_response
+
+    rendition = job['result'].get('renditions', {}).get(resolution.rstrip('p')) if job['kind'] == 'compress_ladder' else None
+    if not rendition:
+        return jsonify({'success': False, 'error': 'Разрешение не найдено в задаче'}), 404
+    if not os.path.exists(rendition['output_path']):
+        return jsonify({'success': False, 'error': 'Результат уже удален'}), 410
+
+    response = send_file(
+        rendition['output_path'],
+        mimetype='video/mp4',
+        as_attachment=True,
+        download_name=rendition['download_name']
+    )
+
+    # Остальные разрешения задачи остаются доступны до истечения TTL
+    TEMP_STORAGE.expire(rendition['output_path'], app.config['TEMP_DOWNLOAD_GRACE_SECONDS'])
+    return response
+
+# ============================================
+# ОСТАНОВКА СЕРВИСА: плавное завершение при деплое
+# ============================================
+# По SIGTERM (см. gunicorn.conf.py) воркер перестает принимать новые загрузки,
+# дожидается фоновых задач и процессов FFmpeg не дольше DRAIN_TIMEOUT и только
+# потом завершается. Так деплой не обрывает многочасовое кодирование.
+
+DRAINING = threading.Event()
+DRAIN_STARTED_AT = None
+
+# Эндпоинты, которые начинают новую обработку (во время остановки отвечают 503)
+INGEST_ENDPOINTS = {'upload_file', 'upload_stream', 'extract_frames_endpoint', 'admin_process_video', 'admin_batch_import'}
+
+def begin_drain():
+    """Переводит воркер в режим остановки: новые загрузки не принимаются"""
+    global DRAIN_STARTED_AT
+    if DRAINING.is_set():
+        return
+    DRAIN_STARTED_AT = time.time()
+    DRAINING.set()
+    print(f"[OK] Остановка воркера {os.getpid()}: новые загрузки не принимаются")
+
+def wait_for_drain(timeout=None):
+    """Ждет завершения фоновых задач и FFmpeg; по истечении времени останавливает оставшиеся процессы"""
+    begin_drain()
+    if timeout is None:
+        timeout = app.config['DRAIN_TIMEOUT']
+    deadline = DRAIN_STARTED_AT + timeout
+
+    while time.time() < deadline:
+        active_jobs = local_active_jobs()
+        processes = ffmpeg_process_count()
+        if not active_jobs and not processes:
+            print(f"[OK] Воркер {os.getpid()}: все задачи завершены")
+            return True
+        time.sleep(1)
+
+    terminated = terminate_ffmpeg_processes()
+    print(f"[WARNING] Воркер {os.getpid()}: время ожидания истекло, остановлено процессов FFmpeg: {terminated}")
+    return False
+
+@app.before_request
+def reject_ingest_while_draining():
+    """Во время остановки новые загрузки получают 503 - клиент повторит запрос на другом воркере"""
+    if DRAINING.is_set() and request.endpoint in INGEST_ENDPOINTS:
+        response = jsonify({'success': False, 'error': 'Сервис перезапускается, повторите запрос позже'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def receive_upload_files():
+    """Принимает multipart-тело запроса с замером времени приема и объема"""
+    # Первое обращение к request.files читает тело целиком (файл пишется во временный файл Werkzeug)
+    with stage_timer('upload_receive'):
+        files = request.files
+    METRICS.observe_received(request.endpoint, request.content_length or 0)
+    return files
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
+    # Проверяем место до приема файла: при заполненном диске FFmpeg все равно упадет
+    has_space, space_error = TEMP_STORAGE.check_space(request.content_length)
+    if not has_space:
+        return jsonify({'error': space_error}), 507
+
+    files = receive_upload_files()
+    if 'file' not in files:
         return jsonify({'error': 'Файл не загружен'}), 400
     
-    file = request.files['file']
+    file = files['file']
     resolution = request.form.get('resolution', '720')
+    # Лесенка: resolutions=720,480 - все разрешения из одного декодирования источника
+    ladder, ladder_error = parse_resolution_list(request.form.getlist('resolutions'))
+    if ladder_error:
+        return jsonify({'error': ladder_error}), 400
+    if len(ladder) == 1:
+        resolution = ladder[0]
     
     if file.filename == '':
         return jsonify({'error': 'Файл не выбран'}), 400
@@ -348,16 +3706,62 @@ def upload_file():
             input_ext = 'mp4'
         input_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{file_id}_input.{input_ext}')
         output_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{file_id}_output.mp4')
+        TEMP_STORAGE.register(input_path, owner=file_id)
+        TEMP_STORAGE.register(output_path, owner=file_id)
         
-        file.save(input_path)
-        
-        # Сжимаем видео
-        success, error = compress_video(input_path, output_path, resolution)
+        with stage_timer('file_save'):
+            file.save(input_path)
+        source_hash = uploaded_file_hash(file)
+
+        # Битый файл отклоняем сразу, а не после постановки в очередь
+        _, media_error = probe_media(input_path)
+        if media_error:
+            TEMP_STORAGE.release_owner(file_id)
+            return jsonify({'error': media_error}), 400
+
+        if len(ladder) > 1:
+            TEMP_STORAGE.remove(output_path)
+            outputs = {}
+            for ladder_resolution in ladder:
+                outputs[ladder_resolution] = os.path.join(
+                    app.config['UPLOAD_FOLDER'], f'{file_id}_output_{ladder_resolution}p.mp4'
+                )
+                TEMP_STORAGE.register(outputs[ladder_resolution], owner=file_id)
+            ladder_params = {
+                'input_path': input_path,
+                'outputs': outputs,
+                'source_hash': source_hash,
+                'input_filename': input_filename
+            }
+
+            if is_async_request(default=True):
+                job = create_job('compress_ladder', ladder_params, job_id=file_id)
+                return jsonify({'success': True, **job_public_view(job)}), 202
+
+            success, result, error = run_compress_ladder_job(ladder_params)
+            if not success:
+                TEMP_STORAGE.release_owner(file_id)
+                return jsonify({'error': error}), 500
+            return send_renditions_zip(result, file_id)
+
+        # По умолчанию ставим задачу в очередь и сразу возвращаем job_id;
+        # async=false - старый синхронный ответ сжатым файлом
+        if is_async_request(default=True):
+            job = create_job('compress', {
+                'input_path': input_path,
+                'output_path': output_path,
+                'resolution': resolution,
+                'source_hash': source_hash,
+                'download_name': f'compressed_{resolution}p_{input_filename}'
+            }, job_id=file_id)
+            return jsonify({'success': True, **job_public_view(job)}), 202
+
+        # Сжимаем видео (повторная загрузка отдается из кэша)
+        success, error = compress_video_cached(input_path, output_path, resolution, source_hash=source_hash)
         
         if not success:
-            # Удаляем входной файл
-            if os.path.exists(input_path):
-                os.remove(input_path)
+            # Удаляем временные файлы
+            TEMP_STORAGE.release_owner(file_id)
             return jsonify({'error': error}), 500
         
         # Возвращаем сжатое видео
@@ -368,39 +3772,159 @@ def upload_file():
             download_name=f'compressed_{resolution}p_{input_filename}'
         )
         
-        # Удаляем временные файлы после отправки (в фоновом режиме)
-        def remove_files():
-            import time
-            time.sleep(5)  # Даем время на скачивание
-            if os.path.exists(input_path):
-                os.remove(input_path)
-            if os.path.exists(output_path):
-                os.remove(output_path)
-        
-        # Запускаем удаление в фоне (упрощенный вариант)
-        import threading
-        threading.Thread(target=remove_files, daemon=True).start()
+        # Удаляем временные файлы после скачивания (send_file отдает файл потоком, поэтому не сразу)
+        TEMP_STORAGE.expire_owner(file_id, app.config['TEMP_DOWNLOAD_GRACE_SECONDS'])
         
         return response
         
     except Exception as e:
         return jsonify({'error': f'Ошибка обработки: {str(e)}'}), 500
 
+@app.route('/upload/stream', methods=['POST', 'PUT'])
+def upload_stream():
+    """Сжимает видео во время загрузки: тело запроса - сам файл, параметры в query string"""
+    filename = request.args.get('filename') or request.headers.get('X-Filename', '')
+    resolution = request.args.get('resolution', '720')
+
+    if not filename:
+        return jsonify({'error': 'Не указано имя файла (filename)'}), 400
+
+    if not allowed_file(filename):
+        return jsonify({'error': 'Неподдерживаемый формат файла'}), 400
+
+    if resolution not in ['1080', '720', '480', '360']:
+        return jsonify({'error': 'Неподдерживаемое разрешение'}), 400
+
+    # При chunked-передаче размер неизвестен - проверяем только свободное место
+    has_space, space_error = TEMP_STORAGE.check_space(request.content_length)
+    if not has_space:
+        return jsonify({'error': space_error}), 507
+
+    try:
+        file_id = str(uuid.uuid4())
+        input_filename = secure_filename(filename)
+        if '.' in input_filename:
+            input_ext = input_filename.rsplit('.', 1)[1].lower()
+        else:
+            input_ext = 'mp4'
+        input_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{file_id}_input.{input_ext}')
+        output_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{file_id}_output.mp4')
+        TEMP_STORAGE.register(input_path, owner=file_id)
+        TEMP_STORAGE.register(output_path, owner=file_id)
+
+        stream = request.stream
+        chunk_size = app.config['STREAM_CHUNK_SIZE']
+        receive_started = time.monotonic()
+
+        # Читаем начало файла, пока не станет ясно, можно ли отдавать его FFmpeg через pipe
+        prefix = b''
+        ingest_mode = None
+        while ingest_mode is None:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            prefix += chunk
+            ingest_mode = choose_ingest_mode(input_ext, prefix)
+
+        if not prefix:
+            return jsonify({'error': 'Файл не загружен'}), 400
+
+        # Хэш исходника считаем по мере приема - для кэша результатов
+        digest = hashlib.sha256()
+        received = 0
+
+        def body_chunks():
+            nonlocal received
+            digest.update(prefix)
+            received += len(prefix)
+            yield prefix
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                received += len(chunk)
+                yield chunk
+            METRICS.observe_stage('upload_receive', time.monotonic() - receive_started)
+            METRICS.observe_received(request.endpoint, received)
+
+        # Слот занимаем только если он свободен сразу: иначе медленная загрузка держала бы CPU-слот
+        threads = None
+        if ingest_mode == 'stream':
+            threads = ENCODE_SCHEDULER.acquire(PRIORITY_PUBLIC, blocking=False)
+            if threads is None:
+                print("[DEBUG] Нет свободного слота FFmpeg, сохраняем файл перед сжатием")
+                ingest_mode = 'spool'
+
+        print(f"[DEBUG] Потоковый прием {input_filename}: режим {ingest_mode}")
+
+        if ingest_mode == 'stream':
+            try:
+                success, error = compress_video_from_stream(body_chunks(), output_path, resolution, threads)
+            finally:
+                ENCODE_SCHEDULER.release()
+            # Кодирование уже шло во время приема, но результат пригодится при повторной загрузке
+            if success:
+                METRICS.observe_ffmpeg_bytes('compress_video_stream', received, os.path.getsize(output_path))
+                RESULT_CACHE.put_file(compress_cache_key(digest.hexdigest(), resolution), output_path)
+        else:
+            # Контейнер требует перемотки - сохраняем файл и сжимаем как в /upload
+            with open(input_path, 'wb') as f:
+                for chunk in body_chunks():
+                    f.write(chunk)
+            success, error = compress_video_cached(input_path, output_path, resolution, source_hash=digest.hexdigest())
+
+        if not success:
+            TEMP_STORAGE.release_owner(file_id)
+            return jsonify({'error': error}), 500
+
+        response = send_file(
+            output_path,
+            mimetype='video/mp4',
+            as_attachment=True,
+            download_name=f'compressed_{resolution}p_{input_filename}'
+        )
+        response.headers['X-Ingest-Mode'] = ingest_mode
+
+        # Удаляем временные файлы после скачивания (send_file отдает файл потоком, поэтому не сразу)
+        TEMP_STORAGE.expire_owner(file_id, app.config['TEMP_DOWNLOAD_GRACE_SECONDS'])
+
+        return response
+
+    except Exception as e:
+        return jsonify({'error': f'Ошибка обработки: {str(e)}'}), 500
+
 @app.route('/extract-frames', methods=['POST'])
 def extract_frames_endpoint():
     """Извлекает кадры из видео каждые 15 секунд и сохраняет в бакет"""
-    if 'file' not in request.files:
+    # Место проверяем до чтения тела: request.files сохраняет всю загрузку на диск
+    has_space, space_error = TEMP_STORAGE.check_space(request.content_length)
+    if not has_space:
+        return jsonify({'error': space_error}), 507
+
+    files = receive_upload_files()
+    if 'file' not in files:
         return jsonify({'error': 'Файл не загружен'}), 400
     
-    file = request.files['file']
-    interval = int(request.form.get('interval', 15))  # Интервал в секундах
+    file = files['file']
+    try:
+        interval = int(request.form.get('interval', 15))  # Интервал в секундах
+    except ValueError:
+        interval = 0
+    frames_mode = request.form.get('mode', 'auto')  # 'auto', 'decode', 'seek' или 'scene'
     bucket_enabled = request.form.get('bucket_enabled', 'false').lower() == 'true'
     
+    if interval < 1:
+        return jsonify({'error': FRAME_INTERVAL_ERROR}), 400
+    
     if file.filename == '':
         return jsonify({'error': 'Файл не выбран'}), 400
     
     if not allowed_file(file.filename):
         return jsonify({'error': 'Неподдерживаемый формат файла'}), 400
+
+    if frames_mode not in ('auto', 'decode', 'seek', 'scene'):
+        return jsonify({'error': 'Неподдерживаемый режим извлечения кадров'}), 400
     
     try:
         # Сохраняем загруженный файл
@@ -414,103 +3938,82 @@ def extract_frames_endpoint():
             input_ext = 'mp4'
         input_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{file_id}_input.{input_ext}')
         frames_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'{file_id}_frames')
+        TEMP_STORAGE.register(input_path, owner=file_id)
+        TEMP_STORAGE.register(frames_dir, owner=file_id)
         
-        file.save(input_path)
-        
-        # Извлекаем кадры
-        success, frames, error = extract_frames(input_path, frames_dir, interval)
+        with stage_timer('file_save'):
+            file.save(input_path)
+        source_hash = uploaded_file_hash(file)
+
+        _, media_error = probe_media(input_path)
+        if media_error:
+            TEMP_STORAGE.release_owner(file_id)
+            return jsonify({'error': media_error}), 400
         
+        params = {
+            'file_id': file_id,
+            'input_path': input_path,
+            'frames_dir': frames_dir,
+            'interval': interval,
+            'mode': frames_mode,
+            'bucket_enabled': bucket_enabled,
+            'source_hash': source_hash
+        }
+
+        # Асинхронный режим: извлечение и загрузка кадров в фоне, прогресс - /jobs/<job_id>/events
+        if is_async_request():
+            job = create_job('extract_frames', params, job_id=file_id)
+            return jsonify({'success': True, **job_public_view(job)}), 202
+
+        success, result, error = run_extract_frames_job(params)
         if not success:
-            if os.path.exists(input_path):
-                os.remove(input_path)
             return jsonify({'error': error}), 500
         
-        uploaded_files = []
-        errors = []
-        bucket_type = app.config['BUCKET_TYPE'] if bucket_enabled and app.config['BUCKET_ENABLED'] else 'local'
-        
-        # Создаем статическую папку для кадров, если нужно
-        static_frames_base = os.path.join(os.path.dirname(__file__), 'static', 'frames')
-        static_frames_dir = os.path.join(static_frames_base, file_id)
-        if bucket_type == 'local':
-            os.makedirs(static_frames_dir, exist_ok=True)
-        
-        # Загружаем каждый кадр в бакет или копируем в статическую папку
-        for idx, frame_path in enumerate(frames):
-            frame_filename = os.path.basename(frame_path)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            
-            if bucket_enabled and app.config['BUCKET_ENABLED']:
-                # Формируем путь в бакете
-                bucket_path = f"frames/{file_id}/{timestamp}_{frame_filename}"
-                url, upload_error = upload_to_bucket(frame_path, bucket_path, bucket_type)
-                
-                if url:
-                    uploaded_files.append({
-                        'filename': frame_filename,
-                        'url': url,
-                        'local_path': frame_path,
-                        'index': idx + 1
-                    })
-                else:
-                    errors.append(f"Ошибка загрузки {frame_filename}: {upload_error}")
-            else:
-                # Локальное хранение - копируем в статическую папку
-                try:
-                    static_frame_path = os.path.join(static_frames_dir, frame_filename)
-                    shutil.copy2(frame_path, static_frame_path)
-                    
-                    uploaded_files.append({
-                        'filename': frame_filename,
-                        'url': f'/static/frames/{file_id}/{frame_filename}',
-                        'local_path': static_frame_path,
-                        'index': idx + 1
-                    })
-                except Exception as e:
-                    errors.append(f"Ошибка копирования {frame_filename}: {str(e)}")
-        
-        # Формируем ответ
-        result = {
-            'success': True,
-            'frames_count': len(uploaded_files),
-            'frames': uploaded_files,
-            'bucket_type': bucket_type,
-            'bucket_enabled': bucket_enabled and app.config['BUCKET_ENABLED']
-        }
-        
-        if errors:
-            result['errors'] = errors
-        
-        # Удаляем входной файл в фоне
-        def cleanup():
-            import time
-            time.sleep(10)  # Даем время на обработку
-            if os.path.exists(input_path):
-                os.remove(input_path)
-            # Кадры оставляем для возможности скачивания
-        
-        import threading
-        threading.Thread(target=cleanup, daemon=True).start()
-        
         return jsonify(result)
         
     except Exception as e:
         return jsonify({'error': f'Ошибка обработки: {str(e)}'}), 500
 
+def send_frame_file(base_dir, relative_path, accel_prefix):
+    """Отдает кадр как неизменяемый контент: ETag, долгий Cache-Control, условные и Range-запросы.
+
+    Имена кадров уникальны (uuid видео в пути), поэтому браузер может не перепроверять их.
+    При X_ACCEL_REDIRECT байты отдает nginx из internal-location с префиксом accel_prefix.
+    """
+    frame_path = safe_join(base_dir, relative_path)
+    if frame_path is None or not os.path.isfile(frame_path):
+        return jsonify({'error': 'Файл не найден'}), 404
+
+    max_age = app.config['FRAME_CACHE_MAX_AGE']
+
+    if app.config['X_ACCEL_REDIRECT']:
+        # nginx сам обработает If-None-Match / Range; Cache-Control он передает клиенту как есть
+        response = app.response_class(mimetype='image/jpeg')
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{relative_path}"
+    else:
+        # send_file отвечает 304 / 206 по If-None-Match, If-Modified-Since и Range
+        response = send_file(frame_path, mimetype='image/jpeg', conditional=True, etag=True, max_age=max_age)
+
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/static/frames/<file_id>/<filename>')
 def serve_frame(file_id, filename):
     """Отдает кадр из статической папки"""
     try:
-        frame_path = os.path.join(os.path.dirname(__file__), 'static', 'frames', file_id, filename)
-        if os.path.exists(frame_path):
-            return send_file(frame_path, mimetype='image/jpeg')
-        else:
-            return jsonify({'error': 'Файл не найден'}), 404
+        return send_frame_file(STATIC_FRAMES_FOLDER, f'{file_id}/{filename}',
+                               app.config['X_ACCEL_FRAMES_PREFIX'])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/health')
 def health():
+    # Воркер останавливается - балансировщик должен перестать слать запросы
+    if DRAINING.is_set():
+        return jsonify({'status': 'draining', 'ffmpeg_processes': ffmpeg_process_count()}), 503
+
     # Проверяем наличие FFmpeg
     try:
         result = subprocess.run(['ffmpeg', '-version'], 
@@ -526,6 +4029,22 @@ def health():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
 
+@app.route('/metrics')
+def metrics():
+    """Метрики в формате Prometheus: этапы конвейера, FFmpeg, хранилища, очереди, ошибки"""
+    if not METRICS.enabled:
+        return jsonify({'error': 'prometheus_client не установлен. Установите: pip install prometheus-client'}), 501
+
+    upload_folder = next(iter(TEMP_STORAGE.roots))
+    METRICS.set_temp_usage(TEMP_STORAGE.used_bytes(), shutil.disk_usage(upload_folder).free)
+    try:
+        METRICS.set_jobs(job_counts())
+    except Exception as e:
+        # Хранилище задач недоступно - остальные метрики все равно отдаем
+        print(f"[WARNING] Не удалось получить количество задач: {e}")
+    body, content_type = METRICS.render()
+    return app.response_class(body, content_type=content_type)
+
 # ============================================
 # АДМИН-ПАНЕЛЬ: Загрузка видео в портфолио
 # ============================================
@@ -539,53 +4058,210 @@ CATEGORY_FOLDER_MAP = {
     'sfery': 'Sfery'
 }
 
+_HTTP_CLIENT = None
+_HTTP_CLIENT_PID = None
+_HTTP_CLIENT_LOCK = threading.Lock()
+
+def get_http_client():
+    """Возвращает общий для процесса HTTP-клиент Supabase (keep-alive, пул соединений, HTTP/2)"""
+    global _HTTP_CLIENT, _HTTP_CLIENT_PID
+
+    # После fork (несколько воркеров) соединения родителя использовать нельзя
+    if _HTTP_CLIENT is not None and _HTTP_CLIENT_PID == os.getpid():
+        return _HTTP_CLIENT
+
+    with _HTTP_CLIENT_LOCK:
+        if _HTTP_CLIENT is not None and _HTTP_CLIENT_PID == os.getpid():
+            return _HTTP_CLIENT
+
+        import httpx
+
+        supabase_url = app.config.get('SUPABASE_URL', '')
+        client_kwargs = {
+            'timeout': 30.0,
+            'limits': httpx.Limits(
+                max_connections=app.config['HTTP_MAX_CONNECTIONS'],
+                max_keepalive_connections=app.config['HTTP_MAX_KEEPALIVE'],
+                keepalive_expiry=app.config['HTTP_KEEPALIVE_EXPIRY']
+            )
+        }
+
+        # Настройки для обхода прокси при работе с localhost
+        # Используем trust_env=False для отключения прокси из переменных окружения
+        if '127.0.0.1' in supabase_url or 'localhost' in supabase_url:
+            # Отключаем использование переменных окружения для прокси (обход Privoxy)
+            client_kwargs['trust_env'] = False
+
+        if app.config['HTTP2_ENABLED']:
+            try:
+                import h2  # noqa: F401
+                client_kwargs['http2'] = True
+            except ImportError:
+                # Без пакета h2 работаем по HTTP/1.1 с keep-alive
+                pass
+
+        _HTTP_CLIENT = httpx.Client(**client_kwargs)
+        _HTTP_CLIENT_PID = os.getpid()
+        print(f"[OK] HTTP-клиент Supabase создан (HTTP/2: {client_kwargs.get('http2', False)})")
+        return _HTTP_CLIENT
+
+def close_http_client():
+    """Закрывает общий HTTP-клиент при завершении процесса"""
+    if _HTTP_CLIENT is not None and _HTTP_CLIENT_PID == os.getpid():
+        _HTTP_CLIENT.close()
+
+atexit.register(close_http_client)
+
 def upload_to_supabase_storage(file_path, storage_path, bucket_name='portfolio'):
     """Загружает файл в Supabase Storage используя прямой HTTP API"""
     try:
-        import httpx
+        storage = get_storage('supabase', bucket_name)
+        _, error = storage.upload_file_measured(file_path, storage_path)
+        if error:
+            return None, error
         
+        # Формируем публичный URL в формате полного пути для сохранения в БД
+        # Формат: /storage/v1/object/public/portfolio/{folder}/{filename}
+        return storage.object_path(storage_path), None
+                
+    except Exception as e:
+        app.logger.error(f"Ошибка загрузки в Supabase Storage: {e}")
+        app.logger.exception("Traceback:")
+        return None, str(e)
+
+# Незавершенные TUS-загрузки процесса: повторный вызов для того же файла продолжает с места обрыва
+_TUS_UPLOADS = {}
+_TUS_UPLOADS_LOCK = threading.Lock()
+
+def tus_create_upload(client, supabase_url, headers, file_size, storage_path, bucket_name, content_type):
+    """Создает сессию TUS-загрузки; возвращает (upload_url, error)"""
+    def encode(value):
+        return base64.b64encode(value.encode('utf-8')).decode('ascii')
+
+    metadata = ','.join([
+        f'bucketName {encode(bucket_name)}',
+        f'objectName {encode(storage_path)}',
+        f'contentType {encode(content_type)}',
+        f'cacheControl {encode("3600")}'
+    ])
+
+    response = client.post(
+        f"{supabase_url}/storage/v1/upload/resumable",
+        headers={
+            **headers,
+            'Upload-Length': str(file_size),
+            'Upload-Metadata': metadata,
+            'x-upsert': 'true'  # Перезаписываем если существует
+        },
+        timeout=30.0
+    )
+    if response.status_code != 201 or 'Location' not in response.headers:
+        return None, f'Ошибка создания загрузки: {response.status_code} - {response.text[:500]}'
+
+    # Location может содержать внешний адрес Supabase, поэтому берем только id загрузки
+    upload_id = response.headers['Location'].rstrip('/').rsplit('/', 1)[-1]
+    return f"{supabase_url}/storage/v1/upload/resumable/{upload_id}", None
+
+def tus_get_offset(client, upload_url, headers):
+    """Узнает у сервера, сколько байт уже принято (None - сессия не найдена)"""
+    try:
+        response = client.head(upload_url, headers=headers, timeout=30.0)
+    except Exception:
+        return None
+    if response.status_code not in (200, 204) or 'Upload-Offset' not in response.headers:
+        return None
+    return int(response.headers['Upload-Offset'])
+
+def upload_to_supabase_resumable(file_path, storage_path, bucket_name='portfolio',
+                                 content_type='application/octet-stream'):
+    """Загружает большой файл в Supabase Storage по протоколу TUS блоками с диска с докачкой"""
+    try:
+        import httpx
+
         supabase_url = app.config.get('SUPABASE_URL', '').rstrip('/')
         supabase_key = app.config.get('SUPABASE_KEY', '')
-        
-        if not supabase_url or not supabase_key:
-            return None, 'Supabase URL или KEY не установлены'
-        
-        # Формируем URL для загрузки
-        upload_url = f"{supabase_url}/storage/v1/object/{bucket_name}/{storage_path}"
-        
-        # Читаем файл
-        with open(file_path, 'rb') as f:
-            file_data = f.read()
-        
-        # Загружаем файл
+
+        if not supabase_url or not supabase_key:
+            return None, 'Supabase URL или KEY не установлены'
+
+        client = get_http_client()
         headers = {
             'Authorization': f'Bearer {supabase_key}',
-            'Content-Type': 'application/octet-stream',
-            'x-upsert': 'true'  # Перезаписываем если существует
+            'Tus-Resumable': '1.0.0'
         }
-        
-        # Настройки для обхода прокси при работе с localhost
-        # Используем trust_env=False для отключения прокси из переменных окружения
-        client_kwargs = {'timeout': 300.0}
-        if '127.0.0.1' in supabase_url or 'localhost' in supabase_url:
-            # Отключаем использование переменных окружения для прокси (обход Privoxy)
-            client_kwargs['trust_env'] = False
-        
-        with httpx.Client(**client_kwargs) as client:
-            response = client.post(upload_url, content=file_data, headers=headers)
-            
-            if response.status_code in [200, 201]:
-                # Формируем публичный URL в формате полного пути для сохранения в БД
-                # Формат: /storage/v1/object/public/portfolio/{folder}/{filename}
-                public_url = f"/storage/v1/object/public/{bucket_name}/{storage_path}"
-                return public_url, None
-            else:
-                error_text = response.text[:500]
-                return None, f'Ошибка загрузки: {response.status_code} - {error_text}'
-                
+        file_size = os.path.getsize(file_path)
+        chunk_size = app.config['SUPABASE_TUS_CHUNK_SIZE']
+
+        # Продолжаем ранее оборванную загрузку того же файла, если сервер её помнит
+        resume_key = (os.path.abspath(file_path), file_size, os.path.getmtime(file_path), bucket_name, storage_path)
+        with _TUS_UPLOADS_LOCK:
+            upload_url = _TUS_UPLOADS.get(resume_key)
+
+        offset = tus_get_offset(client, upload_url, headers) if upload_url else None
+        if offset is None:
+            upload_url, error = tus_create_upload(
+                client, supabase_url, headers, file_size, storage_path, bucket_name, content_type
+            )
+            if error:
+                return None, error
+            offset = 0
+            with _TUS_UPLOADS_LOCK:
+                _TUS_UPLOADS[resume_key] = upload_url
+        else:
+            print(f"[DEBUG] Продолжаем загрузку {storage_path} с {offset} байт")
+
+        # Supabase не поддерживает расширение TUS concatenation, поэтому блоки
+        # одной загрузки отправляются строго последовательно. В памяти только один блок
+        retries = 0
+        with open(file_path, 'rb') as f:
+            while offset < file_size:
+                f.seek(offset)
+                chunk = f.read(chunk_size)
+
+                try:
+                    response = client.patch(
+                        upload_url,
+                        content=chunk,
+                        headers={
+                            **headers,
+                            'Upload-Offset': str(offset),
+                            'Content-Type': 'application/offset+octet-stream'
+                        },
+                        timeout=300.0
+                    )
+                    if response.status_code in (200, 204):
+                        offset = int(response.headers.get('Upload-Offset', offset + len(chunk)))
+                        retries = 0
+                        continue
+
+                    error = f'{response.status_code} - {response.text[:500]}'
+                    # 409 - рассинхронизация смещения, 423/429/5xx - временные ошибки
+                    if response.status_code < 500 and response.status_code not in (409, 423, 429):
+                        return None, f'Ошибка загрузки блока: {error}'
+                except httpx.TransportError as e:
+                    error = str(e)
+
+                retries += 1
+                if retries > app.config['SUPABASE_TUS_MAX_RETRIES']:
+                    return None, f'Загрузка прервана после {retries - 1} повторов: {error}'
+
+                print(f"[WARNING] Сбой загрузки блока {storage_path} на {offset} байт ({error}), повтор {retries}")
+                time.sleep(min(2 ** retries, 30))
+
+                # Сервер мог принять часть блока - продолжаем с его смещения
+                server_offset = tus_get_offset(client, upload_url, headers)
+                if server_offset is None:
+                    return None, 'Сессия загрузки не найдена на сервере'
+                offset = server_offset
+
+        with _TUS_UPLOADS_LOCK:
+            _TUS_UPLOADS.pop(resume_key, None)
+
+        # Формат: /storage/v1/object/public/portfolio/{folder}/{filename}
+        return f"/storage/v1/object/public/{bucket_name}/{storage_path}", None
+
     except Exception as e:
-        app.logger.error(f"Ошибка загрузки в Supabase Storage: {e}")
-        import traceback
+        app.logger.error(f"Ошибка возобновляемой загрузки в Supabase Storage: {e}")
         app.logger.exception("Traceback:")
         return None, str(e)
 
@@ -612,17 +4288,19 @@ def get_supabase_client():
             self.bucket_name = bucket_name
             
         def upload(self, path, file, file_options=None):
-            # Используем прямую загрузку
-            import tempfile
-            with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                tmp.write(file if isinstance(file, bytes) else file.read())
-                tmp_path = tmp.name
-            
-            public_url, error = upload_to_supabase_storage(tmp_path, path, self.bucket_name)
-            os.unlink(tmp_path)
+            # Используем прямую загрузку потоком, без временного файла
+            import io
+            storage = get_storage('supabase', self.bucket_name)
+            content_type = (file_options or {}).get('content-type')
+            fileobj = io.BytesIO(file) if isinstance(file, bytes) else file
+            started = time.monotonic()
+            _, error = storage.upload_fileobj(fileobj, path, content_type)
+            METRICS.observe_storage_upload(storage.name, time.monotonic() - started,
+                                           len(file) if isinstance(file, bytes) else 0, error is None)
             
             if error:
                 raise Exception(error)
+            public_url = storage.object_path(path)
             
             class Response:
                 def __init__(self, url):
@@ -700,11 +4378,21 @@ def get_supabase_client():
     client_stub.table = lambda name: TableStub(name)
     return client_stub
 
+def postgrest_request(method, table_name, url, **kwargs):
+    """Запрос к PostgREST с замером длительности (метрика по методу, таблице и статусу)"""
+    started = time.monotonic()
+    status = 'error'
+    try:
+        # Общий клиент: соединение с PostgREST переиспользуется между вызовами
+        response = get_http_client().request(method, url, **kwargs)
+        status = str(response.status_code)
+        return response
+    finally:
+        METRICS.observe_postgrest(method, table_name, status, time.monotonic() - started)
+
 def execute_supabase_insert(table_name, data):
     """Выполняет INSERT запрос к Supabase через REST API"""
     try:
-        import httpx
-        
         supabase_url = app.config.get('SUPABASE_URL', '').rstrip('/')
         supabase_key = app.config.get('SUPABASE_KEY', '')
         
@@ -719,33 +4407,50 @@ def execute_supabase_insert(table_name, data):
             'Prefer': 'return=representation'
         }
         
-        # Настройки для обхода прокси при работе с localhost
-        client_kwargs = {'timeout': 30.0}
-        if '127.0.0.1' in supabase_url or 'localhost' in supabase_url:
-            # Отключаем использование переменных окружения для прокси
-            client_kwargs['trust_env'] = False
-        
-        with httpx.Client(**client_kwargs) as client:
-            response = client.post(url, json=data, headers=headers)
-            if response.status_code in [200, 201]:
-                result_data = response.json()
-                class Result:
-                    def __init__(self, data):
-                        self.data = data if isinstance(data, list) else [data]
-                        self.error = None
-                return Result(result_data)
-            else:
-                raise Exception(f'Ошибка вставки: {response.status_code} - {response.text}')
+        response = postgrest_request('POST', table_name, url, json=data, headers=headers, timeout=30.0)
+        if response.status_code in [200, 201]:
+            result_data = response.json()
+            class Result:
+                def __init__(self, data):
+                    self.data = data if isinstance(data, list) else [data]
+                    self.error = None
+            return Result(result_data)
+        else:
+            raise Exception(f'Ошибка вставки: {response.status_code} - {response.text}')
     except Exception as e:
         app.logger.error(f"Ошибка выполнения INSERT: {e}")
         raise
 
+def execute_supabase_update(table_name, filter_column, filter_value, data):
+    """Выполняет UPDATE запрос к Supabase через REST API (PATCH по равенству столбца)"""
+    try:
+        supabase_url = app.config.get('SUPABASE_URL', '').rstrip('/')
+        supabase_key = app.config.get('SUPABASE_KEY', '')
+        
+        if not supabase_url or not supabase_key:
+            raise Exception('Supabase не настроен')
+        
+        url = f"{supabase_url}/rest/v1/{table_name}"
+        headers = {
+            'apikey': supabase_key,
+            'Authorization': f'Bearer {supabase_key}',
+            'Content-Type': 'application/json',
+            'Prefer': 'return=representation'
+        }
+        
+        params = {filter_column: f'eq.{filter_value}'}
+        response = postgrest_request('PATCH', table_name, url, params=params, json=data, headers=headers, timeout=30.0)
+        if response.status_code not in [200, 204]:
+            raise Exception(f'Ошибка обновления: {response.status_code} - {response.text}')
+        return response.json() if response.status_code == 200 else []
+    except Exception as e:
+        app.logger.error(f"Ошибка выполнения UPDATE: {e}")
+        raise
+
 def execute_supabase_select(table_name, filter_column=None, filter_value=None, 
                            order_column=None, order_desc=False, limit_n=None):
     """Выполняет SELECT запрос к Supabase через REST API"""
     try:
-        import httpx
-        
         supabase_url = app.config.get('SUPABASE_URL', '').rstrip('/')
         supabase_key = app.config.get('SUPABASE_KEY', '')
         
@@ -767,22 +4472,15 @@ def execute_supabase_select(table_name, filter_column=None, filter_value=None,
         if limit_n:
             params['limit'] = str(limit_n)
         
-        # Настройки для обхода прокси при работе с localhost
-        client_kwargs = {'timeout': 30.0}
-        if '127.0.0.1' in supabase_url or 'localhost' in supabase_url:
-            # Отключаем использование переменных окружения для прокси
-            client_kwargs['trust_env'] = False
-        
-        with httpx.Client(**client_kwargs) as client:
-            response = client.get(url, params=params, headers=headers)
-            if response.status_code == 200:
-                class Result:
-                    def __init__(self, data):
-                        self.data = data
-                        self.error = None
-                return Result(response.json())
-            else:
-                raise Exception(f'Ошибка выборки: {response.status_code} - {response.text}')
+        response = postgrest_request('GET', table_name, url, params=params, headers=headers, timeout=30.0)
+        if response.status_code == 200:
+            class Result:
+                def __init__(self, data):
+                    self.data = data
+                    self.error = None
+            return Result(response.json())
+        else:
+            raise Exception(f'Ошибка выборки: {response.status_code} - {response.text}')
     except Exception as e:
         app.logger.error(f"Ошибка выполнения SELECT: {e}")
         class Result:
@@ -809,18 +4507,40 @@ def admin_test():
         'supabase_bucket': app.config.get('SUPABASE_BUCKET', 'не установлен')
     })
 
+@app.route('/admin/scheduler', methods=['GET'])
+def admin_scheduler():
+    """Состояние планировщика FFmpeg: слоты, очередь и время ожидания"""
+    return jsonify({'success': True, 'scheduler': ENCODE_SCHEDULER.stats(), 'jobs': job_counts()})
+
+@app.route('/admin/cache', methods=['GET'])
+def admin_cache():
+    """Статистика кэша результатов: попадания, промахи, объем"""
+    return jsonify({'success': True, 'cache': RESULT_CACHE.stats()})
+
+@app.route('/admin/storage', methods=['GET'])
+def admin_storage():
+    """Использование временного хранилища: объем, квота, свободное место"""
+    return jsonify({'success': True, 'storage': TEMP_STORAGE.usage()})
+
 @app.route('/admin/process-video', methods=['POST'])
 def admin_process_video():
     """Обрабатывает видео: сжимает до 720p и извлекает кадры"""
     try:
         print(f"[DEBUG] Запрос получен. Content-Type: {request.content_type}")
-        print(f"[DEBUG] Файлы в запросе: {list(request.files.keys())}")
         
-        if 'file' not in request.files:
+        has_space, space_error = TEMP_STORAGE.check_space(request.content_length)
+        if not has_space:
+            print(f"[ERROR] {space_error}")
+            return jsonify({'success': False, 'error': space_error}), 507
+        
+        files = receive_upload_files()
+        print(f"[DEBUG] Файлы в запросе: {list(files.keys())}")
+        
+        if 'file' not in files:
             print("[ERROR] Файл не найден в запросе")
             return jsonify({'success': False, 'error': 'Файл не загружен'}), 400
         
-        file = request.files['file']
+        file = files['file']
         
         if file.filename == '':
             print("[ERROR] Имя файла пустое")
@@ -879,52 +4599,56 @@ def admin_process_video():
                 print(f"[ERROR] Не удалось создать директорию {upload_folder}: {e}")
                 return jsonify({'success': False, 'error': f'Ошибка создания директории: {str(e)}'}), 500
         
-        file.save(input_path)
-        print(f"[DEBUG] Файл сохранен. Размер: {os.path.getsize(input_path)} байт")
-        
-        # Сжимаем видео до 720p
-        print(f"[DEBUG] Начало сжатия видео...")
-        success, error = compress_video(input_path, output_path, '720')
-        if not success:
-            print(f"[ERROR] Ошибка сжатия: {error}")
-            if os.path.exists(input_path):
-                os.remove(input_path)
-            return jsonify({'success': False, 'error': error}), 500
-        print(f"[DEBUG] Видео сжато. Размер: {os.path.getsize(output_path)} байт")
-        
-        # Извлекаем кадры
-        print(f"[DEBUG] Начало извлечения кадров...")
-        success, frames, error = extract_frames(output_path, frames_dir, interval_seconds=15)
-        if not success:
-            print(f"[ERROR] Ошибка извлечения кадров: {error}")
-            return jsonify({'success': False, 'error': error}), 500
-        print(f"[DEBUG] Извлечено кадров: {len(frames)}")
+        # Файлы хранятся до сохранения в портфолио, но не дольше TEMP_TTL_SECONDS
+        for path in (input_path, output_path, frames_dir):
+            TEMP_STORAGE.register(path, owner=file_id)
         
-        # Формируем список кадров с URL
-        frames_list = []
+        with stage_timer('file_save'):
+            file.save(input_path)
+        source_hash = uploaded_file_hash(file)
+        print(f"[DEBUG] Файл сохранен. Размер: {os.path.getsize(input_path)} байт, SHA-256: {source_hash}")
+
+        _, media_error = probe_media(input_path)
+        if media_error:
+            print(f"[ERROR] {media_error}")
+            TEMP_STORAGE.release_owner(file_id)
+            return jsonify({'success': False, 'error': media_error}), 400
+
         # Определяем базовый URL сервера
         base_url = request.host_url.rstrip('/')
         if not base_url.startswith('http'):
             # Если host_url не содержит протокол, добавляем
             base_url = f"http://{base_url.rstrip('/')}"
-        
-        for idx, frame_path in enumerate(frames):
-            frame_filename = os.path.basename(frame_path)
-            # Формируем полный URL для кадра
-            frame_url = f'{base_url}/admin/frame/{file_id}/{frame_filename}'
-            frames_list.append({
-                'filename': frame_filename,
-                'url': frame_url,
-                'local_path': frame_path,
-                'index': idx + 1
-            })
-        
+
+        # По умолчанию сжатие и извлечение кадров выполняются в фоне;
+        # async=false - синхронный ответ со списком кадров
+        if is_async_request(default=True):
+            job = create_job('admin_process', {
+                'video_id': file_id,
+                'input_path': input_path,
+                'output_path': output_path,
+                'frames_dir': frames_dir,
+                'source_hash': source_hash,
+                'base_url': base_url
+            }, job_id=file_id)
+            print(f"[DEBUG] Задача {file_id} поставлена в очередь")
+            return jsonify({'success': True, 'video_id': file_id, **job_public_view(job)}), 202
+
+        # Сжимаем видео до 720p и извлекаем кадры
+        success, frames, error = process_admin_video(input_path, output_path, frames_dir, source_hash=source_hash)
+        if not success:
+            return jsonify({'success': False, 'error': error}), 500
+
+        # Формируем список кадров с URL
+        frames_list = build_admin_frames_list(file_id, frames, base_url)
+
         return jsonify({
             'success': True,
             'video_id': file_id,
             'compressed_video_path': output_path,
             'frames': frames_list,
-            'frames_count': len(frames_list)
+            'frames_count': len(frames_list),
+            'sprite': build_admin_sprite(file_id, frames, frames_dir, base_url)
         })
         
     except Exception as e:
@@ -944,35 +4668,32 @@ def admin_extract_frames():
             return jsonify({'success': False, 'error': 'Видео не найдено'}), 404
         
         frames_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_frames')
+        TEMP_STORAGE.register(frames_dir, owner=video_id)
+        # Папка заполняется заново: иначе в список попали бы кадры прошлого извлечения
+        # (другой режим - другие имена и отметки времени)
+        shutil.rmtree(frames_dir, ignore_errors=True)
         
-        # Извлекаем кадры
-        success, frames, error = extract_frames(output_path, frames_dir, interval_seconds=15)
+        # Извлекаем кадры тем же способом, что и /admin/process-video
+        frames_mode = 'scene' if app.config['ADMIN_FRAMES_MODE'] == 'scene' else 'auto'
+        success, frames, error = extract_frames(output_path, frames_dir, interval_seconds=15, priority=PRIORITY_ADMIN,
+                                                mode=frames_mode)
         if not success:
             return jsonify({'success': False, 'error': error}), 500
         
-        # Формируем список кадров
-        frames_list = []
         # Определяем базовый URL сервера
         base_url = request.host_url.rstrip('/')
         if not base_url.startswith('http'):
             # Если host_url не содержит протокол, добавляем
             base_url = f"http://{base_url.rstrip('/')}"
-        
-        for idx, frame_path in enumerate(frames):
-            frame_filename = os.path.basename(frame_path)
-            # Формируем полный URL для кадра
-            frame_url = f'{base_url}/admin/frame/{video_id}/{frame_filename}'
-            frames_list.append({
-                'filename': frame_filename,
-                'url': frame_url,
-                'local_path': frame_path,
-                'index': idx + 1
-            })
-        
+
+        # Формируем список кадров
+        frames_list = build_admin_frames_list(video_id, frames, base_url)
+
         return jsonify({
             'success': True,
             'frames': frames_list,
-            'frames_count': len(frames_list)
+            'frames_count': len(frames_list),
+            'sprite': build_admin_sprite(video_id, frames, frames_dir, base_url)
         })
         
     except Exception as e:
@@ -982,14 +4703,341 @@ def admin_extract_frames():
 def serve_admin_frame(video_id, filename):
     """Отдает кадр для админ-панели"""
     try:
-        frame_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_frames', filename)
-        if os.path.exists(frame_path):
-            return send_file(frame_path, mimetype='image/jpeg')
-        else:
-            return jsonify({'error': 'Файл не найден'}), 404
+        return send_frame_file(app.config['UPLOAD_FOLDER'], f'{video_id}_frames/{filename}',
+                               app.config['X_ACCEL_UPLOADS_PREFIX'])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Размер обложки на странице портфолио по формату (CSS px, object-fit: cover)
+COVER_SIZES = {
+    '9-16': (238, 368),
+    '16-9': (640, 360),
+    '1-1': (400, 400)
+}
+
+# Производные обложки: формат -> (кодировщик, мультиплексор, параметры кодирования).
+# Порядок - предпочтение браузера в <picture>: AVIF меньше, WebP поддерживается шире
+COVER_FORMATS = {
+    'avif': ('libaom-av1', 'avif', ['-c:v', 'libaom-av1', '-crf', '30', '-cpu-used', '6', '-pix_fmt', 'yuv420p']),
+    'webp': ('libwebp', 'webp', ['-c:v', 'libwebp', '-quality', '80', '-compression_level', '6'])
+}
+COVER_DENSITIES = (1, 2)
+
+_FFMPEG_FEATURES = {}
+
+def ffmpeg_supports(kind, name):
+    """Есть ли в сборке FFmpeg кодировщик (kind='encoders') или мультиплексор ('muxers')"""
+    if kind not in _FFMPEG_FEATURES:
+        try:
+            result = subprocess.run(['ffmpeg', '-hide_banner', f'-{kind}'], capture_output=True, timeout=10)
+            # Строки вида " V....D libwebp   libwebp WebP image" - имя во второй колонке
+            _FFMPEG_FEATURES[kind] = {
+                line.split()[1] for line in result.stdout.decode('utf-8', errors='ignore').splitlines()
+                if len(line.split()) > 1
+            }
+        except (OSError, subprocess.TimeoutExpired):
+            _FFMPEG_FEATURES[kind] = set()
+    return name in _FFMPEG_FEATURES[kind]
+
+def probe_image_size(image_path):
+    """Размер изображения (ширина, высота) через ffprobe; (None, None) при ошибке"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'stream=width,height', '-of', 'json', image_path],
+            capture_output=True, timeout=30, check=True
+        )
+        stream = json.loads(result.stdout)['streams'][0]
+        return int(stream['width']), int(stream['height'])
+    except (OSError, subprocess.SubprocessError, ValueError, KeyError, IndexError):
+        return None, None
+
+def build_cover_variants(frame_path, output_dir, format_type, base_name):
+    """Создает производные обложки (AVIF, WebP) в 1x и 2x под размер на странице за один запуск FFmpeg.
+
+    Кадр масштабируется и обрезается по центру, как object-fit: cover. 2x не создается,
+    если кадр для него мал - увеличение только добавило бы байт.
+    Возвращает ({'width', 'height', 'files': [(формат, плотность, путь)]}, error).
+    """
+    width, height = COVER_SIZES.get(format_type, COVER_SIZES['9-16'])
+    source_width, source_height = probe_image_size(frame_path)
+    if not source_width:
+        return None, "Не удалось прочитать размер обложки"
+
+    densities = [density for density in COVER_DENSITIES
+                 if density == 1 or (source_width >= width * density and source_height >= height * density)]
+    formats = [name for name, (encoder, muxer, _) in COVER_FORMATS.items()
+               if ffmpeg_supports('encoders', encoder) and ffmpeg_supports('muxers', muxer)]
+    if not formats:
+        return None, "FFmpeg собран без кодировщиков AVIF и WebP"
+
+    variants = [(name, density) for density in densities for name in formats]
+    split_labels = ''.join(f'[s{idx}]' for idx in range(len(variants)))
+    filter_graph = ';'.join([
+        f"[0:v]split={len(variants)}{split_labels}",
+        *(
+            f"[s{idx}]scale={width * density}:{height * density}:force_original_aspect_ratio=increase,"
+            f"crop={width * density}:{height * density}[c{idx}]"
+            for idx, (_, density) in enumerate(variants)
+        )
+    ])
+
+    cmd = ['ffmpeg', '-y', '-i', frame_path, '-filter_complex', filter_graph]
+    files = []
+    for idx, (name, density) in enumerate(variants):
+        output_path = os.path.join(output_dir, f'{base_name}-{density}x.{name}')
+        cmd += ['-map', f'[c{idx}]', *COVER_FORMATS[name][2], '-frames:v', '1', output_path]
+        files.append((name, f'{density}x', output_path))
+
+    try:
+        run_ffmpeg(cmd, timeout=120, stage='cover_variants')
+    except subprocess.TimeoutExpired:
+        return None, "Превышено время ожидания обработки"
+    except subprocess.CalledProcessError as e:
+        return None, f"Ошибка FFmpeg: {e.stderr.decode('utf-8', errors='ignore')}"
+    except FileNotFoundError:
+        return None, "FFmpeg не найден. Убедитесь, что FFmpeg установлен и доступен в PATH"
+    return {'width': width, 'height': height, 'files': files}, None
+
+def upload_hls_to_storage(output_dir, storage_prefix, bucket_name='portfolio'):
+    """Загружает дерево HLS в Supabase Storage; (путь master.m3u8 в формате БД, error)"""
+    storage = get_storage('supabase', bucket_name)
+    files = sorted(path for path in glob.glob(os.path.join(output_dir, '**', '*'), recursive=True) if os.path.isfile(path))
+    master_path = os.path.join(output_dir, 'master.m3u8')
+
+    # Сначала сегменты, затем плейлисты разрешений и последним master:
+    # плеер никогда не увидит ссылку на еще не загруженный файл
+    batches = [
+        [path for path in files if not path.endswith('.m3u8')],
+        [path for path in files if path.endswith('.m3u8') and path != master_path],
+        [master_path]
+    ]
+    for batch in batches:
+        items = [(path, f"{storage_prefix}/{os.path.relpath(path, output_dir).replace(os.sep, '/')}") for path in batch]
+        results = storage.upload_many(items, concurrency=app.config['FRAME_UPLOAD_CONCURRENCY'])
+        errors = [error for _, error in results if error]
+        if errors:
+            return None, f"Не загружено файлов HLS: {len(errors)}. {errors[0]}"
+
+    return storage.object_path(f'{storage_prefix}/master.m3u8'), None
+
+def publish_portfolio_hls(video_path, job_id, storage_prefix, progress=None):
+    """Упаковывает видео портфолио в HLS и загружает в Storage; путь плейлиста или None.
+
+    HLS - дополнение к прогрессивному MP4, поэтому ошибка только пишется в лог.
+    """
+    # Источник - уже сжатое 720p: разрешения выше не дадут качества
+    resolutions, error = parse_resolution_list([app.config['HLS_RENDITIONS']])
+    if error:
+        print(f"[WARNING] HLS_RENDITIONS: {error}")
+        resolutions = []
+    resolutions = [resolution for resolution in resolutions
+                   if VIDEO_RESOLUTIONS[resolution]['width'] <= VIDEO_RESOLUTIONS['720']['width']] or ['720']
+
+    output_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'{job_id}_hls')
+    TEMP_STORAGE.register(output_dir, owner=job_id)
+    try:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir)
+        success, error = package_hls(video_path, output_dir, resolutions, progress=progress)
+        if not success:
+            print(f"[WARNING] HLS не создан: {error}")
+            return None
+        update_hls_bandwidth(output_dir)
+
+        playlist_path, error = upload_hls_to_storage(output_dir, storage_prefix)
+        if error:
+            print(f"[WARNING] HLS не загружен: {error}")
+            return None
+        print(f"[OK] HLS загружен ({', '.join(resolutions)}): {playlist_path}")
+        return playlist_path
+    finally:
+        TEMP_STORAGE.remove(output_dir)
+
+def run_publish_hls_job(params, progress=None):
+    """Задача публикации HLS: упаковка видео работы портфолио и запись hls_url в её строку"""
+    try:
+        hls_relative_path = publish_portfolio_hls(
+            params['video_path'], params['job_id'], params['storage_prefix'], progress=progress
+        )
+        if not hls_relative_path:
+            return False, None, 'HLS не создан или не загружен'
+        # /storage/v1/object/public/portfolio/{folder}/hls/.../master.m3u8
+        execute_supabase_update('portfolio', 'id', params['portfolio_id'], {'hls_url': hls_relative_path})
+        print(f"[OK] hls_url записан в работу {params['portfolio_id']}")
+        return True, {'success': True, 'portfolio_id': params['portfolio_id'], 'hls_url': hls_relative_path}, None
+    except Exception as e:
+        return False, None, f'Ошибка публикации HLS: {str(e)}'
+    finally:
+        TEMP_STORAGE.remove(params['video_path'])
+
+JOB_HANDLERS['publish_hls'] = run_publish_hls_job
+
+def queue_portfolio_hls(video_id, category, title, portfolio_id):
+    """Ставит упаковку HLS сохраненной работы в очередь; идентификатор задачи или None.
+
+    Упаковка - полное декодирование и кодирование 480p, поэтому она не держит запрос сохранения.
+    Сжатое видео переходит задаче: временные файлы видео удаляются сразу после сохранения.
+    """
+    if not app.config['HLS_ENABLED'] or not portfolio_id:
+        return None
+
+    job_id = str(uuid.uuid4())
+    compressed_video_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_output_720p.mp4')
+    video_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{job_id}_hls_source.mp4')
+    try:
+        os.replace(compressed_video_path, video_path)
+        os.utime(video_path)  # Возраст для очистки сирот считается от передачи задаче
+    except OSError as e:
+        print(f"[WARNING] HLS не поставлен в очередь: {e}")
+        return None
+    TEMP_STORAGE.register(video_path, owner=job_id)
+
+    # Папка с меткой времени - CDN не отдаст старые сегменты с тем же именем
+    safe_title = portfolio_storage_name(title) or video_id[:8]
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    try:
+        create_job('publish_hls', {
+            'job_id': job_id,
+            'video_path': video_path,
+            'storage_prefix': f'{CATEGORY_FOLDER_MAP[category]}/hls/{safe_title}_{timestamp}',
+            'portfolio_id': portfolio_id
+        }, job_id=job_id)
+    except Exception as e:
+        # Работа уже сохранена: без HLS она отдается как MP4, ошибку только логируем
+        print(f"[WARNING] HLS не поставлен в очередь: {e}")
+        TEMP_STORAGE.release_owner(job_id)
+        return None
+    print(f"[DEBUG] HLS работы {portfolio_id} поставлен в очередь: задача {job_id}")
+    return job_id
+
+def portfolio_storage_name(title):
+    """Имя файлов работы в Storage по названию (пустое, если в названии только кириллица и знаки)"""
+    return secure_filename(title)[:50]  # Ограничиваем длину
+
+def upload_portfolio_media(video_id, compressed_video_path, frame_path, category, title, description, format_type):
+    """Загружает видео и обложку с производными в Storage портфолио (HLS - после вставки записи).
+
+    Возвращает (запись portfolio без order_index, None) или (None, ошибка).
+    """
+    # Формируем пути в Storage
+    folder_name = CATEGORY_FOLDER_MAP[category]
+    safe_title = portfolio_storage_name(title) or video_id[:8]
+    
+    # Формируем имя файла с префиксом compressed_720p_, как в старых файлах
+    video_filename = f'compressed_720p_{safe_title}.mp4'
+    video_storage_path = f'{folder_name}/{video_filename}'
+    
+    # Путь к изображению должен включать категорию, как в старых файлах
+    image_filename = f'{safe_title}.jpg'
+    image_storage_path = f'images/{folder_name}/{image_filename}'
+    
+    video_public_url, error = upload_to_supabase_storage(compressed_video_path, video_storage_path, 'portfolio')
+    if error:
+        app.logger.error(f"Ошибка загрузки видео: {error}")
+        return None, f'Ошибка загрузки видео: {error}'
+    
+    # Размеры на странице определяются форматом
+    width, height = COVER_SIZES.get(format_type, COVER_SIZES['9-16'])
+
+    # Производные обложки (AVIF/WebP 1x и 2x) - без них страница грузит полноразмерный JPEG
+    cover_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_cover')
+    TEMP_STORAGE.register(cover_dir, owner=video_id)
+    os.makedirs(cover_dir, exist_ok=True)
+    cover_variants, variants_error = build_cover_variants(frame_path, cover_dir, format_type, safe_title)
+    if variants_error:
+        print(f"[WARNING] Производные обложки не созданы: {variants_error}")
+    variant_files = cover_variants['files'] if cover_variants else []
+
+    # Обложка и производные загружаются одним пакетом параллельно
+    storage = get_storage('supabase', 'portfolio')
+    image_items = [(frame_path, image_storage_path)] + [
+        (path, f'images/{folder_name}/{os.path.basename(path)}') for _, _, path in variant_files
+    ]
+    image_results = storage.upload_many(image_items, concurrency=app.config['FRAME_UPLOAD_CONCURRENCY'])
+    TEMP_STORAGE.remove(cover_dir)
+
+    image_public_url, error = image_results[0]
+    if not error:
+        image_public_url = storage.object_path(image_storage_path)
+
+    image_variants = None
+    variant_errors = [variant_error for _, variant_error in image_results[1:] if variant_error]
+    if variant_errors:
+        print(f"[WARNING] Производные обложки не загружены: {variant_errors[0]}")
+    elif variant_files:
+        # {"width": 238, "height": 368, "avif": {"1x": путь, "2x": путь}, "webp": {...}}
+        image_variants = {'width': cover_variants['width'], 'height': cover_variants['height']}
+        for (name, density, _), (_, key) in zip(variant_files, image_items[1:]):
+            image_variants.setdefault(name, {})[density] = storage.object_path(key)
+    if error:
+        app.logger.error(f"Ошибка загрузки обложки: {error}")
+        return None, f'Ошибка загрузки обложки: {error}'
+
+    # Формируем полные пути для сохранения в БД
+    # Формат: /storage/v1/object/public/portfolio/{folder}/{filename}
+    supabase_url = app.config.get('SUPABASE_URL', '').rstrip('/')
+    
+    # Извлекаем путь из полного URL или формируем полный путь
+    if video_public_url.startswith('/storage/v1/object/public/'):
+        # Уже полный путь
+        video_relative_path = video_public_url
+    elif video_public_url.startswith(supabase_url):
+        # Извлекаем путь после базового URL
+        video_relative_path = video_public_url.replace(supabase_url, "")
+    else:
+        # Формируем полный путь в нужном формате
+        video_relative_path = f"/storage/v1/object/public/portfolio/{video_storage_path}"
+    
+    if image_public_url.startswith('/storage/v1/object/public/'):
+        # Уже полный путь
+        image_relative_path = image_public_url
+    elif image_public_url.startswith(supabase_url):
+        # Извлекаем путь после базового URL
+        image_relative_path = image_public_url.replace(supabase_url, "")
+    else:
+        # Формируем полный путь в нужном формате
+        image_relative_path = f"/storage/v1/object/public/portfolio/{image_storage_path}"
+    
+    # Запись для БД (order_index назначает вызывающий)
+    portfolio_data = {
+        'title': title,
+        'description': description,
+        'video_url': video_relative_path,  # Относительный путь: Reklamniye/compressed_720p_title.mp4
+        'image_url': image_relative_path,   # Относительный путь: images/Reklamniye/title.jpg
+        'category': category,
+        'width': width,
+        'height': height,
+        'format': format_type,
+        'is_published': True
+    }
+    if image_variants:
+        portfolio_data['image_variants'] = image_variants
+    return portfolio_data, None
+
+def next_order_index(supabase, category):
+    """Следующий order_index в категории: новые работы встают в конец"""
+    try:
+        result = supabase.table('portfolio').select('order_index').eq('category', category).order('order_index', desc=True).limit(1).execute()
+        max_order = 0
+        if result.data and len(result.data) > 0:
+            max_order = result.data[0].get('order_index', 0)
+        return max_order + 1
+    except Exception:
+        return 0
+
+def release_portfolio_video_files(video_id):
+    """Удаляет временные файлы видео после сохранения в портфолио.
+
+    Пути перечисляются явно: видео могло быть обработано другим воркером, где они и зарегистрированы.
+    """
+    compressed_video_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_output_720p.mp4')
+    frames_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_frames')
+    input_paths = glob.glob(os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_input.*'))
+    for path in [compressed_video_path, frames_dir, *input_paths]:
+        TEMP_STORAGE.remove(path)
+    TEMP_STORAGE.release_owner(video_id)
+
 @app.route('/admin/save-to-portfolio', methods=['POST'])
 def admin_save_to_portfolio():
     """Сохраняет видео и обложку в Supabase Storage и создает запись в БД"""
@@ -1035,115 +5083,28 @@ def admin_save_to_portfolio():
         if not os.path.exists(actual_frame_path):
             return jsonify({'success': False, 'error': 'Обложка не найдена'}), 404
         
-        # Формируем пути в Storage
-        folder_name = CATEGORY_FOLDER_MAP[category]
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        safe_title = secure_filename(title)[:50]  # Ограничиваем длину
-        
-        # Формируем имя файла с префиксом compressed_720p_, как в старых файлах
-        video_filename = f'compressed_720p_{safe_title}.mp4'
-        video_storage_path = f'{folder_name}/{video_filename}'
-        
-        # Путь к изображению должен включать категорию, как в старых файлах
-        image_filename = f'{safe_title}.jpg'
-        image_storage_path = f'images/{folder_name}/{image_filename}'
-        
-        video_public_url, error = upload_to_supabase_storage(compressed_video_path, video_storage_path, 'portfolio')
-        if error:
-            app.logger.error(f"Ошибка загрузки видео: {error}")
-            return jsonify({'success': False, 'error': f'Ошибка загрузки видео: {error}'}), 500
-        
-        image_public_url, error = upload_to_supabase_storage(actual_frame_path, image_storage_path, 'portfolio')
+        portfolio_data, error = upload_portfolio_media(
+            video_id, compressed_video_path, actual_frame_path, category, title, description, format_type
+        )
         if error:
-            app.logger.error(f"Ошибка загрузки обложки: {error}")
-            return jsonify({'success': False, 'error': f'Ошибка загрузки обложки: {error}'}), 500
-        
-        # Формируем полные пути для сохранения в БД
-        # Формат: /storage/v1/object/public/portfolio/{folder}/{filename}
-        supabase_url = app.config.get('SUPABASE_URL', '').rstrip('/')
-        
-        # Извлекаем путь из полного URL или формируем полный путь
-        if video_public_url.startswith('/storage/v1/object/public/'):
-            # Уже полный путь
-            video_relative_path = video_public_url
-        elif video_public_url.startswith(supabase_url):
-            # Извлекаем путь после базового URL
-            video_relative_path = video_public_url.replace(supabase_url, "")
-        else:
-            # Формируем полный путь в нужном формате
-            video_relative_path = f"/storage/v1/object/public/portfolio/{video_storage_path}"
-        
-        if image_public_url.startswith('/storage/v1/object/public/'):
-            # Уже полный путь
-            image_relative_path = image_public_url
-        elif image_public_url.startswith(supabase_url):
-            # Извлекаем путь после базового URL
-            image_relative_path = image_public_url.replace(supabase_url, "")
-        else:
-            # Формируем полный путь в нужном формате
-            image_relative_path = f"/storage/v1/object/public/portfolio/{image_storage_path}"
-        
-        # Определяем размеры на основе формата
-        width = 238
-        height = 368
-        if format_type == '16-9':
-            width = 640
-            height = 360
-        elif format_type == '1-1':
-            width = 400
-            height = 400
-        
-        # Получаем максимальный order_index для категории
-        try:
-            result = supabase.table('portfolio').select('order_index').eq('category', category).order('order_index', desc=True).limit(1).execute()
-            max_order = 0
-            if result.data and len(result.data) > 0:
-                max_order = result.data[0].get('order_index', 0)
-            order_index = max_order + 1
-        except:
-            order_index = 0
-        
-        # Создаем запись в БД
-        portfolio_data = {
-            'title': title,
-            'description': description,
-            'video_url': video_relative_path,  # Относительный путь: Reklamniye/compressed_720p_title.mp4
-            'image_url': image_relative_path,   # Относительный путь: images/Reklamniye/title.jpg
-            'category': category,
-            'width': width,
-            'height': height,
-            'format': format_type,
-            'order_index': order_index,
-            'is_published': True
-        }
+            return jsonify({'success': False, 'error': error}), 500
+        portfolio_data['order_index'] = next_order_index(supabase, category)
         
         result = supabase.table('portfolio').insert(portfolio_data).execute()
         
         if hasattr(result, 'data') and result.data:
-            # Удаляем временные файлы в фоне
-            def cleanup():
-                import time
-                time.sleep(5)
-                try:
-                    if os.path.exists(compressed_video_path):
-                        os.remove(compressed_video_path)
-                    frames_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_frames')
-                    if os.path.exists(frames_dir):
-                        shutil.rmtree(frames_dir)
-                    input_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_input.*')
-                    for path in glob.glob(input_path):
-                        if os.path.exists(path):
-                            os.remove(path)
-                except:
-                    pass
-            
-            import threading
-            threading.Thread(target=cleanup, daemon=True).start()
+            # HLS-версия (быстрый старт и перемотка без скачивания всего файла) упаковывается в фоне,
+            # hls_url появится в записи после завершения задачи
+            hls_job_id = queue_portfolio_hls(video_id, category, title, result.data[0].get('id'))
+
+            # Файлы уже в Storage - удаляем временные
+            release_portfolio_video_files(video_id)
             
             return jsonify({
                 'success': True,
                 'message': 'Видео успешно добавлено в портфолио',
-                'data': result.data[0] if result.data else None
+                'data': result.data[0] if result.data else None,
+                'hls_job_id': hls_job_id
             })
         else:
             return jsonify({'success': False, 'error': 'Ошибка создания записи в БД'}), 500
@@ -1153,6 +5114,263 @@ def admin_save_to_portfolio():
         traceback.print_exc()
         return jsonify({'success': False, 'error': f'Ошибка сохранения: {str(e)}'}), 500
 
+# ============================================
+# ПАКЕТНЫЙ ИМПОРТ В ПОРТФОЛИО
+# ============================================
+# Много видео с метаданными за один запрос: видео обрабатываются параллельно
+# (FFmpeg - в слотах планировщика), обложкой становится кадр-кандидат cover_index,
+# а все записи portfolio создаются одной вставкой с order_index подряд в каждой категории.
+
+def validate_batch_items(files, items):
+    """Проверяет метаданные пакета; список ошибок (пустой - все в порядке)"""
+    if not files:
+        return ['Файлы не загружены']
+    if not isinstance(items, list) or len(items) != len(files):
+        return [f'items должен быть JSON-массивом из {len(files)} элементов - по одному на файл']
+    if len(files) > app.config['BATCH_MAX_FILES']:
+        return [f"Слишком много файлов: {len(files)}, максимум {app.config['BATCH_MAX_FILES']}"]
+
+    errors = []
+    storage_names = set()
+    for idx, (file, item) in enumerate(zip(files, items), start=1):
+        if not isinstance(item, dict):
+            errors.append(f'Файл {idx}: метаданные должны быть объектом')
+            continue
+        title = str(item.get('title') or '').strip()
+        category = item.get('category')
+        cover_index = item.get('cover_index', 1)
+        if not file.filename or not allowed_file(file.filename):
+            errors.append(f'Файл {idx}: неподдерживаемый формат файла')
+        if not title:
+            errors.append(f'Файл {idx}: не указано название')
+        if category not in CATEGORY_FOLDER_MAP:
+            errors.append(f'Файл {idx}: неизвестная категория: {category}')
+        if item.get('format', '9-16') not in COVER_SIZES:
+            errors.append(f"Файл {idx}: неизвестный формат: {item.get('format')}")
+        # bool - подкласс int: true/false из JSON не номер кадра
+        if isinstance(cover_index, bool) or not isinstance(cover_index, int) or cover_index < 1:
+            errors.append(f'Файл {idx}: cover_index должен быть номером кадра от 1')
+        # Имена в Storage строятся из названия - одинаковые имена перезаписали бы друг друга
+        # (пустое имя заменяется идентификатором видео и не повторяется)
+        storage_name = (category, portfolio_storage_name(title))
+        if storage_name[1] and storage_name in storage_names:
+            errors.append(f'Файл {idx}: название повторяется в категории {category}')
+        storage_names.add(storage_name)
+    return errors
+
+def import_portfolio_item(item):
+    """Обрабатывает одно видео пакета и загружает его в Storage; (запись portfolio, None) или (None, ошибка)"""
+    video_id = item['video_id']
+    success, frames, error = process_admin_video(
+        item['input_path'], item['output_path'], item['frames_dir'], source_hash=item.get('source_hash')
+    )
+    if not success:
+        return None, error
+    if not frames:
+        return None, 'Не удалось извлечь кадры для обложки'
+
+    # Кандидаты идут по порядку сцен; номер больше числа кадров - последний кадр
+    cover_path = frames[min(item['cover_index'], len(frames)) - 1]
+    return upload_portfolio_media(
+        video_id, item['output_path'], cover_path, item['category'], item['title'],
+        item['description'], item['format']
+    )
+
+def portfolio_row_storage_keys(row):
+    """Ключи объектов бакета portfolio, на которые ссылается запись: видео, обложка и её производные"""
+    prefix = get_storage('supabase', 'portfolio').object_path('')
+    paths = [row.get('video_url'), row.get('image_url')]
+    for variant in (row.get('image_variants') or {}).values():
+        if isinstance(variant, dict):
+            paths.extend(variant.values())
+    return [path[len(prefix):] for path in paths if isinstance(path, str) and path.startswith(prefix)]
+
+def batch_progress_snapshot(done, total, started):
+    """Прогресс пакета в формате прогресса задачи: процент и ETA по готовым видео"""
+    elapsed = time.time() - started
+    eta = elapsed / done * (total - done) if done else None
+    return {
+        'percent': round(done / total * 100, 1),
+        'items_done': done,
+        'items_total': total,
+        'out_time_seconds': None,
+        'duration_seconds': None,
+        'speed': None,
+        'fps': None,
+        'eta_seconds': round(eta) if eta is not None else None,
+        'elapsed_seconds': round(elapsed, 1),
+        'below_realtime': False
+    }
+
+def run_admin_batch_job(params, progress=None):
+    """Задача /admin/batch-import: параллельная обработка видео и одна вставка записей portfolio"""
+    items = params['items']
+    started = time.time()
+    done = 0
+    done_lock = threading.Lock()
+
+    def process(item):
+        nonlocal done
+        try:
+            row, error = import_portfolio_item(item)
+        except Exception as e:
+            row, error = None, f'Ошибка обработки: {str(e)}'
+        if error:
+            print(f"[ERROR] Пакет {params['batch_id']}: {item['title']}: {error}")
+        with done_lock:
+            done += 1
+            snapshot = batch_progress_snapshot(done, len(items), started)
+        if progress is not None:
+            progress(snapshot)
+        return row, error
+
+    # Видео ждут слоты FFmpeg по приоритету админки; пока одни кодируются, другие загружаются в Storage
+    workers = max(1, min(app.config['BATCH_CONCURRENCY'], len(items)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as executor:
+        outcomes = list(executor.map(process, items))
+
+    imported = [(idx, row) for idx, (row, _) in enumerate(outcomes) if row]
+    inserted = {}
+    insert_error = None
+    if imported:
+        supabase = get_supabase_client()
+        # order_index: каждая категория продолжается после своей последней работы в порядке пакета
+        next_index = {}
+        for _, row in imported:
+            category = row['category']
+            if category not in next_index:
+                next_index[category] = next_order_index(supabase, category)
+            row['order_index'] = next_index[category]
+            next_index[category] += 1
+
+        # Массовая вставка PostgREST требует одинаковых ключей у всех записей
+        columns = sorted(set().union(*(row.keys() for _, row in imported)))
+        rows = [{column: row.get(column) for column in columns} for _, row in imported]
+        try:
+            result = supabase.table('portfolio').insert(rows).execute()
+            # PostgREST возвращает записи в порядке вставки
+            inserted = {idx: data for (idx, _), data in zip(imported, result.data)}
+        except Exception as e:
+            insert_error = f'Ошибка создания записей в БД: {str(e)}'
+            print(f"[ERROR] Пакет {params['batch_id']}: {insert_error}")
+            # Записей нет - загруженные видео и обложки никто не покажет, удаляем их из Storage
+            keys = [key for _, row in imported for key in portfolio_row_storage_keys(row)]
+            delete_error = get_storage('supabase', 'portfolio').delete_many(keys)
+            if delete_error:
+                print(f"[WARNING] Пакет {params['batch_id']}: файлы в Storage не удалены: {delete_error}")
+            else:
+                print(f"[OK] Пакет {params['batch_id']}: удалено файлов из Storage: {len(keys)}")
+
+    # HLS созданных работ упаковывается отдельными фоновыми задачами
+    hls_jobs = {}
+    for idx, record in inserted.items():
+        try:
+            hls_jobs[idx] = queue_portfolio_hls(
+                items[idx]['video_id'], record['category'], items[idx]['title'], record.get('id')
+            )
+        except Exception as e:
+            # Записи уже созданы: без HLS работа отдается как MP4, пакет не проваливаем
+            print(f"[WARNING] Пакет {params['batch_id']}: HLS для {items[idx]['title']} не поставлен в очередь: {e}")
+            hls_jobs[idx] = None
+
+    # Файлы в Storage (или обработка не удалась) - временные файлы больше не нужны
+    for item in items:
+        release_portfolio_video_files(item['video_id'])
+
+    results = []
+    for idx, (item, (row, error)) in enumerate(zip(items, outcomes)):
+        record = inserted.get(idx)
+        results.append({
+            'index': idx + 1,
+            'title': item['title'],
+            'filename': item['filename'],
+            'success': record is not None,
+            'error': error or (insert_error if row else None),
+            'data': record,
+            'hls_job_id': hls_jobs.get(idx)
+        })
+
+    if not inserted:
+        first_error = insert_error or next((result['error'] for result in results if result['error']), None)
+        return False, None, first_error or 'Ни одно видео не импортировано'
+
+    print(f"[OK] Пакет {params['batch_id']}: импортировано {len(inserted)} из {len(items)}")
+    return True, {
+        'success': True,
+        'imported': len(inserted),
+        'failed': len(items) - len(inserted),
+        'items': results
+    }, None
+
+JOB_HANDLERS['admin_batch'] = run_admin_batch_job
+
+@app.route('/admin/batch-import', methods=['POST'])
+def admin_batch_import():
+    """Пакетный импорт видео в портфолио (всегда фоновая задача).
+
+    multipart: несколько полей files и поле items - JSON-массив метаданных в порядке файлов:
+    [{"title": "...", "category": "reklamnye", "description": "", "format": "9-16", "cover_index": 1}].
+    cover_index - номер кадра-кандидата для обложки (по умолчанию первый).
+    """
+    try:
+        if not get_supabase_client():
+            return jsonify({'success': False, 'error': 'Supabase не настроен. Проверьте SUPABASE_URL и SUPABASE_KEY'}), 500
+
+        has_space, space_error = TEMP_STORAGE.check_space(request.content_length)
+        if not has_space:
+            print(f"[ERROR] {space_error}")
+            return jsonify({'success': False, 'error': space_error}), 507
+
+        files = receive_upload_files().getlist('files')
+        try:
+            items = json.loads(request.form.get('items') or '[]')
+        except ValueError:
+            return jsonify({'success': False, 'error': 'items должен быть JSON-массивом'}), 400
+
+        errors = validate_batch_items(files, items)
+        if errors:
+            return jsonify({'success': False, 'error': errors[0], 'errors': errors}), 400
+
+        batch_id = str(uuid.uuid4())
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        job_items = []
+        for file, item in zip(files, items):
+            video_id = str(uuid.uuid4())
+            input_filename = secure_filename(file.filename)
+            input_ext = input_filename.rsplit('.', 1)[1].lower() if '.' in input_filename else 'mp4'
+            input_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_input.{input_ext}')
+            output_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_output_720p.mp4')
+            frames_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_frames')
+            for path in (input_path, output_path, frames_dir):
+                TEMP_STORAGE.register(path, owner=video_id)
+
+            with stage_timer('file_save'):
+                file.save(input_path)
+            job_items.append({
+                'video_id': video_id,
+                'filename': file.filename,
+                'input_path': input_path,
+                'output_path': output_path,
+                'frames_dir': frames_dir,
+                'source_hash': uploaded_file_hash(file),
+                'title': str(item['title']).strip(),
+                'description': str(item.get('description') or '').strip(),
+                'category': item['category'],
+                'format': item.get('format', '9-16'),
+                'cover_index': item.get('cover_index', 1)
+            })
+
+        job = create_job('admin_batch', {'batch_id': batch_id, 'items': job_items}, job_id=batch_id)
+        print(f"[DEBUG] Пакет {batch_id} поставлен в очередь: {len(job_items)} видео")
+        return jsonify({'success': True, 'batch_id': batch_id, 'items_count': len(job_items),
+                        **job_public_view(job)}), 202
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Ошибка пакетного импорта: {str(e)}'}), 500
+
+# Очистка старых задач и воркеры общей очереди (JOB_STORE=sqlite/supabase) - после объявления всех обработчиков
+start_job_workers()
+
 if __name__ == '__main__':
     # Проверяем наличие FFmpeg при запуске
     try:
@@ -1171,7 +5389,7 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"[ERROR] Ошибка при проверке FFmpeg: {e}")
     
-    # В Docker используем production режим
+    # Сервер разработки. В production сервис запускается через gunicorn (см. gunicorn.conf.py)
     debug_mode = os.environ.get('FLASK_ENV', 'development') != 'production'
     app.run(debug=debug_mode, host='0.0.0.0', port=5000)
 
@@ -0,0 +1,426 @@
+"""Воспроизводимый бенчмарк конвейера обработки видео.
+
+Тестовые ролики генерируются FFmpeg из источников lavfi (testsrc2 + sine) с
+bitexact-флагами, поэтому на одной версии FFmpeg они побайтно совпадают между
+запусками. Сеть и GPU не нужны.
+
+Каждый режим конвейера (compress_video, extract_frames, ...) запускается в
+отдельном процессе: wait4 дает пиковый RSS всего дерева процессов (Python и FFmpeg),
+а время и CPU замеряются внутри процесса вокруг самой операции.
+
+Запуск (из папки backend/service1):
+    python benchmark.py --quick                      # короткие ролики 720p
+    python benchmark.py --save-baseline              # сохранить отчет как эталон
+    python benchmark.py --modes compress_720 --repeat 3
+
+Эталон зависит от железа - сравнивайте отчеты, снятые на одной машине.
+Код возврата 1: режим завершился ошибкой или есть регрессия относительно эталона.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Форматы портфолио (см. admin_save_to_portfolio): размеры исходников по классу разрешения
+ASPECT_SIZES = {
+    '16-9': {'1080': (1920, 1080), '720': (1280, 720)},
+    '9-16': {'1080': (1080, 1920), '720': (720, 1280)},
+    '1-1': {'1080': (1080, 1080), '720': (720, 720)}
+}
+DURATIONS = (10, 60)  # Длительности роликов, секунд
+QUICK_SIZES = ('720',)
+QUICK_DURATIONS = (10,)
+FRAME_RATE = 30
+FRAMES_INTERVAL = 15  # Интервал кадров, как в /admin/process-video
+
+# Поля отчета, сравниваемые с эталоном: рост больше допуска - регрессия
+TIME_FIELDS = ('wall_seconds', 'cpu_seconds')
+SIZE_FIELDS = ('peak_rss_mb', 'output_bytes')
+MIN_TIME_DELTA = 0.25  # Секунд: на коротких случаях разница меньше - шум планировщика ОС
+
+
+def clip_name(aspect, size_class, duration):
+    return f"{aspect}_{size_class}p_{duration}s"
+
+
+def build_clip_matrix(quick=False):
+    """Список роликов: (имя, ширина, высота, длительность)"""
+    sizes = QUICK_SIZES if quick else ('1080', '720')
+    durations = QUICK_DURATIONS if quick else DURATIONS
+    clips = []
+    for aspect, by_size in ASPECT_SIZES.items():
+        for size_class in sizes:
+            width, height = by_size[size_class]
+            for duration in durations:
+                clips.append((clip_name(aspect, size_class, duration), width, height, duration))
+    return clips
+
+
+def generate_clip(path, width, height, duration):
+    """Создает детерминированный ролик H.264/AAC с moov в начале файла"""
+    tmp_path = f"{path}.part.mp4"
+    cmd = [
+        'ffmpeg', '-nostdin', '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={FRAME_RATE}:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+        '-map', '0:v', '-map', '1:a',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-pix_fmt', 'yuv420p',
+        '-g', str(FRAME_RATE * 2), '-threads', '1',
+        '-c:a', 'aac', '-b:a', '128k',
+        # Без метаданных и версий кодировщиков в файле - иначе хэш меняется от запуска к запуску
+        '-map_metadata', '-1', '-fflags', '+bitexact', '-flags:v', '+bitexact', '-flags:a', '+bitexact',
+        '-movflags', '+faststart',
+        tmp_path
+    ]
+    subprocess.run(cmd, check=True)
+    os.replace(tmp_path, path)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def prepare_clips(clips, media_dir):
+    """Генерирует недостающие ролики; возвращает {имя: {'path', 'duration', 'sha256', ...}}"""
+    os.makedirs(media_dir, exist_ok=True)
+    prepared = {}
+    for name, width, height, duration in clips:
+        path = os.path.join(media_dir, f"{name}.mp4")
+        if not os.path.exists(path):
+            print(f"[DEBUG] Генерация ролика {name} ({width}x{height}, {duration} с)...")
+            generate_clip(path, width, height, duration)
+        prepared[name] = {
+            'path': path,
+            'width': width,
+            'height': height,
+            'duration': duration,
+            'size': os.path.getsize(path),
+            'sha256': file_sha256(path)
+        }
+    return prepared
+
+
+# ============================================
+# РЕЖИМЫ КОНВЕЙЕРА (выполняются в дочернем процессе)
+# ============================================
+# mode(service, clip_path, work_dir) -> (success, output_paths, error)
+
+def mode_compress(resolution, smart_copy=True):
+    def run(service, clip_path, work_dir):
+        # Без быстрого пути H.264-ролики не шире цели не копируются, а кодируются заново
+        service.app.config['SMART_COPY_ENABLED'] = smart_copy
+        output_path = os.path.join(work_dir, 'output.mp4')
+        success, error = service.compress_video(clip_path, output_path, resolution)
+        return success, [output_path], error
+    return run
+
+
+def mode_ladder(resolutions, smart_copy=True):
+    """Лесенка разрешений за одно декодирование (сравнивать с суммой compress_*_full)"""
+    def run(service, clip_path, work_dir):
+        service.app.config['SMART_COPY_ENABLED'] = smart_copy
+        outputs = {resolution: os.path.join(work_dir, f'output_{resolution}p.mp4') for resolution in resolutions}
+        success, error = service.compress_video_ladder(clip_path, outputs)
+        return success, list(outputs.values()), error
+    return run
+
+
+def mode_segmented(resolution, segment_seconds):
+    """Кодирование частями параллельно (сравнивать с compress_*_full на машине с несколькими слотами)"""
+    def run(service, clip_path, work_dir):
+        service.app.config['SMART_COPY_ENABLED'] = False
+        service.app.config['SEGMENT_ENCODE_MIN_DURATION'] = segment_seconds
+        service.app.config['SEGMENT_SECONDS'] = segment_seconds
+        output_path = os.path.join(work_dir, 'output.mp4')
+        success, error = service.compress_video(clip_path, output_path, resolution)
+        return success, [output_path], error
+    return run
+
+
+def mode_extract(frames_mode):
+    def run(service, clip_path, work_dir):
+        success, frames, error = service.extract_frames(
+            clip_path, os.path.join(work_dir, 'frames'), FRAMES_INTERVAL, mode=frames_mode
+        )
+        return success, frames, error
+    return run
+
+
+def mode_admin_single_pass(service, clip_path, work_dir):
+    output_path = os.path.join(work_dir, 'output_720p.mp4')
+    success, frames, error = service.compress_and_extract_frames(
+        clip_path, output_path, os.path.join(work_dir, 'frames'),
+        resolution='720', interval_seconds=FRAMES_INTERVAL, priority=service.PRIORITY_ADMIN
+    )
+    return success, [output_path, *frames], error
+
+
+def mode_stream(service, clip_path, work_dir):
+    """Потоковый прием (/upload/stream): данные идут в stdin FFmpeg блоками"""
+    chunk_size = service.app.config['STREAM_CHUNK_SIZE']
+
+    def chunks():
+        with open(clip_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+
+    output_path = os.path.join(work_dir, 'output.mp4')
+    with service.ENCODE_SCHEDULER.slot() as threads:
+        success, error = service.compress_video_from_stream(chunks(), output_path, '720', threads)
+    return success, [output_path], error
+
+
+MODES = {
+    'compress_720': mode_compress('720'),
+    'compress_720_full': mode_compress('720', smart_copy=False),
+    'compress_480_full': mode_compress('480', smart_copy=False),
+    'compress_360': mode_compress('360'),
+    'ladder_720_480_full': mode_ladder(['720', '480'], smart_copy=False),
+    'segmented_720_full': mode_segmented('720', 2),
+    'extract_decode': mode_extract('decode'),
+    'extract_seek': mode_extract('seek'),
+    'extract_scene': mode_extract('scene'),
+    'admin_single_pass': mode_admin_single_pass,
+    'stream_720': mode_stream
+}
+
+
+def cpu_seconds():
+    """CPU процесса и его завершенных потомков (FFmpeg), user + system"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run_case_in_process(mode, clip_path, work_dir, result_path):
+    """Точка входа дочернего процесса: один запуск режима, результат - JSON в result_path"""
+    # Кэш результатов отдал бы повторный запуск без FFmpeg
+    os.environ['CACHE_ENABLED'] = 'false'
+    os.environ.setdefault('CACHE_FOLDER', os.path.join(work_dir, 'cache'))
+    sys.path.insert(0, SERVICE_DIR)
+    import app as service
+
+    cpu_started = cpu_seconds()
+    started = time.monotonic()
+    try:
+        success, outputs, error = MODES[mode](service, clip_path, work_dir)
+    except Exception as e:
+        success, outputs, error = False, [], str(e)
+    wall = time.monotonic() - started
+    cpu = cpu_seconds() - cpu_started
+
+    with open(result_path, 'w') as f:
+        json.dump({
+            'success': success,
+            'error': (error or '')[-2000:] or None,
+            'wall_seconds': wall,
+            'cpu_seconds': cpu,
+            'output_files': len(outputs),
+            'output_bytes': sum(os.path.getsize(path) for path in outputs if os.path.exists(path))
+        }, f)
+
+
+def run_case(mode, clip, verbose=False):
+    """Запускает режим в дочернем процессе; пиковый RSS берется из wait4"""
+    with tempfile.TemporaryDirectory(prefix='editor-bench-') as work_dir:
+        result_path = os.path.join(work_dir, 'result.json')
+        output = None if verbose else subprocess.DEVNULL
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--run-case', mode, clip['path'], work_dir, result_path],
+            stdout=output, stderr=output
+        )
+        # wait4 вместо process.wait(): ru_maxrss - максимум по процессу и его потомкам
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        if not os.path.exists(result_path):
+            return {'success': False, 'error': f'Процесс завершился с кодом {process.returncode}'}
+
+        with open(result_path) as f:
+            result = json.load(f)
+        result['peak_rss_mb'] = usage.ru_maxrss / 1024  # В Linux ru_maxrss в килобайтах
+        return result
+
+
+def summarize_runs(runs):
+    """Медиана времени по повторам, максимум памяти"""
+    ok_runs = [run for run in runs if run.get('success')]
+    if not ok_runs:
+        return {'success': False, 'error': runs[-1].get('error')}
+    return {
+        'success': True,
+        'wall_seconds': round(statistics.median(run['wall_seconds'] for run in ok_runs), 3),
+        'cpu_seconds': round(statistics.median(run['cpu_seconds'] for run in ok_runs), 3),
+        'peak_rss_mb': round(max(run['peak_rss_mb'] for run in ok_runs), 1),
+        'output_bytes': ok_runs[-1]['output_bytes'],
+        'output_files': ok_runs[-1]['output_files'],
+        'runs': len(ok_runs)
+    }
+
+
+def ffmpeg_version():
+    try:
+        result = subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=10)
+        return result.stdout.decode('utf-8', errors='ignore').splitlines()[0]
+    except (OSError, IndexError, subprocess.TimeoutExpired):
+        return None
+
+
+def host_info():
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'cpu_affinity': len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None,
+        'python': platform.python_version(),
+        'ffmpeg': ffmpeg_version(),
+        'settings': {
+            key: os.environ[key]
+            for key in ('ENCODE_SLOTS', 'FFMPEG_THREADS_PER_JOB', 'FRAME_SEEK_WORKERS', 'FRAME_SEEK_MIN_INTERVAL')
+            if key in os.environ
+        }
+    }
+
+
+def run_benchmark(clips, modes, repeat, verbose=False):
+    results = []
+    for clip_id, clip in clips.items():
+        for mode in modes:
+            case = f"{mode}/{clip_id}"
+            runs = [run_case(mode, clip, verbose) for _ in range(repeat)]
+            summary = summarize_runs(runs)
+            summary.update({'case': case, 'mode': mode, 'clip': clip_id, 'clip_sha256': clip['sha256']})
+            if summary['success']:
+                summary['realtime_factor'] = round(clip['duration'] / summary['wall_seconds'], 2)
+                print(f"[OK] {case}: {summary['wall_seconds']:.2f} с, CPU {summary['cpu_seconds']:.2f} с, "
+                      f"RSS {summary['peak_rss_mb']:.0f} MB, {summary['output_bytes']} байт, "
+                      f"{summary['realtime_factor']}x")
+            else:
+                print(f"[ERROR] {case}: {summary['error']}")
+            results.append(summary)
+    return results
+
+
+def compare_with_baseline(report, baseline, tolerance, size_tolerance, min_time_delta=MIN_TIME_DELTA):
+    """Сравнивает отчет с эталоном; возвращает список регрессий"""
+    baseline_cases = {result['case']: result for result in baseline.get('results', [])}
+    regressions = []
+
+    if baseline.get('host', {}).get('ffmpeg') != report['host']['ffmpeg']:
+        print("[WARNING] Версия FFmpeg отличается от эталона - размеры файлов могут не совпасть")
+
+    print(f"\n{'Случай':<40} {'Поле':<14} {'Эталон':>12} {'Сейчас':>12} {'Изменение':>10}")
+    for result in report['results']:
+        base = baseline_cases.get(result['case'])
+        # Ошибки режимов выводятся отдельно (см. main)
+        if base is None or not base.get('success') or not result['success']:
+            continue
+        if base.get('clip_sha256') != result['clip_sha256']:
+            print(f"[WARNING] {result['case']}: исходный ролик отличается от эталона, сравнение пропущено")
+            continue
+
+        for field in TIME_FIELDS + SIZE_FIELDS:
+            before, after = base.get(field), result.get(field)
+            if not before or after is None:
+                continue
+            change = after / before - 1
+            limit = tolerance if field in TIME_FIELDS else size_tolerance
+            marker = ''
+            noise = field in TIME_FIELDS and after - before < min_time_delta
+            if change > limit and not noise:
+                marker = ' <- регрессия'
+                regressions.append(f"{result['case']}: {field} {before} -> {after} ({change:+.1%})")
+            print(f"{result['case']:<40} {field:<14} {before:>12} {after:>12} {change:>+10.1%}{marker}")
+
+    missing = sorted(set(baseline_cases) - {result['case'] for result in report['results']})
+    if missing:
+        print(f"[DEBUG] В отчете нет {len(missing)} случаев эталона (другой набор --modes/--quick)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк сжатия видео и извлечения кадров')
+    parser.add_argument('--quick', action='store_true', help='Только ролики 720p по 10 секунд')
+    parser.add_argument('--modes', default=','.join(MODES), help=f"Режимы через запятую: {', '.join(MODES)}")
+    parser.add_argument('--clips', default='', help='Подстрока имени ролика, например 9-16 или 1080p_60s')
+    parser.add_argument('--repeat', type=int, default=1, help='Повторов каждого случая (берется медиана)')
+    parser.add_argument('--media-dir', default=os.path.join(tempfile.gettempdir(), 'editor-benchmark-media'),
+                        help='Папка сгенерированных роликов (переиспользуются между запусками)')
+    parser.add_argument('--report', default='benchmark_report.json', help='Куда записать отчет')
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help='Эталонный отчет для сравнения')
+    parser.add_argument('--save-baseline', action='store_true', help='Сохранить отчет как эталон')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Допустимый рост времени и CPU (доля)')
+    parser.add_argument('--size-tolerance', type=float, default=0.02,
+                        help='Допустимый рост размера результата и памяти (доля)')
+    parser.add_argument('--min-time-delta', type=float, default=MIN_TIME_DELTA,
+                        help='Рост времени меньше стольких секунд не считается регрессией')
+    parser.add_argument('--verbose', action='store_true', help='Показывать вывод сервиса и FFmpeg')
+    parser.add_argument('--run-case', nargs=4, metavar=('MODE', 'CLIP', 'WORK_DIR', 'RESULT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        run_case_in_process(*args.run_case)
+        return 0
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"Неизвестные режимы: {', '.join(unknown)}")
+
+    clip_matrix = [clip for clip in build_clip_matrix(args.quick) if args.clips in clip[0]]
+    if not clip_matrix:
+        parser.error('Ни один ролик не подходит под --clips')
+
+    clips = prepare_clips(clip_matrix, args.media_dir)
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'host': host_info(),
+        'repeat': args.repeat,
+        'clips': {name: {key: value for key, value in clip.items() if key != 'path'} for name, clip in clips.items()},
+        'results': run_benchmark(clips, modes, max(1, args.repeat), args.verbose)
+    }
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[OK] Отчет сохранен: {args.report}")
+
+    failed = [result['case'] for result in report['results'] if not result['success']]
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[OK] Эталон сохранен: {args.baseline}")
+        return 1 if failed else 0
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(report, json.load(f), args.tolerance,
+                                                args.size_tolerance, args.min_time_delta)
+    else:
+        print(f"[DEBUG] Эталон {args.baseline} не найден - сохраните его флагом --save-baseline")
+
+    for case in failed:
+        print(f"[ERROR] Ошибка: {case}")
+    for regression in regressions:
+        print(f"[WARNING] Регрессия: {regression}")
+    return 1 if failed or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+# Настройки gunicorn для production-запуска сервиса обработки видео
+# Запуск: gunicorn -c gunicorn.conf.py app:app
+
+import os
+import shutil
+import signal
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Процессы-воркеры с потоками: потоки обслуживают долгие загрузки и опрос задач,
+# а CPU под FFmpeg делится между процессами (см. create_encode_scheduler в app.py).
+# При JOB_STORE=memory задачи, временные файлы и учет остановки живут в памяти процесса:
+# со вторым воркером часть запросов /jobs/<id> попадала бы в процесс без задачи (404).
+# Поэтому в этом режиме воркер один, несколько - только с общей очередью sqlite/supabase
+job_store = os.environ.get('JOB_STORE', 'memory')
+workers = int(os.environ.get('GUNICORN_WORKERS', '1' if job_store == 'memory' else '2'))
+if job_store == 'memory' and workers > 1:
+    raise SystemExit(
+        f'GUNICORN_WORKERS={workers} требует общей очереди задач: задайте JOB_STORE=sqlite '
+        f'(или supabase) либо GUNICORN_WORKERS=1'
+    )
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+worker_class = 'gthread'
+
+# Приложение читает GUNICORN_WORKERS, чтобы поделить CPU между воркерами
+os.environ['GUNICORN_WORKERS'] = str(workers)
+
+# В gthread главный поток отправляет heartbeat независимо от запросов,
+# поэтому загрузка 2GB файла или 40-минутное кодирование не считаются зависанием
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+keepalive = 5
+
+# Тело запроса ограничивает Flask (MAX_CONTENT_LENGTH = 2GB), заголовки - gunicorn
+limit_request_line = 8190
+limit_request_field_size = 16384
+
+# Heartbeat-файлы в памяти: на overlayfs Docker запись в /tmp может подвисать
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Воркеры не перезапускаются по числу запросов - это оборвало бы фоновые задачи
+max_requests = 0
+
+# Плавная остановка: DRAIN_TIMEOUT на текущие кодирования плюс запас на выход процесса.
+# Docker должен ждать не меньше (stop_grace_period в docker-compose). Рассчитано на
+# остановку сервиса (SIGTERM мастеру); при перезагрузке по HUP старый воркер после
+# выхода из цикла запросов gunicorn завершает по timeout
+drain_timeout = int(os.environ.get('DRAIN_TIMEOUT', '3600'))
+graceful_timeout = drain_timeout + 30
+
+# Метрики Prometheus: каждый воркер пишет значения в файлы каталога, /metrics суммирует их.
+# Без общего каталога /metrics показывал бы только воркер, принявший запрос
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'editor-metrics')
+)
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_worker_init(worker):
+    """По SIGTERM сначала перестаем принимать загрузки, затем штатный выход gunicorn"""
+    import app as service
+
+    handle_exit = worker.handle_exit
+
+    def drain_and_exit(sig, frame):
+        service.begin_drain()
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, drain_and_exit)
+
+
+def worker_exit(server, worker):
+    """После завершения запросов ждем фоновые задачи и процессы FFmpeg воркера"""
+    import app as service
+
+    service.wait_for_drain(drain_timeout)
+
+
+def on_starting(server):
+    """Удаляет файлы метрик прошлого запуска - иначе счетчики продолжились бы со старых значений"""
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Убирает из live-метрик (задачи, слоты, процессы FFmpeg) вышедший воркер"""
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
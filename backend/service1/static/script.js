@@ -73,6 +73,86 @@ function hideError() {
     errorSection.style.display = 'none';
 }
 
+function formatDuration(seconds) {
+    const total = Math.max(0, Math.round(seconds));
+    const minutes = Math.floor(total / 60);
+    const secs = total % 60;
+    return `${minutes}:${secs.toString().padStart(2, '0')}`;
+}
+
+// Отправка формы с прогрессом загрузки (fetch не сообщает о прогрессе отправки)
+function postWithUploadProgress(url, formData, onProgress) {
+    return new Promise((resolve, reject) => {
+        const xhr = new XMLHttpRequest();
+        xhr.open('POST', url);
+        xhr.responseType = 'json';
+        xhr.upload.addEventListener('progress', (e) => {
+            if (e.lengthComputable) {
+                onProgress(e.loaded / e.total);
+            }
+        });
+        xhr.addEventListener('load', () => {
+            resolve({
+                ok: xhr.status >= 200 && xhr.status < 300,
+                status: xhr.status,
+                data: xhr.response || {}
+            });
+        });
+        xhr.addEventListener('error', () => reject(new Error('Ошибка сети при загрузке файла')));
+        xhr.send(formData);
+    });
+}
+
+function showUploadProgress(fraction) {
+    const percent = Math.round(fraction * 100);
+    progressFill.style.width = `${percent}%`;
+    progressText.textContent = `Загрузка файла на сервер: ${percent}%`;
+}
+
+// Прогресс FFmpeg: процент, скорость относительно реального времени, fps и оставшееся время
+function showJobProgress(label, progress) {
+    if (!progress) {
+        progressText.textContent = `${label}: ожидание очереди...`;
+        return;
+    }
+
+    const details = [];
+    if (progress.speed) details.push(`${progress.speed.toFixed(2)}x`);
+    if (progress.fps) details.push(`${Math.round(progress.fps)} fps`);
+    if (progress.eta_seconds !== null && progress.eta_seconds !== undefined) {
+        details.push(`осталось ${formatDuration(progress.eta_seconds)}`);
+    }
+    const suffix = details.length ? ` (${details.join(', ')})` : '';
+
+    if (progress.percent !== null && progress.percent !== undefined) {
+        progressFill.style.width = `${progress.percent}%`;
+        progressText.textContent = `${label}: ${Math.floor(progress.percent)}%${suffix}`;
+    } else {
+        // Длительность источника неизвестна - показываем обработанное время
+        progressText.textContent = `${label}: ${formatDuration(progress.out_time_seconds)}${suffix}`;
+    }
+}
+
+// Подписка на события задачи (Server-Sent Events) до её завершения
+function watchJob(job, onProgress) {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(job.events_url);
+        source.addEventListener('progress', (e) => {
+            onProgress(JSON.parse(e.data).progress);
+        });
+        source.addEventListener('done', (e) => {
+            source.close();
+            resolve(JSON.parse(e.data));
+        });
+        source.addEventListener('error', (e) => {
+            source.close();
+            // Событие error от сервера содержит данные, ошибка соединения - нет
+            const data = e.data ? JSON.parse(e.data) : null;
+            reject(new Error(data ? data.error : 'Соединение с сервером потеряно'));
+        });
+    });
+}
+
 // Обработка отправки формы
 uploadForm.addEventListener('submit', async (e) => {
     e.preventDefault();
@@ -85,6 +165,7 @@ uploadForm.addEventListener('submit', async (e) => {
     const formData = new FormData();
     formData.append('file', selectedFile);
     formData.append('resolution', document.querySelector('input[name="resolution"]:checked').value);
+    formData.append('async', 'true');
     
     // Показываем процесс обработки
     submitBtn.disabled = true;
@@ -92,23 +173,26 @@ uploadForm.addEventListener('submit', async (e) => {
     submitLoader.style.display = 'inline-block';
     processingSection.style.display = 'block';
     hideError();
-    progressFill.style.width = '30%';
+    progressFill.style.width = '0%';
     progressText.textContent = 'Загрузка файла на сервер...';
     
     try {
-        const response = await fetch('/upload', {
-            method: 'POST',
-            body: formData
-        });
+        const upload = await postWithUploadProgress('/upload', formData, showUploadProgress);
+        
+        if (!upload.ok) {
+            throw new Error(upload.data.error || 'Ошибка обработки видео');
+        }
+        
+        // Сжатие идет в фоне: прогресс приходит событиями с сервера
+        progressFill.style.width = '0%';
+        await watchJob(upload.data, (progress) => showJobProgress('Сжатие видео', progress));
         
+        const response = await fetch(upload.data.result_url);
         if (!response.ok) {
             const error = await response.json();
             throw new Error(error.error || 'Ошибка обработки видео');
         }
         
-        progressFill.style.width = '70%';
-        progressText.textContent = 'Обработка видео...';
-        
         // Получаем файл для скачивания
         const blob = await response.blob();
         const url = window.URL.createObjectURL(blob);
@@ -235,6 +319,7 @@ framesForm.addEventListener('submit', async (e) => {
     formData.append('file', selectedFramesFile);
     formData.append('interval', intervalInput.value);
     formData.append('bucket_enabled', bucketCheckbox.checked);
+    formData.append('async', 'true');
     
     // Показываем процесс обработки
     framesSubmitBtn.disabled = true;
@@ -243,24 +328,24 @@ framesForm.addEventListener('submit', async (e) => {
     processingSection.style.display = 'block';
     hideError();
     framesResult.style.display = 'none';
-    progressFill.style.width = '10%';
+    progressFill.style.width = '0%';
     progressText.textContent = 'Загрузка файла на сервер...';
     
     try {
-        const response = await fetch('/extract-frames', {
-            method: 'POST',
-            body: formData
-        });
+        const upload = await postWithUploadProgress('/extract-frames', formData, showUploadProgress);
         
-        if (!response.ok) {
-            const error = await response.json();
-            throw new Error(error.error || 'Ошибка извлечения кадров');
+        if (!upload.ok) {
+            throw new Error(upload.data.error || 'Ошибка извлечения кадров');
         }
         
-        progressFill.style.width = '50%';
-        progressText.textContent = 'Извлечение кадров...';
+        progressFill.style.width = '0%';
+        await watchJob(upload.data, (progress) => showJobProgress('Извлечение кадров', progress));
         
+        const response = await fetch(upload.data.result_url);
         const result = await response.json();
+        if (!response.ok) {
+            throw new Error(result.error || 'Ошибка извлечения кадров');
+        }
         
         progressFill.style.width = '100%';
         progressText.textContent = 'Кадры извлечены!';
@@ -0,0 +1,26 @@
+"""Общие настройки тестов: app из папки сервиса, без кэша результатов, очередь задач в памяти"""
+import os
+import sys
+
+# До импорта app: настройки читаются при импорте модуля
+os.environ['CACHE_ENABLED'] = 'false'
+os.environ['JOB_STORE'] = 'memory'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import app as service
+
+
+@pytest.fixture
+def config(monkeypatch):
+    """Временно меняет app.config: config(SEGMENT_SECONDS=60, ...)"""
+    def set_config(**values):
+        for key, value in values.items():
+            monkeypatch.setitem(service.app.config, key, value)
+    return set_config
+
+
+@pytest.fixture
+def client():
+    return service.app.test_client()
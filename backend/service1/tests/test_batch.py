@@ -0,0 +1,122 @@
+"""Пакетный импорт в портфолио: проверка метаданных и публикация записей"""
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import app as service
+from app import validate_batch_items
+
+
+def make_files(*names):
+    return [FileStorage(filename=name) for name in names]
+
+
+def make_item(**overrides):
+    item = {'title': 'Promo', 'category': 'hr', 'format': '9-16', 'cover_index': 1}
+    item.update(overrides)
+    return item
+
+
+def test_valid_batch(config):
+    config(BATCH_MAX_FILES=10)
+    items = [make_item(title='First'), make_item(title='Second', cover_index=3, format='16-9')]
+    assert validate_batch_items(make_files('a.mp4', 'b.mov'), items) == []
+
+
+def test_no_files():
+    assert validate_batch_items([], []) == ['Файлы не загружены']
+
+
+@pytest.mark.parametrize('items', [
+    [make_item()],
+    {'title': 'Promo'},
+    'not a list',
+])
+def test_items_must_match_files(items):
+    errors = validate_batch_items(make_files('a.mp4', 'b.mp4'), items)
+    assert len(errors) == 1
+    assert 'items' in errors[0]
+
+
+def test_too_many_files(config):
+    config(BATCH_MAX_FILES=1)
+    errors = validate_batch_items(make_files('a.mp4', 'b.mp4'), [make_item(title='A'), make_item(title='B')])
+    assert 'Слишком много файлов' in errors[0]
+
+
+@pytest.mark.parametrize('cover_index', [True, False, 0, -1, '2', 1.5])
+def test_invalid_cover_index(config, cover_index):
+    config(BATCH_MAX_FILES=10)
+    errors = validate_batch_items(make_files('a.mp4'), [make_item(cover_index=cover_index)])
+    assert errors == ['Файл 1: cover_index должен быть номером кадра от 1']
+
+
+@pytest.mark.parametrize('overrides, filename, expected', [
+    ({}, 'a.txt', 'неподдерживаемый формат'),
+    ({'title': '  '}, 'a.mp4', 'не указано название'),
+    ({'category': 'unknown'}, 'a.mp4', 'неизвестная категория'),
+    ({'format': '4-3'}, 'a.mp4', 'неизвестный формат'),
+])
+def test_invalid_item(config, overrides, filename, expected):
+    config(BATCH_MAX_FILES=10)
+    errors = validate_batch_items(make_files(filename), [make_item(**overrides)])
+    assert len(errors) == 1
+    assert expected in errors[0]
+
+
+def test_duplicate_title_in_category(config):
+    config(BATCH_MAX_FILES=10)
+    items = [make_item(title='Promo'), make_item(title='Promo!'), make_item(title='Promo', category='sfery')]
+    errors = validate_batch_items(make_files('a.mp4', 'b.mp4', 'c.mp4'), items)
+    # 'Promo!' дает то же имя в Storage; в другой категории совпадение не мешает
+    assert errors == ['Файл 2: название повторяется в категории hr']
+
+
+def test_cyrillic_titles_do_not_collide(config):
+    config(BATCH_MAX_FILES=10)
+    # Кириллица не попадает в имя файла - такие работы называются по идентификатору видео
+    items = [make_item(title='Ролик'), make_item(title='Ролик')]
+    assert validate_batch_items(make_files('a.mp4', 'b.mp4'), items) == []
+
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+
+    def insert(self, rows):
+        self.data = [{**row, 'id': f'portfolio-{idx}'} for idx, row in enumerate(rows)]
+        return self
+
+    def execute(self):
+        return self
+
+
+class FakeSupabase:
+    def table(self, name):
+        return FakeQuery([])
+
+
+def test_batch_survives_hls_enqueue_failure(monkeypatch):
+    released = []
+
+    def failing_queue(video_id, category, title, portfolio_id):
+        if title == 'Second':
+            raise RuntimeError('job store is down')
+        return f'hls-{video_id}'
+
+    monkeypatch.setattr(service, 'import_portfolio_item', lambda item: ({'category': item['category']}, None))
+    monkeypatch.setattr(service, 'get_supabase_client', FakeSupabase)
+    monkeypatch.setattr(service, 'next_order_index', lambda supabase, category: 1)
+    monkeypatch.setattr(service, 'queue_portfolio_hls', failing_queue)
+    monkeypatch.setattr(service, 'release_portfolio_video_files', released.append)
+
+    items = [
+        {'video_id': 'video-1', 'title': 'First', 'filename': 'a.mp4', 'category': 'hr'},
+        {'video_id': 'video-2', 'title': 'Second', 'filename': 'b.mp4', 'category': 'hr'}
+    ]
+    success, result, error = service.run_admin_batch_job({'batch_id': 'batch', 'items': items})
+
+    assert (success, error) == (True, None)
+    assert result['imported'] == 2
+    assert [item['hls_job_id'] for item in result['items']] == ['hls-video-1', None]
+    # Временные файлы освобождены у всех видео пакета
+    assert released == ['video-1', 'video-2']
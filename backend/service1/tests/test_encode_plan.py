@@ -0,0 +1,72 @@
+"""Решения о копировании потоков без перекодирования (plan_encode)"""
+import pytest
+
+from app import plan_encode
+
+
+def make_media(codec='h264', pix_fmt='yuv420p', width=1280, height=720, bit_rate=3_000_000,
+               audio=None, duration=60.0):
+    return {
+        'duration': duration,
+        'start_time': 0.0,
+        'size': 0,
+        'format_name': 'mov,mp4,m4a,3gp,3g2,mj2',
+        'video': {'index': 0, 'codec': codec, 'pix_fmt': pix_fmt, 'width': width, 'height': height,
+                  'bit_rate': bit_rate},
+        'audio': audio
+    }
+
+
+AAC_STEREO = {'index': 1, 'codec': 'aac', 'channels': 2, 'bit_rate': 128_000}
+
+
+def test_suitable_h264_and_aac_are_copied(config):
+    config(SMART_COPY_ENABLED=True)
+    plan = plan_encode(make_media(audio=AAC_STEREO), '720')
+    assert plan['video'] == 'copy'
+    assert plan['audio'] == 'copy'
+    assert plan['reasons'] == []
+    assert (plan['video_index'], plan['audio_index']) == (0, 1)
+
+
+@pytest.mark.parametrize('overrides', [
+    {'codec': 'hevc'},
+    {'pix_fmt': 'yuv420p10le'},
+    {'width': 1920, 'height': 1080},
+    {'bit_rate': 12_000_000},
+    {'bit_rate': None},
+])
+def test_unsuitable_video_is_encoded(config, overrides):
+    config(SMART_COPY_ENABLED=True)
+    plan = plan_encode(make_media(**overrides), '720')
+    assert plan['video'] == 'encode'
+    assert len(plan['reasons']) == 1
+
+
+def test_same_video_is_copied_for_higher_target(config):
+    config(SMART_COPY_ENABLED=True)
+    assert plan_encode(make_media(width=1920, height=1080, bit_rate=6_000_000), '1080')['video'] == 'copy'
+
+
+@pytest.mark.parametrize('audio', [
+    {'index': 1, 'codec': 'aac', 'channels': 6, 'bit_rate': 384_000},
+    {'index': 1, 'codec': 'aac', 'channels': 2, 'bit_rate': 320_000},
+    {'index': 1, 'codec': 'opus', 'channels': 2, 'bit_rate': 96_000},
+])
+def test_unsuitable_audio_is_encoded(config, audio):
+    config(SMART_COPY_ENABLED=True)
+    assert plan_encode(make_media(audio=audio), '720')['audio'] == 'encode'
+
+
+def test_no_audio_stream(config):
+    config(SMART_COPY_ENABLED=True)
+    plan = plan_encode(make_media(), '720')
+    assert plan['audio'] == 'none'
+    assert plan['audio_index'] is None
+
+
+def test_smart_copy_disabled_encodes_everything(config):
+    config(SMART_COPY_ENABLED=False)
+    plan = plan_encode(make_media(audio=AAC_STEREO), '720')
+    assert plan['video'] == 'encode'
+    assert plan['audio'] == 'encode'
@@ -0,0 +1,26 @@
+"""Проверка интервала извлечения кадров /extract-frames"""
+import io
+
+import pytest
+
+from app import FRAME_INTERVAL_ERROR, extract_frames, extract_frames_seek
+
+
+@pytest.mark.parametrize('interval', ['0', '-5', 'abc', '1.5'])
+def test_invalid_interval_is_rejected(client, interval):
+    response = client.post('/extract-frames', data={
+        'file': (io.BytesIO(b'not a video'), 'clip.mp4'),
+        'interval': interval,
+        'mode': 'seek'
+    })
+    assert response.status_code == 400
+    assert response.get_json()['error'] == FRAME_INTERVAL_ERROR
+
+
+def test_seek_with_zero_interval_fails_fast(tmp_path):
+    assert extract_frames_seek('clip.mp4', str(tmp_path), 0, 60.0, workers=1) == (False, [], FRAME_INTERVAL_ERROR)
+
+
+@pytest.mark.parametrize('mode', ['auto', 'decode', 'seek'])
+def test_extract_frames_with_zero_interval_fails_fast(tmp_path, mode):
+    assert extract_frames('clip.mp4', str(tmp_path), interval_seconds=0, mode=mode) == (False, [], FRAME_INTERVAL_ERROR)
@@ -0,0 +1,73 @@
+"""Отдача кадров /static/frames: кэширование, условные и Range-запросы, X-Accel-Redirect"""
+import os
+import shutil
+import uuid
+
+import pytest
+
+import app as service
+
+FRAME_BYTES = bytes(range(256)) * 4
+STATIC_FRAMES = os.path.join(os.path.dirname(service.__file__), 'static', 'frames')
+
+
+@pytest.fixture
+def frame():
+    """Кадр во временной папке видео внутри static/frames; URL кадра"""
+    file_id = str(uuid.uuid4())
+    frame_dir = os.path.join(STATIC_FRAMES, file_id)
+    os.makedirs(frame_dir)
+    with open(os.path.join(frame_dir, 'frame_0001.jpg'), 'wb') as f:
+        f.write(FRAME_BYTES)
+    yield f'/static/frames/{file_id}/frame_0001.jpg'
+    shutil.rmtree(frame_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def client(config):
+    config(X_ACCEL_REDIRECT=False, FRAME_CACHE_MAX_AGE=3600)
+    return service.app.test_client()
+
+
+def test_frame_is_immutable(client, frame):
+    response = client.get(frame)
+    assert response.status_code == 200
+    assert response.data == FRAME_BYTES
+    assert response.mimetype == 'image/jpeg'
+    assert response.headers['ETag']
+    assert response.cache_control.public
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == 3600
+
+
+def test_if_none_match(client, frame):
+    etag = client.get(frame).headers['ETag']
+    response = client.get(frame, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.cache_control.immutable
+
+
+def test_range_request(client, frame):
+    response = client.get(frame, headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 206
+    assert response.data == FRAME_BYTES[:10]
+    assert response.headers['Content-Range'] == f'bytes 0-9/{len(FRAME_BYTES)}'
+
+
+@pytest.mark.parametrize('path', [
+    '/static/frames/missing/frame_0001.jpg',
+    '/static/frames/..%2F..%2Fapp.py/x',
+    '/static/frames/%2E%2E/app.py',
+])
+def test_missing_frame(client, path):
+    assert client.get(path).status_code == 404
+
+
+def test_x_accel_redirect(client, config, frame):
+    config(X_ACCEL_REDIRECT=True, X_ACCEL_FRAMES_PREFIX='/_internal/frames/')
+    response = client.get(frame)
+    assert response.status_code == 200
+    assert response.data == b''
+    assert response.headers['X-Accel-Redirect'] == frame.replace('/static/frames', '/_internal/frames')
+    assert response.cache_control.immutable
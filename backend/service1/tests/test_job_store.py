@@ -0,0 +1,198 @@
+"""Очередь задач SQLite: выдача, аренда, перехват задачи упавшего воркера"""
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+
+import app as service
+from app import MemoryJobStore, SQLiteJobStore
+
+
+def make_job(kind='compress', created_at=None):
+    return {
+        'job_id': str(uuid.uuid4()),
+        'kind': kind,
+        'status': 'queued',
+        'params': {'input_path': '/tmp/input.mp4'},
+        'result': None,
+        'error': None,
+        'progress': None,
+        'version': 0,
+        'attempts': 0,
+        'worker_id': None,
+        'created_at': created_at or datetime.now().isoformat(),
+        'started_at': None,
+        'finished_at': None
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteJobStore(str(tmp_path / 'jobs.sqlite3'))
+
+
+def test_claim_takes_oldest_job_of_known_kind(store):
+    newer = make_job(created_at='2026-01-01T00:00:02')
+    older = make_job(created_at='2026-01-01T00:00:01')
+    other_kind = make_job(kind='unknown', created_at='2026-01-01T00:00:00')
+    for job in (newer, older, other_kind):
+        store.create(job)
+
+    job = store.claim('worker-a', ['compress'], lease_seconds=60)
+    assert job['job_id'] == older['job_id']
+    assert job['status'] == 'running'
+    assert job['worker_id'] == 'worker-a'
+    assert job['attempts'] == 1
+    assert job['params'] == {'input_path': '/tmp/input.mp4'}
+
+    assert store.claim('worker-b', ['compress'], lease_seconds=60)['job_id'] == newer['job_id']
+    assert store.claim('worker-b', ['compress'], lease_seconds=60) is None
+
+
+def test_running_job_with_live_lease_is_not_claimed(store):
+    store.create(make_job())
+    assert store.claim('worker-a', ['compress'], lease_seconds=60)
+    assert store.claim('worker-b', ['compress'], lease_seconds=60) is None
+
+
+def test_expired_lease_is_taken_over(store):
+    job = make_job()
+    store.create(job)
+    # Отрицательная аренда - воркер A "упал" и аренда уже истекла
+    store.claim('worker-a', ['compress'], lease_seconds=-1)
+
+    taken = store.claim('worker-b', ['compress'], lease_seconds=60)
+    assert taken['job_id'] == job['job_id']
+    assert taken['worker_id'] == 'worker-b'
+    assert taken['attempts'] == 2
+
+    # Старый воркер больше не может ни продлить аренду, ни записать итог
+    assert not store.heartbeat(job['job_id'], 'worker-a', 60)
+    assert not store.finish(job['job_id'], 'worker-a', 'done', result={'ok': True})
+    assert store.finish(job['job_id'], 'worker-b', 'done', result={'ok': True})
+
+    finished = store.get(job['job_id'])
+    assert finished['status'] == 'done'
+    assert finished['result'] == {'ok': True}
+    assert finished['lease_expires_at'] is None
+
+
+def test_heartbeat_extends_lease_and_saves_progress(store):
+    job = make_job()
+    store.create(job)
+    claimed = store.claim('worker-a', ['compress'], lease_seconds=1)
+
+    assert store.heartbeat(job['job_id'], 'worker-a', 60)
+    extended = store.get(job['job_id'])
+    assert extended['lease_expires_at'] > claimed['lease_expires_at']
+    # Продление без прогресса не считается изменением задачи для подписчиков
+    assert extended['version'] == claimed['version']
+
+    assert store.heartbeat(job['job_id'], 'worker-a', 60, progress={'percent': 50.0})
+    updated = store.get(job['job_id'])
+    assert updated['progress'] == {'percent': 50.0}
+    assert updated['version'] == claimed['version'] + 1
+
+
+def test_finished_job_is_not_claimed_again(store):
+    job = make_job()
+    store.create(job)
+    store.claim('worker-a', ['compress'], lease_seconds=-1)
+    store.finish(job['job_id'], 'worker-a', 'error', error='boom')
+
+    assert store.claim('worker-b', ['compress'], lease_seconds=60) is None
+    assert store.get(job['job_id'])['error'] == 'boom'
+
+
+def test_counts_and_prune(store):
+    queued, done = make_job(), make_job()
+    store.create(queued)
+    store.create(done)
+    store.claim('worker-a', ['compress'], lease_seconds=60)
+    store.finish(queued['job_id'], 'worker-a', 'done')
+
+    assert store.counts() == {'queued': 1, 'running': 0, 'done': 1, 'error': 0}
+
+    time.sleep(0.01)
+    store.prune(0)
+    assert store.get(queued['job_id']) is None
+    assert store.get(done['job_id']) is not None
+
+
+def test_memory_store_wait_for_change():
+    store = MemoryJobStore()
+    job = make_job()
+    store.create(job)
+
+    assert store.wait_for_change(job['job_id'], 0, timeout=0.05)['version'] == 0
+    store.heartbeat(job['job_id'], 'worker-a', 60, progress={'percent': 10.0})
+    changed = store.wait_for_change(job['job_id'], 0, timeout=0.05)
+    assert changed['version'] == 1
+    assert changed['progress'] == {'percent': 10.0}
+    assert store.wait_for_change('missing', None, timeout=0.05) is None
+
+
+def test_worker_stops_job_after_max_attempts(store, config, monkeypatch):
+    job = make_job()
+    store.create(job)
+    # Два воркера "упали" с задачей: аренда истекла дважды
+    store.claim('worker-a', ['compress'], lease_seconds=-1)
+    store.claim('worker-b', ['compress'], lease_seconds=-1)
+
+    monkeypatch.setattr(service, 'JOB_STORE', store)
+    config(JOB_MAX_ATTEMPTS=2, JOB_POLL_INTERVAL=0.01)
+    worker = threading.Thread(target=service.job_worker_loop)
+    worker.start()
+    try:
+        deadline = time.monotonic() + 5
+        while store.get(job['job_id'])['status'] != 'error':
+            assert time.monotonic() < deadline, 'задача не остановлена'
+            time.sleep(0.01)
+    finally:
+        service.DRAINING.set()
+        worker.join(5)
+        service.DRAINING.clear()
+
+    stopped = store.get(job['job_id'])
+    assert stopped['attempts'] == 3
+    assert 'прерывалась 2 раз' in stopped['error']
+
+
+class FailingPruneStore(SQLiteJobStore):
+    """Хранилище, у которого не работает удаление старых задач"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.prune_calls = 0
+
+    def prune(self, ttl_seconds):
+        self.prune_calls += 1
+        raise RuntimeError('delete failed')
+
+
+def test_create_job_does_not_prune(tmp_path, monkeypatch):
+    store = FailingPruneStore(str(tmp_path / 'jobs.sqlite3'))
+    monkeypatch.setattr(service, 'JOB_STORE', store)
+
+    job = service.create_job('compress', {'input_path': '/tmp/input.mp4'})
+    assert store.get(job['job_id'])['status'] == 'queued'
+    assert store.prune_calls == 0
+
+
+def test_pruner_keeps_running_after_errors(tmp_path, config, monkeypatch):
+    store = FailingPruneStore(str(tmp_path / 'jobs.sqlite3'))
+    monkeypatch.setattr(service, 'JOB_STORE', store)
+    config(JOB_PRUNE_INTERVAL=0.01)
+    pruner = threading.Thread(target=service.job_pruner_loop)
+    pruner.start()
+    try:
+        deadline = time.monotonic() + 5
+        while store.prune_calls < 2:
+            assert time.monotonic() < deadline, 'очистка остановилась после ошибки'
+            time.sleep(0.01)
+    finally:
+        service.DRAINING.set()
+        pruner.join(5)
+        service.DRAINING.clear()
@@ -0,0 +1,89 @@
+"""Фоновые задачи /upload и /admin/process-video: по умолчанию 202 с job_id, статус и результат"""
+import io
+import shutil
+import subprocess
+import time
+
+import pytest
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='нужен FFmpeg')
+
+
+@pytest.fixture(scope='module')
+def clip(tmp_path_factory):
+    """Тестовый ролик на 20 секунд: хватает на кадр с интервалом 15 секунд"""
+    path = tmp_path_factory.mktemp('media') / 'clip.mp4'
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=size=320x240:rate=10:duration=20',
+        '-pix_fmt', 'yuv420p', str(path)
+    ], check=True)
+    return path.read_bytes()
+
+
+def wait_for_job(client, status_url, timeout=60):
+    """Опрашивает статус до завершения задачи"""
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get(status_url)
+        assert response.status_code == 200
+        job = response.get_json()['job']
+        if job['status'] in ('done', 'error'):
+            return job
+        assert time.monotonic() < deadline, 'задача не завершилась'
+        time.sleep(0.1)
+
+
+def test_upload_job(client, clip):
+    response = client.post('/upload', data={
+        'file': (io.BytesIO(clip), 'clip.mp4'),
+        'resolution': '360'
+    })
+    assert response.status_code == 202
+    queued = response.get_json()
+    assert queued['status_url'] == f"/jobs/{queued['job_id']}"
+
+    job = wait_for_job(client, queued['status_url'])
+    assert job['status'] == 'done'
+    assert job['error'] is None
+
+    result = client.get(queued['result_url'])
+    assert result.status_code == 200
+    assert result.mimetype == 'video/mp4'
+    assert result.data[4:8] == b'ftyp'
+
+
+def test_upload_sync_on_request(client, clip):
+    response = client.post('/upload', data={
+        'file': (io.BytesIO(clip), 'clip.mp4'),
+        'resolution': '360',
+        'async': 'false'
+    })
+    assert response.status_code == 200
+    assert response.mimetype == 'video/mp4'
+    assert response.data[4:8] == b'ftyp'
+
+
+def test_admin_process_job(client, clip):
+    response = client.post('/admin/process-video', data={'file': (io.BytesIO(clip), 'clip.mp4')})
+    assert response.status_code == 202
+    queued = response.get_json()
+    assert queued['video_id'] == queued['job_id']
+
+    assert wait_for_job(client, queued['status_url'])['status'] == 'done'
+    result = client.get(queued['result_url']).get_json()
+    assert result['success']
+    assert result['frames_count'] == len(result['frames']) >= 1
+    assert result['frames'][0]['url'].endswith(f"/admin/frame/{queued['video_id']}/{result['frames'][0]['filename']}")
+
+
+def test_broken_file_is_rejected_before_queue(client):
+    response = client.post('/upload', data={
+        'file': (io.BytesIO(b'not a video'), 'broken.mp4')
+    })
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Файл поврежден или не является видео'
+
+
+def test_unknown_job(client):
+    assert client.get('/jobs/missing').status_code == 404
+    assert client.get('/jobs/missing/result').status_code == 404
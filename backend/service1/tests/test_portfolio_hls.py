@@ -0,0 +1,48 @@
+"""Постановка упаковки HLS сохраненной работы в очередь"""
+import os
+
+import pytest
+
+import app as service
+from app import queue_portfolio_hls
+
+
+@pytest.fixture
+def compressed(tmp_path, config):
+    """Сжатое видео работы во временной папке загрузок"""
+    config(UPLOAD_FOLDER=str(tmp_path), HLS_ENABLED=True)
+    path = tmp_path / 'video-1_output_720p.mp4'
+    path.write_bytes(b'video')
+    return path
+
+
+def test_job_takes_over_compressed_video(compressed, monkeypatch):
+    queued = []
+    monkeypatch.setattr(service, 'create_job', lambda kind, params, job_id=None: queued.append((kind, params)))
+
+    job_id = queue_portfolio_hls('video-1', 'hr', 'Promo', 'portfolio-1')
+
+    kind, params = queued[0]
+    assert kind == 'publish_hls'
+    assert params['job_id'] == job_id
+    assert params['portfolio_id'] == 'portfolio-1'
+    assert params['storage_prefix'].startswith('HR-video/hls/Promo_')
+    assert not compressed.exists()
+    assert open(params['video_path'], 'rb').read() == b'video'
+    service.TEMP_STORAGE.release_owner(job_id)
+
+
+def test_enqueue_failure_is_not_fatal(compressed, monkeypatch):
+    def failing_create_job(kind, params, job_id=None):
+        raise RuntimeError('job store is down')
+    monkeypatch.setattr(service, 'create_job', failing_create_job)
+
+    assert queue_portfolio_hls('video-1', 'hr', 'Promo', 'portfolio-1') is None
+    # Переданный задаче файл удален, а не оставлен сиротой
+    assert os.listdir(compressed.parent) == []
+
+
+def test_disabled_hls_is_not_queued(compressed, config):
+    config(HLS_ENABLED=False)
+    assert queue_portfolio_hls('video-1', 'hr', 'Promo', 'portfolio-1') is None
+    assert compressed.exists()
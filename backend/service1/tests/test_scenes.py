@@ -0,0 +1,53 @@
+"""Выбор кадров-кандидатов по сменам сцен и отметки времени кадров"""
+import pytest
+
+from app import choose_scene_timestamps, frame_timestamp
+
+
+def make_samples(duration, cuts=(), dark=()):
+    """Сэмплы анализа 4 раза в секунду: (время, оценка смены сцены, яркость)"""
+    samples = []
+    for idx in range(int(duration * 4)):
+        timestamp = idx / 4
+        score = 0.9 if timestamp in cuts else 0.01
+        brightness = 10.0 if any(start <= timestamp < stop for start, stop in dark) else 120.0
+        samples.append((timestamp, score, brightness))
+    return samples
+
+
+def test_one_frame_per_scene(config):
+    config(SCENE_THRESHOLD=0.3, SCENE_MAX_FRAMES=12, SCENE_SECONDS_PER_FRAME=3)
+    timestamps = choose_scene_timestamps(make_samples(30, cuts=(10.0, 20.0)), 30.0)
+    # На каждую сцену хватает лимита (30 / 3 = 10 кадров), длинные сцены делятся пополам
+    assert timestamps == sorted(timestamps)
+    for start, stop in ((0, 10), (10, 20), (20, 30)):
+        assert any(start < timestamp < stop for timestamp in timestamps)
+    assert len(timestamps) <= 10
+
+
+def test_frame_count_is_limited(config):
+    config(SCENE_THRESHOLD=0.3, SCENE_MAX_FRAMES=3, SCENE_SECONDS_PER_FRAME=1)
+    cuts = tuple(float(t) for t in range(5, 60, 5))
+    assert len(choose_scene_timestamps(make_samples(60, cuts=cuts), 60.0)) == 3
+
+
+def test_frames_skip_scene_edges_and_fades(config):
+    config(SCENE_THRESHOLD=0.3, SCENE_MAX_FRAMES=1, SCENE_SECONDS_PER_FRAME=3)
+    # Затемнение в середине единственной сцены: кадр берется из светлой части
+    timestamps = choose_scene_timestamps(make_samples(10, dark=((4.0, 6.0),)), 10.0)
+    assert len(timestamps) == 1
+    assert 2.0 <= timestamps[0] <= 8.0
+    assert not 4.0 <= timestamps[0] < 6.0
+
+
+def test_without_samples_middle_frame(config):
+    assert choose_scene_timestamps([], 42.0) == [21.0]
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('/tmp/x_frames/frame_0003.jpg', 30),
+    ('/tmp/x_frames/frame_0003_12480ms.jpg', 12.48),
+    ('/tmp/x_frames/sprite.jpg', None),
+])
+def test_frame_timestamp(path, expected):
+    assert frame_timestamp(path, 15) == expected
@@ -0,0 +1,97 @@
+"""Планировщик FFmpeg: лимит слотов и выдача по приоритету"""
+import threading
+import time
+from contextlib import contextmanager
+
+from app import PRIORITY_ADMIN, PRIORITY_PUBLIC, EncodeScheduler
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'условие не выполнилось'
+        time.sleep(0.01)
+
+
+@contextmanager
+def busy(scheduler):
+    """Занимает единственный слот на время блока"""
+    taken = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with scheduler.slot():
+            taken.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    taken.wait(5)
+    try:
+        yield
+    finally:
+        release.set()
+        holder.join(5)
+
+
+def test_slot_returns_threads_per_job():
+    scheduler = EncodeScheduler(slots=2, threads_per_job=3)
+    with scheduler.slot() as threads:
+        assert threads == 3
+        assert scheduler.stats()['running'] == 1
+    assert scheduler.stats()['running'] == 0
+
+
+def test_non_blocking_acquire_when_busy():
+    scheduler = EncodeScheduler(slots=1, threads_per_job=1)
+    assert scheduler.acquire(blocking=False) == 1
+    assert scheduler.acquire(blocking=False) is None
+    scheduler.release()
+    assert scheduler.acquire(blocking=False) == 1
+    scheduler.release()
+
+
+def test_admin_waiter_gets_slot_before_earlier_public():
+    scheduler = EncodeScheduler(slots=1, threads_per_job=1)
+    order = []
+
+    def worker(priority, name):
+        with scheduler.slot(priority):
+            order.append(name)
+
+    with busy(scheduler):
+        public = threading.Thread(target=worker, args=(PRIORITY_PUBLIC, 'public'))
+        public.start()
+        wait_until(lambda: scheduler.stats()['queue_depth'] == 1)
+        admin = threading.Thread(target=worker, args=(PRIORITY_ADMIN, 'admin'))
+        admin.start()
+        wait_until(lambda: scheduler.stats()['queue_depth'] == 2)
+
+        stats = scheduler.stats()
+        assert stats['classes']['admin']['queued'] == 1
+        assert stats['classes']['public']['queued'] == 1
+
+    public.join(5)
+    admin.join(5)
+    assert order == ['admin', 'public']
+
+
+def test_same_priority_is_fifo():
+    scheduler = EncodeScheduler(slots=1, threads_per_job=1)
+    order = []
+    threads = []
+
+    def worker(idx):
+        with scheduler.slot():
+            order.append(idx)
+
+    with busy(scheduler):
+        for idx in range(3):
+            thread = threading.Thread(target=worker, args=(idx,))
+            thread.start()
+            threads.append(thread)
+            wait_until(lambda idx=idx: scheduler.stats()['queue_depth'] == idx + 1)
+
+    for thread in threads:
+        thread.join(5)
+    assert order == [0, 1, 2]
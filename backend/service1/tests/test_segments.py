@@ -0,0 +1,80 @@
+"""Разбиение длинных видео на части по ключевым кадрам (plan_video_segments)"""
+import threading
+import time
+
+import pytest
+
+import app as service
+from app import plan_video_segments
+
+
+def make_media(duration):
+    return {'duration': duration, 'start_time': 0.0}
+
+
+@pytest.fixture
+def keyframes(monkeypatch):
+    """Ключевые кадры каждые 2 секунды вместо ffprobe"""
+    def fake_keyframes(input_path, media):
+        return [float(t) for t in range(0, int(media['duration']), 2)]
+    monkeypatch.setattr(service, 'probe_keyframe_times', fake_keyframes)
+
+
+def test_long_video_is_split_on_keyframes(config, keyframes):
+    config(SEGMENT_ENCODE_MIN_DURATION=600, SEGMENT_SECONDS=60, SEGMENT_WORKERS=4)
+    segments = plan_video_segments('input.mp4', make_media(700.0))
+
+    assert segments[0] == (0.0, 60.0)
+    assert segments[-1] == (660.0, None)
+    assert len(segments) == 12
+    # Части идут подряд без пропусков
+    for (_, end), (start, _) in zip(segments, segments[1:]):
+        assert end == start
+
+
+def test_short_tail_joins_last_segment(config, keyframes):
+    config(SEGMENT_ENCODE_MIN_DURATION=600, SEGMENT_SECONDS=60, SEGMENT_WORKERS=4)
+    # После 600 с осталось бы 10 с - меньше половины части
+    segments = plan_video_segments('input.mp4', make_media(610.0))
+    assert segments[-1] == (540.0, None)
+
+
+@pytest.mark.parametrize('settings, duration', [
+    ({'SEGMENT_ENCODE_MIN_DURATION': 600, 'SEGMENT_WORKERS': 4}, 300.0),  # Короткое видео
+    ({'SEGMENT_ENCODE_MIN_DURATION': 0, 'SEGMENT_WORKERS': 4}, 3600.0),  # Выключено
+    ({'SEGMENT_ENCODE_MIN_DURATION': 600, 'SEGMENT_WORKERS': 1}, 3600.0),  # Один слот
+])
+def test_video_is_encoded_whole(config, keyframes, settings, duration):
+    config(SEGMENT_SECONDS=60, **settings)
+    assert plan_video_segments('input.mp4', make_media(duration)) == [(0.0, None)]
+
+
+def test_audio_encode_takes_a_slot(tmp_path, config, monkeypatch):
+    monkeypatch.setattr(service, 'ENCODE_SCHEDULER', service.EncodeScheduler(slots=1, threads_per_job=1))
+    config(SEGMENT_WORKERS=2)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def fake_run_ffmpeg(cmd, timeout=None, progress=None, duration=None, stage=None):
+        with lock:
+            active.append(stage)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with open(cmd[-1], 'wb') as f:
+            f.write(b'data')
+        with lock:
+            active.remove(stage)
+    monkeypatch.setattr(service, 'run_ffmpeg', fake_run_ffmpeg)
+
+    input_path = tmp_path / 'input.mp4'
+    input_path.write_bytes(b'data')
+    plan = {'video': 'encode', 'audio': 'encode', 'video_index': 0, 'audio_index': 1, 'reasons': []}
+    segments = [(0.0, 60.0), (60.0, 120.0), (120.0, None)]
+    success, error = service.compress_video_segmented(
+        str(input_path), str(tmp_path / 'output.mp4'), '720', make_media(150.0), plan, segments
+    )
+
+    assert (success, error) == (True, None)
+    # Один слот: кодирование звука не идет параллельно с частями
+    assert max(peak) == 1
@@ -0,0 +1,75 @@
+"""Очистка временных файлов: сироты и просроченные артефакты незавершенных задач"""
+import os
+import time
+import uuid
+
+import app as service
+from app import SQLiteJobStore, TempStorage
+
+
+def make_storage(root, active_owners=None):
+    storage = TempStorage({str(root): 60}, default_ttl=60, quota_bytes=0, min_free_bytes=0, sweep_interval=60)
+    storage.active_owners = active_owners
+    return storage
+
+
+def make_orphan(root, name, age=3600):
+    path = root / name
+    path.write_bytes(b'data')
+    old = time.time() - age
+    os.utime(path, (old, old))
+    return path
+
+
+def test_orphans_of_active_jobs_are_kept(tmp_path):
+    queued, finished = str(uuid.uuid4()), str(uuid.uuid4())
+    kept = make_orphan(tmp_path, f'{queued}_input.mp4')
+    removed = make_orphan(tmp_path, f'{finished}_input.mp4')
+    fresh = make_orphan(tmp_path, f'{finished}_output.mp4', age=0)
+
+    assert make_storage(tmp_path, lambda: {queued}).sweep_orphans() == 1
+    assert kept.exists()
+    assert not removed.exists()
+    assert fresh.exists()
+
+
+def test_nothing_removed_when_job_store_is_unavailable(tmp_path):
+    orphan = make_orphan(tmp_path, f'{uuid.uuid4()}_input.mp4')
+    assert make_storage(tmp_path, lambda: None).sweep_orphans() == 0
+    assert orphan.exists()
+
+
+def test_expired_artifacts_of_active_jobs_are_kept(tmp_path):
+    queued, finished = str(uuid.uuid4()), str(uuid.uuid4())
+    storage = make_storage(tmp_path, lambda: {queued})
+    kept = make_orphan(tmp_path, f'{queued}_input.mp4', age=0)
+    removed = make_orphan(tmp_path, f'{finished}_input.mp4', age=0)
+    storage.register(str(kept), owner=queued, ttl=-1)
+    storage.register(str(removed), owner=finished, ttl=-1)
+
+    assert storage.sweep() == 1
+    assert kept.exists()
+    assert not removed.exists()
+
+
+def test_active_job_owners_include_batch_videos(tmp_path, monkeypatch):
+    store = SQLiteJobStore(str(tmp_path / 'jobs.sqlite3'))
+    monkeypatch.setattr(service, 'JOB_STORE', store)
+    batch = service.create_job('admin_batch', {'batch_id': 'batch', 'items': [{'video_id': 'video-1'}]}, job_id='batch')
+    done = service.create_job('compress', {'input_path': '/tmp/input.mp4'})
+    store.claim('worker-a', ['compress'], lease_seconds=60)
+    store.finish(done['job_id'], 'worker-a', 'done')
+
+    assert service.active_job_owners() == {batch['job_id'], 'video-1'}
+
+
+def test_active_job_owners_unavailable(monkeypatch):
+    class BrokenStore(SQLiteJobStore):
+        def __init__(self):
+            pass
+
+        def active(self):
+            raise RuntimeError('connection refused')
+
+    monkeypatch.setattr(service, 'JOB_STORE', BrokenStore())
+    assert service.active_job_owners() is None
@@ -0,0 +1,12 @@
+-- ============================================
+-- МИГРАЦИЯ: Добавление поля hls_url в таблицу portfolio
+-- ============================================
+-- Добавляет поле hls_url для HLS-версии видео (master.m3u8 и fMP4-сегменты в Storage).
+-- video_url остается прогрессивным MP4 для браузеров без поддержки HLS
+
+-- Добавляем поле hls_url в таблицу portfolio
+ALTER TABLE portfolio
+ADD COLUMN IF NOT EXISTS hls_url TEXT;
+
+-- Комментарий к полю
+COMMENT ON COLUMN portfolio.hls_url IS 'Путь к master-плейлисту HLS в Storage (формат как у video_url)';
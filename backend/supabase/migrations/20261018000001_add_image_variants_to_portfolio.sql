@@ -0,0 +1,13 @@
+-- ============================================
+-- МИГРАЦИЯ: Добавление поля image_variants в таблицу portfolio
+-- ============================================
+-- Добавляет поле image_variants для уменьшенных копий обложки (AVIF и WebP, 1x и 2x)
+-- под размер карточки на странице. image_url остается исходным JPEG.
+-- Формат: {"width": 238, "height": 368, "avif": {"1x": "...", "2x": "..."}, "webp": {"1x": "...", "2x": "..."}}
+
+-- Добавляем поле image_variants в таблицу portfolio
+ALTER TABLE portfolio
+ADD COLUMN IF NOT EXISTS image_variants JSONB;
+
+-- Комментарий к полю
+COMMENT ON COLUMN portfolio.image_variants IS 'Производные обложки AVIF/WebP 1x и 2x (пути в Storage, формат как у image_url)';
@@ -0,0 +1,115 @@
+-- ============================================
+-- МИГРАЦИЯ: Таблица фоновых задач сервиса обработки видео
+-- ============================================
+-- Очередь задач сервиса editor при JOB_STORE=supabase. Задачи переживают перезапуск
+-- контейнера, а выполняют их воркеры любых контейнеров: воркер берет задачу в аренду
+-- (lease) и продлевает её, пока кодирует. Задачу с истекшей арендой (воркер упал)
+-- забирает другой воркер. Доступ только у service_role: RLS включен без политик.
+
+-- Таблица задач
+CREATE TABLE IF NOT EXISTS editor_jobs (
+    job_id UUID PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'done', 'error')),
+    params JSONB NOT NULL DEFAULT '{}'::jsonb,
+    result JSONB,
+    error TEXT,
+    progress JSONB,
+    version INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_expires_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+-- Выдача задач (очередь и истекшие аренды) и очистка завершенных
+CREATE INDEX IF NOT EXISTS editor_jobs_pending_idx ON editor_jobs (created_at) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS editor_jobs_finished_idx ON editor_jobs (finished_at) WHERE status IN ('done', 'error');
+
+ALTER TABLE editor_jobs ENABLE ROW LEVEL SECURITY;
+
+-- Выдает воркеру самую старую задачу из очереди или с истекшей арендой.
+-- SKIP LOCKED: воркеры не ждут друг друга и никогда не получают одну задачу вдвоем
+CREATE OR REPLACE FUNCTION claim_editor_job(p_worker_id TEXT, p_kinds TEXT[], p_lease_seconds INTEGER)
+RETURNS SETOF editor_jobs
+LANGUAGE sql
+AS $$
+    UPDATE editor_jobs
+    SET status = 'running',
+        worker_id = p_worker_id,
+        lease_expires_at = NOW() + make_interval(secs => p_lease_seconds),
+        attempts = attempts + 1,
+        started_at = COALESCE(started_at, NOW()),
+        version = version + 1
+    WHERE job_id = (
+        SELECT job_id
+        FROM editor_jobs
+        WHERE kind = ANY(p_kinds)
+          AND (status = 'queued' OR (status = 'running' AND lease_expires_at < NOW()))
+        ORDER BY created_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$;
+
+-- Продлевает аренду и сохраняет прогресс; FALSE - задачу уже забрал другой воркер
+CREATE OR REPLACE FUNCTION heartbeat_editor_job(p_job_id UUID, p_worker_id TEXT, p_lease_seconds INTEGER,
+                                                p_progress JSONB DEFAULT NULL)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE editor_jobs
+    SET lease_expires_at = NOW() + make_interval(secs => p_lease_seconds),
+        progress = COALESCE(p_progress, progress),
+        version = version + CASE WHEN p_progress IS NULL THEN 0 ELSE 1 END
+    WHERE job_id = p_job_id AND worker_id = p_worker_id AND status = 'running';
+    RETURN FOUND;
+END;
+$$;
+
+-- Записывает итог задачи, если аренда все еще у этого воркера
+CREATE OR REPLACE FUNCTION finish_editor_job(p_job_id UUID, p_worker_id TEXT, p_status TEXT,
+                                             p_result JSONB DEFAULT NULL, p_error TEXT DEFAULT NULL)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE editor_jobs
+    SET status = p_status,
+        result = p_result,
+        error = p_error,
+        finished_at = NOW(),
+        lease_expires_at = NULL,
+        version = version + 1
+    WHERE job_id = p_job_id AND worker_id = p_worker_id AND status = 'running';
+    RETURN FOUND;
+END;
+$$;
+
+-- Количество задач по статусам (/admin/scheduler)
+CREATE OR REPLACE FUNCTION editor_job_counts()
+RETURNS TABLE (status TEXT, count BIGINT)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT editor_jobs.status, COUNT(*) FROM editor_jobs GROUP BY editor_jobs.status;
+$$;
+
+-- Функции вызывает только сервис (service_role)
+REVOKE EXECUTE ON FUNCTION claim_editor_job(TEXT, TEXT[], INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION heartbeat_editor_job(UUID, TEXT, INTEGER, JSONB) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION finish_editor_job(UUID, TEXT, TEXT, JSONB, TEXT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION editor_job_counts() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION claim_editor_job(TEXT, TEXT[], INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION heartbeat_editor_job(UUID, TEXT, INTEGER, JSONB) TO service_role;
+GRANT EXECUTE ON FUNCTION finish_editor_job(UUID, TEXT, TEXT, JSONB, TEXT) TO service_role;
+GRANT EXECUTE ON FUNCTION editor_job_counts() TO service_role;
+
+-- Комментарии
+COMMENT ON TABLE editor_jobs IS 'Очередь фоновых задач сервиса обработки видео (JOB_STORE=supabase)';
+COMMENT ON COLUMN editor_jobs.lease_expires_at IS 'До какого момента задача закреплена за worker_id; после - её заберет другой воркер';
+COMMENT ON COLUMN editor_jobs.attempts IS 'Сколько раз задачу брал воркер (больше одного - после падения воркера)';
@@ -7,6 +7,7 @@ let state = {
     videoFile: null,
     compressedVideoPath: null,
     frames: [],
+    sprite: null, // Спрайт миниатюр: одна картинка вместо запроса на каждый кадр
     selectedFrame: null,
     selectedCategory: null,
     videoId: null
@@ -163,6 +164,60 @@ function updateStep(stepName, status = 'active') {
     }
 }
 
+const JOB_POLL_INTERVAL = 2000; // Опрос статуса фоновой задачи (мс)
+
+// Ответ сервера в JSON; иначе ошибка с текстом ответа
+async function readJsonResponse(response, fallbackError) {
+    const contentType = response.headers.get('content-type');
+    if (!contentType || !contentType.includes('application/json')) {
+        const text = await response.text();
+        console.error('Неожиданный ответ от сервера:', text.substring(0, 500));
+        throw new Error(response.ok
+            ? 'Сервер вернул неожиданный ответ. Проверьте логи контейнера.'
+            : `Ошибка ${response.status}: ${text.substring(0, 200) || response.statusText}`);
+    }
+
+    const data = await response.json();
+    if (!response.ok || data.success === false) {
+        throw new Error(data.error || data.message || fallbackError);
+    }
+    return data;
+}
+
+// Опрашивает фоновую задачу до завершения и возвращает её результат
+async function waitForJob(serverUrl, job, onProgress) {
+    while (true) {
+        const response = await fetch(`${serverUrl}${job.status_url}`);
+        const status = (await readJsonResponse(response, 'Ошибка получения статуса задачи')).job;
+
+        if (status.status === 'error') {
+            throw new Error(status.error || 'Ошибка обработки видео');
+        }
+        if (status.status === 'done') {
+            const resultResponse = await fetch(`${serverUrl}${status.result_url}`);
+            return readJsonResponse(resultResponse, 'Ошибка получения результата');
+        }
+
+        onProgress(status);
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+    }
+}
+
+// Прогресс сжатия 720p из статуса задачи
+function showProcessingProgress(job) {
+    const progress = job.progress;
+    if (job.status === 'queued' || !progress) {
+        progressText.textContent = 'Видео в очереди на обработку...';
+        return;
+    }
+    if (progress.percent !== null && progress.percent !== undefined) {
+        progressFill.style.width = `${Math.max(10, progress.percent)}%`;
+        progressText.textContent = `Сжатие видео до 720p: ${Math.floor(progress.percent)}%`;
+    } else {
+        progressText.textContent = 'Сжатие видео до 720p...';
+    }
+}
+
 // Обработка отправки формы загрузки
 function initFormHandlers() {
     if (!uploadForm) {
@@ -187,6 +242,8 @@ function initFormHandlers() {
     const formData = new FormData();
     formData.append('file', state.videoFile);
     formData.append('action', 'process');
+    // Сервер сохраняет файл и сразу отвечает идентификатором задачи, сжатие идет в фоне
+    formData.append('async', 'true');
     
     isProcessing = true;
     processingStartTime = Date.now();
@@ -201,7 +258,7 @@ function initFormHandlers() {
     try {
         const serverUrl = getServerUrl();
         
-        // Создаем AbortController для таймаута
+        // Таймаут только на загрузку файла: ответ приходит, как только файл сохранен
         const controller = new AbortController();
         const timeoutId = setTimeout(() => controller.abort(), 600000); // 10 минут таймаут
         
@@ -214,38 +271,16 @@ function initFormHandlers() {
         
         clearTimeout(timeoutId);
         
-        if (!response.ok) {
-            // Пытаемся получить JSON ошибку
-            let errorMessage = `Ошибка ${response.status}: ${response.statusText}`;
-            try {
-                const errorData = await response.json();
-                errorMessage = errorData.error || errorData.message || errorMessage;
-            } catch (e) {
-                // Если не JSON, читаем как текст
-                const text = await response.text();
-                if (text) {
-                    errorMessage = `Ошибка ${response.status}: ${text.substring(0, 200)}`;
-                }
-            }
-            throw new Error(errorMessage);
-        }
-        
-        progressFill.style.width = '50%';
-        progressText.textContent = 'Сжатие видео до 720p...';
-        
-        // Проверяем Content-Type перед парсингом JSON
-        const contentType = response.headers.get('content-type');
-        if (!contentType || !contentType.includes('application/json')) {
-            const text = await response.text();
-            console.error('Неожиданный ответ от сервера:', text.substring(0, 500));
-            throw new Error('Сервер вернул неожиданный ответ. Проверьте логи контейнера.');
-        }
+        const job = await readJsonResponse(response, 'Ошибка обработки видео');
         
-        const result = await response.json();
+        progressFill.style.width = '10%';
+        progressText.textContent = 'Видео в очереди на обработку...';
         
-        if (!result.success) {
-            throw new Error(result.error || 'Ошибка обработки видео');
-        }
+        const result = await waitForJob(serverUrl, job, (status) => {
+            // Пока идет опрос, страница считается занятой
+            processingStartTime = Date.now();
+            showProcessingProgress(status);
+        });
         
         progressFill.style.width = '100%';
         progressText.textContent = 'Видео обработано! Извлечение кадров...';
@@ -254,6 +289,7 @@ function initFormHandlers() {
         state.videoId = result.video_id;
         state.compressedVideoPath = result.compressed_video_path;
         state.frames = result.frames || [];
+        state.sprite = result.sprite || null;
         
         // Переходим к выбору категории
         isProcessing = false;
@@ -359,6 +395,7 @@ async function loadFrames() {
         }
         
         state.frames = result.frames || [];
+        state.sprite = result.sprite || null;
         displayFrames();
         updateStep('frames');
         processingSection.style.display = 'none';
@@ -393,20 +430,40 @@ function displayFrames() {
             frameUrl = `${serverUrl}${frameUrl}`;
         }
         
+        // Со спрайтом полноразмерный кадр загружается только после выбора обложки
+        const spriteTile = state.sprite ? state.sprite.frames[index] : null;
+        if (spriteTile) {
+            frameDiv.innerHTML = `
+            <div class="frame-image sprite">
+                <div class="frame-sprite" style="${spriteTileStyle(state.sprite, spriteTile)}"></div>
+            </div>
+            <div class="frame-info">
+                <p class="frame-name">Кадр ${index + 1}${formatFrameTimestamp(frame.timestamp)}</p>
+            </div>
+        `;
+        } else {
         frameDiv.innerHTML = `
             <div class="frame-image">
                 <img src="${frameUrl}" alt="${frame.filename}" onerror="console.error('Ошибка загрузки кадра:', '${frameUrl}'); this.src='data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMjAwIiBoZWlnaHQ9IjIwMCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48cmVjdCB3aWR0aD0iMjAwIiBoZWlnaHQ9IjIwMCIgZmlsbD0iI2RkZCIvPjx0ZXh0IHg9IjUwJSIgeT0iNTAlIiBmb250LWZhbWlseT0iQXJpYWwiIGZvbnQtc2l6ZT0iMTQiIGZpbGw9IiM5OTkiIHRleHQtYW5jaG9yPSJtaWRkbGUiIGR5PSIuM2VtIj5JbWFnZTwvdGV4dD48L3N2Zz4='">
             </div>
             <div class="frame-info">
-                <p class="frame-name">Кадр ${index + 1}</p>
+                <p class="frame-name">Кадр ${index + 1}${formatFrameTimestamp(frame.timestamp)}</p>
             </div>
         `;
+        }
         
         frameDiv.addEventListener('click', () => {
             document.querySelectorAll('.frame-item.selectable').forEach(item => {
                 item.classList.remove('selected');
             });
             frameDiv.classList.add('selected');
+            
+            // Выбранный кадр показываем в полном качестве
+            const spritePreview = frameDiv.querySelector('.frame-image.sprite');
+            if (spritePreview) {
+                spritePreview.classList.remove('sprite');
+                spritePreview.innerHTML = `<img src="${frameUrl}" alt="${frame.filename}">`;
+            }
             state.selectedFrame = frame;
             document.getElementById('nextToMetadataBtn').disabled = false;
         });
@@ -415,6 +472,34 @@ function displayFrames() {
     });
 }
 
+// Фон-фрагмент спрайта для миниатюры: элемент с пропорциями миниатюры, смещение в процентах
+function spriteTileStyle(sprite, tile) {
+    let spriteUrl = sprite.url;
+    if (spriteUrl.startsWith('/')) {
+        spriteUrl = `${getServerUrl()}${spriteUrl}`;
+    }
+    const column = Math.round(tile.x / sprite.tile_width);
+    const row = Math.round(tile.y / sprite.tile_height);
+    const positionX = sprite.columns > 1 ? column / (sprite.columns - 1) * 100 : 0;
+    const positionY = sprite.rows > 1 ? row / (sprite.rows - 1) * 100 : 0;
+    return [
+        `background-image: url('${spriteUrl}')`,
+        `background-size: ${sprite.columns * 100}% ${sprite.rows * 100}%`,
+        `background-position: ${positionX}% ${positionY}%`,
+        `aspect-ratio: ${sprite.tile_width} / ${sprite.tile_height}`
+    ].join('; ');
+}
+
+// Отметка времени кадра в видео: " · 1:05" (пусто, если сервер её не прислал)
+function formatFrameTimestamp(seconds) {
+    if (typeof seconds !== 'number') {
+        return '';
+    }
+    const minutes = Math.floor(seconds / 60);
+    const rest = Math.floor(seconds % 60).toString().padStart(2, '0');
+    return ` · ${minutes}:${rest}`;
+}
+
 // Инициализация обработчиков метаданных и сохранения
 function initMetadataHandlers() {
     // Переход к метаданным
@@ -564,6 +649,7 @@ function resetAll() {
         videoFile: null,
         compressedVideoPath: null,
         frames: [],
+        sprite: null,
         selectedFrame: null,
         selectedCategory: null,
         videoId: null
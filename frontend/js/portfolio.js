@@ -123,7 +123,9 @@ async function loadPortfolioFromSupabase() {
                 title: item.title || '',
                 description: item.description || '',
                 image: item.image_url,
+                imageVariants: item.image_variants || null, // AVIF/WebP под размер карточки
                 video: item.video_url || null, // Явно устанавливаем null если нет видео
+                hls: item.hls_url || null, // HLS-версия (если есть) - быстрый старт и перемотка
                 category: item.category,
                 width: item.width || 238,
                 height: item.height || 368,
@@ -366,7 +368,27 @@ function renderPortfolio(filteredWorks = null) {
         content.style.width = '100%';
         content.style.height = 'auto';
 
-        content.appendChild(img);
+        // Уменьшенные AVIF/WebP: браузер выберет первый поддерживаемый формат, JPEG - запасной
+        if (work.imageVariants) {
+            const picture = document.createElement('picture');
+            picture.style.display = 'block';
+            picture.style.width = '100%';
+            picture.style.height = '100%';
+            [['avif', 'image/avif'], ['webp', 'image/webp']].forEach(([format, type]) => {
+                const densities = work.imageVariants[format];
+                if (!densities) {
+                    return;
+                }
+                const source = document.createElement('source');
+                source.type = type;
+                source.srcset = Object.entries(densities).map(([density, url]) => `${url} ${density}`).join(', ');
+                picture.appendChild(source);
+            });
+            picture.appendChild(img);
+            content.appendChild(picture);
+        } else {
+            content.appendChild(img);
+        }
         workItem.appendChild(content);
         
         // Добавляем play overlay только если есть видео
@@ -411,7 +433,7 @@ function renderPortfolio(filteredWorks = null) {
                 
                 // Используем встроенный video player
                 if (typeof window.openVideoPlayer === 'function') {
-                    window.openVideoPlayer(work.video);
+                    window.openVideoPlayer(work.video, work.hls);
                 } else {
                     console.warn('Video player не доступен, используем fallback');
                     // Fallback: открываем в новом окне
@@ -199,6 +199,20 @@ export async function getPortfolio(category = null) {
                     }
                 }
                 
+                // HLS-версия видео (master.m3u8) хранится в том же формате, что и video_url
+                if (item.hls_url && !item.hls_url.startsWith('http')) {
+                    item.hls_url = getStoragePublicUrl(item.hls_url, 'portfolio');
+                }
+                
+                // Производные обложки: {avif: {'1x': путь, '2x': путь}, webp: {...}}
+                if (item.image_variants) {
+                    ['avif', 'webp'].forEach(format => {
+                        Object.entries(item.image_variants[format] || {}).forEach(([density, path]) => {
+                            item.image_variants[format][density] = getStoragePublicUrl(path, 'portfolio');
+                        });
+                    });
+                }
+                
                 return item;
             });
         }
@@ -365,13 +365,16 @@
     }
     
     // Open video player
-    function openVideoPlayer(videoSrc) {
+    function openVideoPlayer(videoSrc, hlsSrc = null) {
         if (!videoPlayer) {
             initVideoPlayer();
         }
         
         videoElement = document.getElementById('videoPlayerVideo');
-        videoElement.src = videoSrc;
+        // HLS берем там, где браузер воспроизводит его сам (Safari, iOS, Android):
+        // видео стартует с первых сегментов, а не после загрузки MP4. Иначе - MP4
+        const canPlayHls = hlsSrc && videoElement.canPlayType('application/vnd.apple.mpegurl') !== '';
+        videoElement.src = canPlayHls ? hlsSrc : videoSrc;
         
         // На мобильных устройствах добавляем атрибуты для полноэкранного режима
         if (isMobileDevice()) {